@@ -0,0 +1,243 @@
+#!/usr/bin/python
+'''
+Columnar (NumPy) copies of our round details, for statistics
+
+The round details and money round details in rdb are kept as one
+object per row, which is what the GUI frames want, but adding up
+statistics over them one object at a time does not scale. This module
+keeps the same data as parallel NumPy arrays (one array per column),
+sorted by player, so that per-player statistics (like the score
+report) are done as array operations.
+
+The columns are rebuilt from rdb whenever rdb reloads its lists or
+its data version changes, and are never written back.
+
+NumPy is optional: if it is not installed, report_results() just uses
+rdb.report_results(), which has the database do the work.
+'''
+
+__version__ = "1.0"
+__author__ = "Lee Duncan"
+
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from myfraction import MyFraction, lcm
+from money import Money
+from utils import dprint
+import rdb
+
+
+# stored for strokes not yet filled in, and never a "best" score
+NO_STROKES = 999
+
+
+class PlayerColumns:
+    '''
+    A set of parallel column arrays, one row per detail, sorted by
+    player number, with the start of each player's rows noted, so that
+    columns can be added up (or minimized, etc) for each player at once
+    '''
+    def __init__(self, columns, rows):
+        self.columns = columns
+        self.size = len(rows)
+        if self.size:
+            rows.sort()
+            table = np.array(rows, dtype=np.int64)
+        else:
+            table = np.zeros((0, len(columns)), dtype=np.int64)
+        for (idx, name) in enumerate(columns):
+            setattr(self, name, table[:, idx])
+        if self.size:
+            (self.players, self.starts) = np.unique(self.player_num,
+                                                    return_index=True)
+        else:
+            self.players = self.starts = np.zeros(0, dtype=np.int64)
+
+    def GroupByPlayer(self, ufunc, values, mask=None, fill=0):
+        '''
+        Apply ufunc.reduce() to values (an array with one value per
+        row) for each player, using "fill" for rows not in the mask.
+        Return an array with one value per player, in self.players order.
+        '''
+        if not self.size:
+            return np.zeros(0, dtype=np.int64)
+        if mask is not None:
+            values = np.where(mask, values, fill)
+        return ufunc.reduceat(values, self.starts)
+
+    def SumByPlayer(self, values, mask=None):
+        return self.GroupByPlayer(np.add, values, mask)
+
+    def MinByPlayer(self, values, mask=None):
+        return self.GroupByPlayer(np.minimum, values, mask, NO_STROKES)
+
+    def CountByPlayer(self, mask):
+        return self.SumByPlayer(mask.astype(np.int64))
+
+
+ROUND_DETAIL_COLUMNS = ['player_num', 'round_num', 'rdate',
+                        'fstrokes', 'bstrokes',
+                        'acnt', 'ecnt', 'aecnt',
+                        'fscore_num', 'fscore_den',
+                        'bscore_num', 'bscore_den',
+                        'oscore_num', 'oscore_den']
+
+MONEY_ROUND_DETAIL_COLUMNS = ['player_num', 'round_num', 'rdate', 'cents']
+
+
+class ScoreColumns:
+    '''
+    Columnar copies of all of rdb's round details and money round
+    details, plus a few per-round columns needed for reports
+
+    Round dates are kept as date ordinals, with 0 meaning "no date".
+    '''
+    def __init__(self):
+        self.rdate_of = {}
+        for rnd in rdb.RoundList.itervalues():
+            self.rdate_of[rnd.num] = \
+                0 if rnd.rdate is None else rnd.rdate.toordinal()
+        rd_rows = []
+        for rd in rdb.RoundDetailList:
+            rd_rows.append((rd.player_num, rd.round_num,
+                            self.rdate_of.get(rd.round_num, 0),
+                            NO_STROKES if rd.fstrokes is None \
+                                else rd.fstrokes,
+                            NO_STROKES if rd.bstrokes is None \
+                                else rd.bstrokes,
+                            rd.acnt, rd.ecnt, rd.aecnt,
+                            rd.calc_fscore_numerator,
+                            rd.calc_fscore_denominator,
+                            rd.calc_bscore_numerator,
+                            rd.calc_bscore_denominator,
+                            rd.calc_oscore_numerator,
+                            rd.calc_oscore_denominator))
+        self.details = PlayerColumns(ROUND_DETAIL_COLUMNS, rd_rows)
+        mrd_rows = []
+        for mrd in rdb.MoneyRoundDetailList:
+            mrd_rows.append((mrd.player_num, mrd.round_num,
+                             self.rdate_of.get(mrd.round_num, 0),
+                             sum(mrd.moola_cents)))
+        self.money_details = PlayerColumns(MONEY_ROUND_DETAIL_COLUMNS,
+                                           mrd_rows)
+        # per money round: round date, and how many tries Mz Kitty won
+        mround_rows = [(self.rdate_of.get(mrnd.round_num, 0),
+                        mrnd.mrounds.count(rdb.MZ_KITTY_TRY),
+                        rdb.MoneyRoundDetailList.PlayerCount(mrnd.round_num))
+                       for mrnd in rdb.MoneyRoundList.itervalues()]
+        if mround_rows:
+            table = np.array(mround_rows, dtype=np.int64)
+        else:
+            table = np.zeros((0, 3), dtype=np.int64)
+        (self.mround_rdate,
+         self.mround_kitty_tries,
+         self.mround_players) = (table[:, 0], table[:, 1], table[:, 2])
+        dprint("Built score columns: %d round details, " % \
+               self.details.size + "%d money round details" % \
+               self.money_details.size)
+
+    def PointsByPlayer(self, which, mask):
+        '''
+        Return the front ('f'), back ('b'), or overall ('o') points for
+        each player, as MyFractions, adding up only rows in the mask.
+
+        The points are added up as integers, over a common denominator.
+        '''
+        d = self.details
+        nums = getattr(d, which + 'score_num')
+        dens = getattr(d, which + 'score_den')
+        # (as Python integers, which cannot overflow)
+        common_den = reduce(lcm, [int(v) for v in np.unique(dens)], 1)
+        totals = d.SumByPlayer(nums * (common_den // dens), mask)
+        return [MyFraction(int(t), common_den) for t in totals]
+
+    def ReportResults(self, start_rdate, stop_rdate):
+        '''
+        Summarize how each player did from start_rdate to stop_rdate
+        (inclusive), returning an rdb.ReportSummary, just like
+        rdb.report_results()
+        '''
+        start = start_rdate.toordinal()
+        stop = stop_rdate.toordinal()
+        summary = rdb.ReportSummary()
+        d = self.details
+        in_range = (d.rdate >= start) & (d.rdate <= stop)
+        won_9f = in_range & (d.fscore_num == rdb.WON_9_POINTS * d.fscore_den)
+        won_9b = in_range & (d.bscore_num == rdb.WON_9_POINTS * d.bscore_den)
+        won_18 = in_range & \
+                 (d.oscore_num == rdb.WON_18_POINTS * d.oscore_den)
+        rnd_cnts = d.CountByPlayer(in_range)
+        acnts = d.SumByPlayer(d.acnt, in_range)
+        ecnts = d.SumByPlayer(d.ecnt, in_range)
+        aecnts = d.SumByPlayer(d.aecnt, in_range)
+        won_9s = d.CountByPlayer(won_9f) + d.CountByPlayer(won_9b)
+        won_18s = d.CountByPlayer(won_18)
+        won_33s = d.CountByPlayer(won_9f & won_9b & won_18)
+        best_fstrokes = d.MinByPlayer(d.fstrokes, in_range)
+        best_bstrokes = d.MinByPlayer(d.bstrokes, in_range)
+        points = [self.PointsByPlayer(which, in_range) \
+                  for which in ['f', 'b', 'o']]
+        for (idx, pnum) in enumerate(d.players):
+            if not rnd_cnts[idx]:
+                continue
+            sr = rdb.SearchResult(int(pnum))
+            sr.rnd_cnt = int(rnd_cnts[idx])
+            sr.acnt = int(acnts[idx])
+            sr.ecnt = int(ecnts[idx])
+            sr.aecnt = int(aecnts[idx])
+            sr.won_9s = int(won_9s[idx])
+            sr.won_18s = int(won_18s[idx])
+            sr.won_33s = int(won_33s[idx])
+            sr.best_fstrokes = int(best_fstrokes[idx])
+            sr.best_bstrokes = int(best_bstrokes[idx])
+            (sr.front_pts, sr.back_pts, sr.overall_pts) = \
+                [pts[idx] for pts in points]
+            summary.results[sr.pnum] = sr
+        md = self.money_details
+        md_in_range = (md.rdate >= start) & (md.rdate <= stop)
+        for (pnum, cents) in zip(md.players,
+                                 md.SumByPlayer(md.cents, md_in_range)):
+            sr = summary.results.get(int(pnum))
+            if sr is not None:
+                sr.money_cents = int(cents)
+        summary.round_count = np.unique(d.round_num[in_range]).size
+        mr_in_range = (self.mround_rdate >= start) & \
+                      (self.mround_rdate <= stop)
+        summary.mz_kitty_amt = Money(int(np.sum(
+            (self.mround_kitty_tries * self.mround_players)[mr_in_range])))
+        dprint("Report generated:", summary)
+        return summary
+
+
+Columns = None
+ColumnsKey = None
+
+
+def get_columns():
+    '''
+    Return the ScoreColumns for the current rdb data, building them
+    if rdb has reloaded or refreshed anything since they were built
+    '''
+    global Columns
+    global ColumnsKey
+
+    key = (id(rdb.RoundList), id(rdb.RoundDetailList),
+           id(rdb.MoneyRoundDetailList), rdb.ChangeHub.version)
+    if Columns is None or key != ColumnsKey:
+        Columns = ScoreColumns()
+        ColumnsKey = key
+    return Columns
+
+
+def report_results(start_rdate, stop_rdate):
+    '''
+    Summarize how each player did from start_rdate to stop_rdate,
+    using our columns if we have NumPy, else letting the DB do it
+    '''
+    if np is None:
+        return rdb.report_results(start_rdate, stop_rdate)
+    return get_columns().ReportResults(start_rdate, stop_rdate)
@@ -0,0 +1,108 @@
+#!/usr/bin/python
+'''
+Precanned date ranges, for reports
+
+These are plain datetimes, so they can be used without the GUI (see
+wxdate.py for wx.DateTime versions of them).
+'''
+
+__version__ = "1.0"
+__author__ = "Lee Duncan"
+
+
+import datetime as dt
+from dateutil.parser import parse as parse_date_str
+
+from utils import dprint
+
+
+DATE_RANGES = ['<Choose a Range>',
+               'YTD',
+               'MTD',
+               'Last Year',
+               'Last Month',
+               'All Time']
+
+
+def range_key_from_str(s):
+    '''
+    Return the date range key (from DATE_RANGES) that a string names,
+    ignoring case, spaces, dashes and underscores (so "last-year"
+    names "Last Year"), or None if it names none of them
+    '''
+    def squash(k):
+        return k.lower().replace(' ', '').replace('-', '').replace('_', '')
+    for key in DATE_RANGES[1:]:
+        if squash(key) == squash(s):
+            return key
+    return None
+
+
+def range_from_key(key, today=None):
+    '''
+    return a starting and ending datetime for each known date range
+    choice, relative to "today" (which defaults to today)
+    '''
+    if key == DATE_RANGES[0]:
+        raise Exception("Must supply a date range")
+    if key not in DATE_RANGES:
+        raise Exception("Date Range '%s' not legal" % key)
+    if today is None:
+        today = dt.datetime.today()
+    today = dt.datetime(today.year, today.month, today.day)
+    if key == 'YTD':
+        dprint("Using 1/1/THISYEAR to NOW")
+        dt_end = today
+        dt_start = today.replace(month=1, day=1)
+    elif key == 'MTD':
+        dprint("Using 1/1/THISMONTH to NOW")
+        dt_end = today
+        dt_start = today.replace(day=1)
+    elif key == 'Last Year':
+        dprint("Using 1/1/LASTYEAR to 12/31/LASTYEAR")
+        last_yr = today.year - 1
+        dt_start = dt.datetime(last_yr, 1, 1)
+        dt_end = dt.datetime(last_yr, 12, 31)
+    elif key == 'Last Month':
+        dprint("Using Beginning to end of Last month")
+        # the last day of last month is the day before the first of this one
+        dt_end = today.replace(day=1) - dt.timedelta(days=1)
+        dt_start = dt_end.replace(day=1)
+    elif key == 'All Time':
+        dt_start = dt.datetime(1900, 1, 1)
+        dt_end = dt.datetime(3000, 12, 31)
+    else:
+        raise Exception("Unknown date range: '%s'" % key)
+    ################################################################
+    dprint("Found start date of: %s" % dt_start)
+    dprint("Found end date of: %s" % dt_end)
+    return (dt_start, dt_end)
+
+
+def parse_range(range_name=None, start=None, end=None):
+    '''
+    Return the starting and ending datetimes for either a precanned
+    range name (see range_key_from_str()), or starting and ending date
+    strings, as given on a command line. Raise ValueError, with a
+    message for the user, if they do not name a date range.
+    '''
+    range_names = ', '.join(DATE_RANGES[1:])
+    if range_name:
+        if start or end:
+            raise ValueError("use a date range name, or dates, not both")
+        key = range_key_from_str(range_name)
+        if key is None:
+            raise ValueError("unknown date range: %s (use one of: %s)" % \
+                             (range_name, range_names))
+        return range_from_key(key)
+    if not (start and end):
+        raise ValueError("need a date range name, or starting and " + \
+                         "ending dates")
+    try:
+        start_rdate = parse_date_str(start)
+        stop_rdate = parse_date_str(end)
+    except ValueError, e:
+        raise ValueError("bad date: %s" % e)
+    if stop_rdate < start_rdate:
+        raise ValueError("ending date is before starting date")
+    return (start_rdate, stop_rdate)
@@ -0,0 +1,157 @@
+#!/usr/bin/python
+'''
+Disc Golf database schema versions, and the upgrades between them
+
+The schema version of a DB file is kept in its "user_version". Each
+entry in SCHEMA_UPGRADES upgrades a DB from the version before it to
+the version listed, so any older DB file can be brought up to date,
+in place, one step at a time.
+
+This is run by rdb.init_db() every time the database is opened, but
+it can also be run by hand, to see (or apply) any pending upgrades.
+'''
+
+__version__ = "1.0"
+__author__ = "Lee Duncan"
+
+
+import sys
+from optparse import OptionParser
+import sqlite3
+from dateutil.parser import parse as parse_date_str
+
+import fingerprint
+from utils import dprint
+from opts import opts
+
+
+#
+# each entry is: (new version, description, list of SQL commands)
+#
+
+SCHEMA_UPGRADES = [
+    # round dates used to be "%m/%d/%Y", which does not sort, so
+    # switch them to ISO-8601, and index them
+    (1, "ISO-8601 round dates, with an index",
+     ['UPDATE rounds SET rdate = iso_date(rdate)',
+      'CREATE INDEX IF NOT EXISTS rounds_rdate_idx ON rounds(rdate)']),
+    # the details tables are keyed on (round_num, player_num), which
+    # does not help finding all of one player's rounds, and nothing
+    # helps finding the rounds played at a course
+    (2, "indexes for per-player and per-course lookups",
+     ['''CREATE INDEX IF NOT EXISTS round_details_player_idx
+             ON round_details(player_num, round_num)''',
+      '''CREATE INDEX IF NOT EXISTS money_round_details_player_idx
+             ON money_round_details(player_num, round_num)''',
+      '''CREATE INDEX IF NOT EXISTS rounds_course_idx
+             ON rounds(course_num, rdate)''']),
+    # keep fingerprints of each round's details (see fingerprint.py),
+    # so stale scores can be found without re-scoring every round
+    (3, "round detail fingerprints",
+     ['ALTER TABLE rounds ADD COLUMN inputs_fp TEXT',
+      'ALTER TABLE rounds ADD COLUMN scores_fp TEXT',
+      'ALTER TABLE rounds ADD COLUMN scored_inputs_fp TEXT',
+      fingerprint.SQL_UPDATE_FINGERPRINTS]),
+    ]
+
+SCHEMA_VERSION = SCHEMA_UPGRADES[-1][0]
+
+
+def date_str_to_iso(rdate_str):
+    '''Convert a round date string in any format to ISO-8601'''
+    if rdate_str is None:
+        return None
+    return parse_date_str(rdate_str).strftime("%Y-%m-%d")
+
+
+def get_schema_version(conn):
+    '''Return the schema version of the DB'''
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def pending_upgrades(conn):
+    '''Return the list of upgrades this DB needs, which may be empty'''
+    version = get_schema_version(conn)
+    if version > SCHEMA_VERSION:
+        raise Exception("DB schema version %d is newer than ours (%d)" % \
+                        (version, SCHEMA_VERSION))
+    return [u for u in SCHEMA_UPGRADES if u[0] > version]
+
+
+def upgrade_db(conn):
+    '''
+    Upgrade the DB in place to the current schema version, if needed,
+    with each step in its own transaction. Return the number of
+    upgrade steps done.
+    '''
+    upgrades = pending_upgrades(conn)
+    if not upgrades:
+        return 0
+    # older DBs have "%m/%d/%Y" round dates, so give the DB a way to
+    # convert them
+    conn.create_function('iso_date', 1, date_str_to_iso)
+    # and a way to work out round fingerprints
+    fingerprint.register_functions(conn)
+    # take over transaction handling, since sqlite3 would otherwise
+    # commit for us before each CREATE or PRAGMA
+    saved_isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        for (new_version, description, cmds) in upgrades:
+            dprint("Upgrading DB schema to version %d: %s ..." % \
+                   (new_version, description))
+            conn.execute('BEGIN')
+            try:
+                for cmd in cmds:
+                    dprint("sqlite3 cmd: %s" % cmd)
+                    conn.execute(cmd)
+                conn.execute('PRAGMA user_version = %d' % new_version)
+                conn.execute('COMMIT')
+            except:
+                conn.execute('ROLLBACK')
+                raise
+    finally:
+        conn.isolation_level = saved_isolation_level
+    return len(upgrades)
+
+
+################################################################
+
+def parse_options():
+    parser = OptionParser(version='%prog ' + __version__,
+                          usage='usage: %prog [options] [DB-FILE]',
+                          description='Disc Golf Database Schema, ' + \
+                              'version ' + __version__)
+    parser.add_option('-d', '--debug', action='store_true',
+                      help='enter debug mode [%default]')
+    parser.add_option('-u', '--upgrade', action='store_true',
+                      help='apply any pending upgrades [%default]')
+    (o, a) = parser.parse_args()
+    opts.debug = o.debug
+    opts.upgrade = o.upgrade
+    if len(a) > 1:
+        parser.error("too many arguments")
+    return a[0] if a else None
+
+
+def main():
+    import rdb
+
+    db_path = parse_options() or rdb.DB_PATH
+    conn = sqlite3.connect(db_path)
+    print "%s: schema version %d (current is %d)" % \
+          (db_path, get_schema_version(conn), SCHEMA_VERSION)
+    upgrades = pending_upgrades(conn)
+    for (new_version, description, cmds) in upgrades:
+        print "  pending upgrade to version %d: %s" % \
+              (new_version, description)
+    if upgrades and opts.upgrade:
+        upgrade_db(conn)
+        print "%s: upgraded to schema version %d" % \
+              (db_path, get_schema_version(conn))
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
+    sys.exit(0)
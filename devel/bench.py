@@ -0,0 +1,348 @@
+#!/usr/bin/python
+'''
+Disc Golf micro-benchmarks
+
+Run from the top directory, e.g.:
+
+    PYTHONPATH=. python devel/bench.py [BENCH ...]
+
+Each "bench_<name>()" function here is one benchmark, and prints its
+own results. With no arguments, all benchmarks are run.
+
+These are side-by-side comparisons of two ways of doing one thing
+(e.g. the old and new layout of the round detail records), each on
+its own in-memory synthetic rows, to show what one change bought. To
+track how the program as a whole performs over time, and catch
+regressions, use bench_suite.py instead: it times the real hot paths
+against generated databases, and saves and compares JSON results.
+'''
+
+import sys
+import time
+import random
+import datetime
+from optparse import OptionParser
+
+from opts import opts
+from utils import dprint, get_logger
+from myfraction import MyFraction, ScoreTally
+import score
+from money import Money, money_sum
+from dateutil.parser import parse as parse_date_str
+import rdb
+import columnar
+
+
+__author__ = "Lee Duncan"
+__version__ = "1.0"
+
+
+#
+# size of our synthetic history: about 20 years of weekly rounds
+#
+
+SYNTH_ROUNDS = 1000
+SYNTH_PLAYERS_PER_ROUND = 12
+
+# enough rounds for a few hundred thousand round details
+SYNTH_REPORT_ROUNDS = 25000
+
+# enough rounds to see what decoding their dates costs
+SYNTH_DATE_ROUNDS = 20000
+
+
+def deep_sizeof(obj, seen=None):
+    '''Return the size of obj and everything it refers to, in bytes'''
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for (k, v) in obj.iteritems():
+            size += deep_sizeof(k, seen) + deep_sizeof(v, seen)
+    elif isinstance(obj, (list, tuple, set)):
+        for item in obj:
+            size += deep_sizeof(item, seen)
+    if hasattr(obj, '__dict__'):
+        size += deep_sizeof(obj.__dict__, seen)
+    for cls in type(obj).__mro__:
+        for attr in getattr(cls, '__slots__', ()):
+            if hasattr(obj, attr):
+                size += deep_sizeof(getattr(obj, attr), seen)
+    return size
+
+
+def timed(func, *args):
+    '''Call func(*args), returning (its result, seconds taken)'''
+    start = time.time()
+    res = func(*args)
+    return (res, time.time() - start)
+
+
+def synth_round_detail_rows(nrounds, nplayers):
+    '''Return synthetic "round_details" and "money_round_details" rows'''
+    rd_rows = []
+    mrd_rows = []
+    for rnum in range(1, nrounds + 1):
+        for pnum in range(1, nplayers + 1):
+            rd_rows.append((rnum, pnum,
+                            random.randint(-5, 10), random.randint(-5, 10),
+                            random.randint(0, 1), random.randint(0, 3), 0,
+                            random.randint(0, 9), random.choice((1, 2, 3)),
+                            random.randint(0, 9), random.choice((1, 2, 3)),
+                            random.randint(0, 15), random.choice((1, 2, 3))))
+            mrd_rows.append((rnum, pnum,
+                             random.choice((0, 0, 0, 125, 800)),
+                             random.choice((0, 0, 0, 125, 800)),
+                             random.choice((0, 0, 0, 125, 800))))
+    return (rd_rows, mrd_rows)
+
+
+class LegacyRoundDetail:
+    '''A round detail laid out the way rdb used to: a __dict__ per row'''
+    def __init__(self, row):
+        (self.round_num, self.player_num,
+         self.fstrokes, self.bstrokes,
+         self.acnt, self.ecnt, self.aecnt) = row[:7]
+        self.calc_fscore = MyFraction(row[7], row[8])
+        self.calc_bscore = MyFraction(row[9], row[10])
+        self.calc_oscore = MyFraction(row[11], row[12])
+
+
+class LegacyMoneyRoundDetail:
+    '''A money round detail laid out the way rdb used to'''
+    def __init__(self, row):
+        self.round_num = row[0]
+        self.player_num = row[1]
+        self.moola_rnd = [Money(0, c) for c in row[2:]]
+
+
+def load_legacy(rd_rows, mrd_rows):
+    return ([LegacyRoundDetail(r) for r in rd_rows],
+            [LegacyMoneyRoundDetail(r) for r in mrd_rows])
+
+
+def load_slots(rd_rows, mrd_rows):
+    return ([rdb.RoundDetail.FromValues(*r) for r in rd_rows],
+            [rdb.MoneyRoundDetail.FromValues(*r) for r in mrd_rows])
+
+
+def bench_records():
+    '''Memory and load time of the cached round detail records'''
+    random.seed(1)
+    (rd_rows, mrd_rows) = synth_round_detail_rows(SYNTH_ROUNDS,
+                                                  SYNTH_PLAYERS_PER_ROUND)
+    print "records: %d rounds, %d round details, %d money round details" % \
+          (SYNTH_ROUNDS, len(rd_rows), len(mrd_rows))
+    for (name, loader) in [('legacy', load_legacy), ('slots', load_slots)]:
+        best = None
+        for i in range(3):
+            (records, secs) = timed(loader, rd_rows, mrd_rows)
+            if best is None or secs < best:
+                best = secs
+        # the rows are shared by both layouts, so don't count them
+        size = deep_sizeof(records, set(id(v) for r in rd_rows for v in r) |
+                                    set(id(v) for r in mrd_rows for v in r))
+        print "  %-8s load=%7.1f ms  size=%6.2f MB  (%d bytes/row)" % \
+              (name, best * 1000, size / (1024.0 * 1024.0),
+               size / (len(rd_rows) + len(mrd_rows)))
+
+
+def load_synth_rdb(nrounds, nplayers):
+    '''Fill in rdb's lists with a synthetic history, without a DB'''
+    (rd_rows, mrd_rows) = synth_round_detail_rows(nrounds, nplayers)
+    first_day = datetime.datetime(2000, 1, 1)
+    rdb.RoundList = {}
+    rdb.MoneyRoundList = {}
+    for rnum in range(1, nrounds + 1):
+        rnd = rdb.Round(rnum, 1)
+        rnd.rdate = first_day + datetime.timedelta(rnum)
+        rdb.RoundList[rnum] = rnd
+        rdb.MoneyRoundList[rnum] = rdb.MoneyRound(rnum,
+                                                  random.randint(0, 7),
+                                                  random.randint(0, 7),
+                                                  random.randint(0, 7))
+    (rd_list, mrd_list) = load_slots(rd_rows, mrd_rows)
+    rdb.RoundDetailList = rdb.DetailIndex()
+    for rd in rd_list:
+        rdb.RoundDetailList.append(rd)
+    rdb.MoneyRoundDetailList = rdb.DetailIndex()
+    for mrd in mrd_list:
+        rdb.MoneyRoundDetailList.append(mrd)
+    return first_day
+
+
+def loop_report(start_rdate, stop_rdate):
+    '''The score report, one SearchResult.AddRoundResults() at a time'''
+    results = {}
+    for rd in rdb.RoundDetailList:
+        rdate = rdb.RoundList[rd.round_num].rdate
+        if start_rdate <= rdate <= stop_rdate:
+            if rd.player_num not in results:
+                results[rd.player_num] = rdb.SearchResult(rd.player_num)
+            results[rd.player_num].AddRoundResults(rd)
+    for mrd in rdb.MoneyRoundDetailList:
+        rdate = rdb.RoundList[mrd.round_num].rdate
+        if start_rdate <= rdate <= stop_rdate and \
+           mrd.player_num in results:
+            results[mrd.player_num].AddMoneyRoundResults(mrd)
+    return results
+
+
+def bench_report():
+    '''Per-player score report: object loop vs NumPy columns'''
+    if columnar.np is None:
+        print "report: skipped (no NumPy)"
+        return
+    random.seed(1)
+    first_day = load_synth_rdb(SYNTH_REPORT_ROUNDS, SYNTH_PLAYERS_PER_ROUND)
+    start = first_day
+    stop = first_day + datetime.timedelta(SYNTH_REPORT_ROUNDS)
+    print "report: %d round details, %d money round details" % \
+          (len(rdb.RoundDetailList), len(rdb.MoneyRoundDetailList))
+    (loop_res, secs) = timed(loop_report, start, stop)
+    print "  %-14s %8.1f ms" % ('object loop', secs * 1000)
+    (cols, secs) = timed(columnar.ScoreColumns)
+    print "  %-14s %8.1f ms" % ('columns build', secs * 1000)
+    (summary, secs) = timed(cols.ReportResults, start, stop)
+    print "  %-14s %8.1f ms" % ('columns report', secs * 1000)
+    for (pnum, sr) in loop_res.iteritems():
+        if str(sr) != str(summary.results[pnum]):
+            raise Exception("Internal Error: report results differ")
+
+
+def bench_dates():
+    '''Decoding round dates when loading rounds: dateutil vs fast path'''
+    first_day = datetime.datetime(2000, 1, 1)
+    for (name, rounds_per_day) in [('1 per day', 1), ('4 per day', 4)]:
+        rdate_strs = [(first_day + datetime.timedelta(i / rounds_per_day)).\
+                      strftime("%Y-%m-%d") for i in range(SYNTH_DATE_ROUNDS)]
+        print "dates: %d rounds, %s (%d distinct dates)" % \
+              (len(rdate_strs), name, len(set(rdate_strs)))
+        (old, secs) = timed(lambda: [parse_date_str(s) for s in rdate_strs])
+        print "  %-10s %8.1f ms" % ('dateutil', secs * 1000)
+        rdb.RdateCache.clear()
+        (new, secs) = timed(lambda: [rdb.rdate_from_db_str(s) \
+                                     for s in rdate_strs])
+        print "  %-10s %8.1f ms" % ('fast', secs * 1000)
+        (new, secs) = timed(lambda: [rdb.rdate_from_db_str(s) \
+                                     for s in rdate_strs])
+        print "  %-10s %8.1f ms" % ('cached', secs * 1000)
+        if old != new:
+            raise Exception("Internal Error: decoded dates differ")
+
+
+def bench_money():
+    '''Adding up money round winnings: Money objects vs integer cents'''
+    random.seed(1)
+    (rd_rows, mrd_rows) = synth_round_detail_rows(SYNTH_REPORT_ROUNDS,
+                                                  SYNTH_PLAYERS_PER_ROUND)
+    mrd_list = load_slots([], mrd_rows)[1]
+    print "money: %d money round details" % len(mrd_list)
+    def add_money():
+        total = Money(0)
+        for mrd in mrd_list:
+            total += mrd.GetMoney()
+        return total
+    (old, secs) = timed(add_money)
+    print "  %-10s %8.1f ms" % ('Money +=', secs * 1000)
+    (new, secs) = timed(lambda: money_sum(c for mrd in mrd_list \
+                                          for c in mrd.moola_cents))
+    print "  %-10s %8.1f ms" % ('money_sum', secs * 1000)
+    if old != new:
+        raise Exception("Internal Error: money totals differ")
+
+
+def bench_points():
+    '''Adding up points: MyFraction sums vs an integer ScoreTally'''
+    random.seed(1)
+    (rd_rows, mrd_rows) = synth_round_detail_rows(SYNTH_REPORT_ROUNDS,
+                                                  SYNTH_PLAYERS_PER_ROUND)
+    rd_list = load_slots(rd_rows, [])[0]
+    print "points: %d round details" % len(rd_list)
+    def add_fractions():
+        total = MyFraction()
+        for rd in rd_list:
+            total += rd.calc_fscore
+        return total
+    (old, secs) = timed(add_fractions)
+    print "  %-12s %8.1f ms" % ('MyFraction', secs * 1000)
+    def add_tally():
+        tally = ScoreTally(0, score.SCORE_DENOMINATOR)
+        for rd in rd_list:
+            tally.Add(rd.calc_fscore_numerator, rd.calc_fscore_denominator)
+        return tally.AsFraction()
+    (new, secs) = timed(add_tally)
+    print "  %-12s %8.1f ms" % ('ScoreTally', secs * 1000)
+    if old != new:
+        raise Exception("Internal Error: point totals differ")
+    score_lists = [sorted(random.randint(-3, 6) for i in range(12)) \
+                   for j in range(SYNTH_REPORT_ROUNDS)]
+    (res, secs) = timed(lambda: [score.calculate_score(sl, score.ROUND_SCORES)
+                                 for sl in score_lists])
+    print "  %-12s %8.1f ms (%d rounds of 12 players)" % \
+          ('calc_score', secs * 1000, len(score_lists))
+
+
+def bench_logging():
+    '''Cost of debug messages with debugging off: dprint vs Logger'''
+    random.seed(1)
+    (rd_rows, mrd_rows) = synth_round_detail_rows(SYNTH_REPORT_ROUNDS,
+                                                  SYNTH_PLAYERS_PER_ROUND)
+    rd_list = load_slots(rd_rows, [])[0]
+    log = get_logger('bench')
+    print "logging: %d debug messages, debugging off" % len(rd_list)
+    def eager_dprint():
+        for rd in rd_list:
+            dprint("*** Adding in results: %s" % rd)
+    def lazy_log():
+        for rd in rd_list:
+            log.Debug("*** Adding in results: %s", rd)
+    def no_msg():
+        for rd in rd_list:
+            pass
+    for (name, func) in [('dprint', eager_dprint),
+                         ('Logger', lazy_log),
+                         ('(none)', no_msg)]:
+        (res, secs) = timed(func)
+        print "  %-10s %8.1f ms" % (name, secs * 1000)
+    first_day = load_synth_rdb(SYNTH_ROUNDS * 10, SYNTH_PLAYERS_PER_ROUND)
+    (res, secs) = timed(loop_report, first_day,
+                        first_day + datetime.timedelta(SYNTH_ROUNDS * 10))
+    print "  report loop over %d round details: %.1f ms" % \
+          (len(rdb.RoundDetailList), secs * 1000)
+
+
+################################################################
+
+def all_benches():
+    return sorted(n[len('bench_'):] for n in globals() \
+                  if n.startswith('bench_'))
+
+
+def parse_options():
+    parser = OptionParser(version='%prog ' + __version__,
+                          usage='usage: %prog [options] [BENCH ...]',
+                          description='Disc Golf Benchmarks, ' + \
+                              'version ' + __version__ + \
+                              ' (benches: ' + ', '.join(all_benches()) + ')')
+    parser.add_option('-d', '--debug', action='store_true',
+                      help='enter debug mode [%default]')
+    (o, a) = parser.parse_args()
+    opts.debug = o.debug
+    for name in a:
+        if name not in all_benches():
+            parser.error("unknown benchmark: %s" % name)
+    return a or all_benches()
+
+
+def main():
+    for name in parse_options():
+        globals()['bench_' + name]()
+
+
+if __name__ == '__main__':
+    main()
+    sys.exit(0)
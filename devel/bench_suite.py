@@ -0,0 +1,340 @@
+#!/usr/bin/python
+'''
+Disc Golf benchmark suite: our hot paths, on databases of growing size
+
+Run from the top directory, e.g.:
+
+    PYTHONPATH=. python devel/bench_suite.py -o before.json
+    ... change things ...
+    PYTHONPATH=. python devel/bench_suite.py -o after.json -b before.json
+
+For each size (years of synthetic history, see gen_synthetic_db.py),
+a database is generated (once, and kept in the work directory), and
+these are timed against a scratch copy of it:
+
+  init_db_cold     rdb.init_db(), with no snapshot (so it saves one)
+  init_db_warm     rdb.init_db(), from the snapshot
+  report           the report frame's GenerateResultsList(), headless:
+                   columnar.report_results() plus results.report_items()
+  report_sql       rdb.report_results(), done by the DB
+  format           results.report_lines(), for the whole report
+  add_round        rdb.add_round() and rdb.commit_db(), for a new round
+  modify_round     rdb.modify_round() and rdb.commit_db(), for that round
+  snapshot_save    rdb.save_snapshot() (which the GUI does after commits)
+
+and score.score_round() is timed (per round) for several field sizes.
+
+Each is run several times, and the best and median times are kept.
+The results are written as JSON, keyed by "bench:size", so that two
+runs can be compared, with "-b" (against a run just made) or "-c"
+(two saved runs). Comparing exits non-zero if anything got slower
+by more than the threshold.
+
+This is the benchmark to run before and after a change, to see that
+nothing got slower. The micro-benchmarks in bench.py are something
+else: side-by-side comparisons of an old and a new way of doing one
+thing, kept to show what each of those changes bought.
+'''
+
+import os
+import sys
+import time
+import json
+import random
+import shutil
+import datetime
+from optparse import OptionParser
+
+from opts import opts
+from utils import dprint
+import score
+import rdb
+import columnar
+import results
+import snapshot
+import gen_synthetic_db
+
+
+__author__ = "Lee Duncan"
+__version__ = "1.0"
+
+
+# the format of our JSON results
+RESULTS_FORMAT = 1
+
+# sizes of database to run against, in years of history
+DEFAULT_YEARS = [1, 4, 16]
+
+# field sizes (players per round) to time scoring for, and how many
+# player-rounds to score for each
+SCORE_FIELD_SIZES = [5, 20, 100, 500]
+SCORE_PLAYER_ROUNDS = 20000
+
+# how many players in the rounds added for the commit benchmarks
+COMMIT_ROUND_PLAYERS = 20
+
+# how much slower is a regression, by default
+DEFAULT_THRESHOLD = 1.25
+
+
+def time_runs(func, repeat, setup=None):
+    '''
+    Call func() "repeat" times (calling setup() before each, untimed),
+    and return the list of seconds each call took
+    '''
+    res = []
+    for i in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.time()
+        func()
+        res.append(time.time() - start)
+    return res
+
+
+def result_entry(secs_list, **info):
+    '''Return a results entry for a list of run times'''
+    secs_list = sorted(secs_list)
+    entry = {'best': secs_list[0],
+             'median': secs_list[len(secs_list) // 2],
+             'runs': len(secs_list)}
+    entry.update(info)
+    return entry
+
+
+def synth_db_path(work_dir, years):
+    return os.path.join(work_dir, "synth-y%d.db" % years)
+
+
+def ensure_synth_db(work_dir, years):
+    '''Return the path of the synthetic DB of this size, making it if need be'''
+    db_path = synth_db_path(work_dir, years)
+    if not os.path.exists(db_path):
+        if not os.path.isdir(work_dir):
+            os.makedirs(work_dir)
+        print >>sys.stderr, "Generating %s ..." % db_path
+        gen_synthetic_db.generate_db(db_path, years=years)
+    return db_path
+
+
+def remove_snapshot():
+    path = snapshot.snapshot_path(rdb.DB_PATH)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def new_round_details(rnum, player_nums):
+    '''Return a scored RoundDetail list, with random strokes'''
+    rd_list = [rdb.RoundDetail.FromValues(rnum, pnum,
+                                          random.randint(-3, 6),
+                                          random.randint(-3, 6),
+                                          0, 0, 0, 0, 1, 0, 1, 0, 1) \
+               for pnum in player_nums]
+    return score.score_round(rd_list)
+
+
+def bench_db(db_path, label, repeat, res):
+    '''Run the benchmarks for one DB size, adding them to res'''
+    scratch_path = db_path + '.scratch'
+    shutil.copy(db_path, scratch_path)
+    rdb.DB_PATH = scratch_path
+    try:
+        run_db_benches(label, repeat, res)
+    finally:
+        rdb.ChangeHub.SetSaveScheduler(None)
+        remove_snapshot()
+        os.remove(scratch_path)
+        rdb.DB_PATH = "%s/%s" % (rdb.DB_DIR, rdb.DB_FILE)
+
+
+def run_db_benches(label, repeat, res):
+    def note(name, secs_list, **info):
+        res["%s:%s" % (name, label)] = result_entry(secs_list, **info)
+        dprint("%s:%s:" % (name, label), res["%s:%s" % (name, label)])
+
+    note('init_db_cold', time_runs(rdb.init_db, repeat, remove_snapshot))
+    note('init_db_warm', time_runs(rdb.init_db, repeat))
+    info = {'rounds': len(rdb.RoundList),
+            'round_details': len(rdb.RoundDetailList)}
+    (first_rdate, last_rdate) = rdb.first_and_last_round_dates()
+    def report():
+        summary = columnar.report_results(first_rdate, last_rdate)
+        return results.report_items(summary)
+    def fresh_columns():
+        columnar.Columns = None
+    note('report', time_runs(report, repeat, fresh_columns), **info)
+    note('report_sql',
+         time_runs(lambda: rdb.report_results(first_rdate, last_rdate),
+                   repeat), **info)
+    summary = rdb.report_results(first_rdate, last_rdate)
+    items = results.sorted_items(results.report_items(summary))
+    note('format',
+         time_runs(lambda: results.report_lines(first_rdate, last_rdate,
+                                                summary, items), repeat),
+         players=len(items))
+    # the GUI saves the snapshot later, after a burst of commits, so
+    # time that on its own
+    rdb.ChangeHub.SetSaveScheduler(lambda save: None)
+    player_nums = sorted(rdb.PlayerList)[:COMMIT_ROUND_PLAYERS]
+    added = []
+    def add_round():
+        rnum = rdb.next_round_num()
+        rnd = rdb.Round(rnum, 1, rdb.rdate_to_db_str(last_rdate))
+        rdb.add_round(rnd, new_round_details(rnum, player_nums))
+        rdb.commit_db()
+        added.append(rnd)
+    note('add_round', time_runs(add_round, repeat),
+         players=len(player_nums))
+    def modify_round():
+        rnd = added[-1]
+        rdb.modify_round(rnd, new_round_details(rnd.num, player_nums))
+        rdb.commit_db()
+    note('modify_round', time_runs(modify_round, repeat),
+         players=len(player_nums))
+    rdb.ChangeHub.SetSaveScheduler(None)
+    note('snapshot_save', time_runs(rdb.save_snapshot, repeat), **info)
+
+
+def bench_scoring(repeat, res):
+    '''Time score.score_round() for several field sizes'''
+    for field_size in SCORE_FIELD_SIZES:
+        nrounds = max(1, SCORE_PLAYER_ROUNDS // field_size)
+        rounds = [new_round_details(rnum, range(1, field_size + 1)) \
+                  for rnum in range(nrounds)]
+        def score_all():
+            for rd_list in rounds:
+                score.score_round(rd_list)
+        secs_list = [secs / nrounds for secs in time_runs(score_all, repeat)]
+        res["score_round:p%d" % field_size] = \
+            result_entry(secs_list, rounds=nrounds)
+
+
+def run_suite(years_list, work_dir, repeat):
+    '''Run all of the benchmarks, returning our results (for JSON)'''
+    random.seed(1)
+    res = {}
+    bench_scoring(repeat, res)
+    for years in years_list:
+        db_path = ensure_synth_db(work_dir, years)
+        bench_db(db_path, "y%d" % years, repeat, res)
+    return {'format': RESULTS_FORMAT,
+            'when': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'python': sys.version.split()[0],
+            'numpy': None if columnar.np is None else columnar.np.__version__,
+            'repeat': repeat,
+            'results': res}
+
+
+def result_sort_key(key):
+    '''Sort results by benchmark, then by size (numerically)'''
+    (name, size) = key.split(':', 1)
+    return (name, size[0], int(size[1:]))
+
+
+def print_results(run):
+    print "%-26s %10s %10s" % ('benchmark', 'best ms', 'median ms')
+    for key in sorted(run['results'], key=result_sort_key):
+        entry = run['results'][key]
+        print "%-26s %10.2f %10.2f" % (key, entry['best'] * 1000,
+                                       entry['median'] * 1000)
+
+
+def compare_runs(old, new, threshold):
+    '''
+    Print how each benchmark in "new" compares with "old" (by best
+    times), and return the number that are slower by more than the
+    threshold
+    '''
+    for run in (old, new):
+        if run.get('format') != RESULTS_FORMAT:
+            raise Exception("Unknown benchmark results format: %s" % \
+                            run.get('format'))
+    regressions = 0
+    print "%-26s %10s %10s %7s" % ('benchmark', 'old ms', 'new ms', 'ratio')
+    for key in sorted(set(old['results']) | set(new['results']),
+                     key=result_sort_key):
+        if key not in old['results'] or key not in new['results']:
+            print "%-26s (only in the %s run)" % \
+                  (key, 'old' if key in old['results'] else 'new')
+            continue
+        old_secs = old['results'][key]['best']
+        new_secs = new['results'][key]['best']
+        ratio = new_secs / old_secs if old_secs else 1.0
+        flag = ''
+        if ratio > threshold:
+            flag = '  SLOWER'
+            regressions += 1
+        print "%-26s %10.2f %10.2f %6.2fx%s" % \
+              (key, old_secs * 1000, new_secs * 1000, ratio, flag)
+    return regressions
+
+
+def read_run(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+################################################################
+
+def parse_options():
+    parser = OptionParser(version='%prog ' + __version__,
+                          usage='usage: %prog [options]\n' + \
+                              '       %prog -c OLD.json NEW.json',
+                          description='Disc Golf Benchmark Suite, ' + \
+                              'version ' + __version__)
+    parser.add_option('-d', '--debug', action='store_true',
+                      help='enter debug mode [%default]')
+    parser.add_option('-y', '--years', default=','.join(map(str,
+                                                            DEFAULT_YEARS)),
+                      help='DB sizes, in years of history [%default]')
+    parser.add_option('-r', '--repeat', type='int', default=5,
+                      help='how many times to run each benchmark ' + \
+                          '[%default]')
+    parser.add_option('-w', '--work-dir', default='/tmp/dg-bench',
+                      help='where to keep the synthetic DBs [%default]')
+    parser.add_option('-o', '--output', metavar='FILE',
+                      help='write the results, as JSON, to FILE')
+    parser.add_option('-b', '--baseline', metavar='FILE',
+                      help='compare the results with a previous run')
+    parser.add_option('-c', '--compare', action='store_true',
+                      help='just compare two previous runs [%default]')
+    parser.add_option('-t', '--threshold', type='float',
+                      default=DEFAULT_THRESHOLD,
+                      help='how many times slower is a regression ' + \
+                          '[%default]')
+    (o, a) = parser.parse_args()
+    opts.debug = o.debug
+    if o.compare:
+        if len(a) != 2:
+            parser.error("need two results files to compare")
+    elif a:
+        parser.error("too many arguments")
+    try:
+        o.years_list = [int(y) for y in o.years.split(',')]
+    except ValueError:
+        parser.error("bad list of years: %s" % o.years)
+    if o.repeat < 1:
+        parser.error("need to run each benchmark at least once")
+    return (o, a)
+
+
+def main():
+    (o, a) = parse_options()
+    if o.compare:
+        return compare_runs(read_run(a[0]), read_run(a[1]),
+                            o.threshold) == 0
+    run = run_suite(o.years_list, o.work_dir, o.repeat)
+    if o.output:
+        with open(o.output, 'w') as f:
+            json.dump(run, f, indent=2, sort_keys=True, separators=(',', ': '))
+            print >>f
+    if o.baseline:
+        return compare_runs(read_run(o.baseline), run, o.threshold) == 0
+    print_results(run)
+    return True
+
+
+if __name__ == '__main__':
+    if not main():
+        sys.exit(1)
+    sys.exit(0)
@@ -0,0 +1,159 @@
+#!/usr/bin/python
+'''
+Check the scoring engine (score.score_round) against the original
+one, kept here as legacy_score_round(), on lots of random rounds
+
+Run from the top directory, e.g.:
+
+    PYTHONPATH=. python devel/check_scoring.py [-n ROUNDS]
+
+Exits non-zero if any round is scored differently.
+'''
+
+import sys
+import copy
+import time
+import random
+from optparse import OptionParser
+
+from opts import opts
+from utils import dprint
+from myfraction import MyFraction
+import score
+import rdb
+
+
+__author__ = "Lee Duncan"
+__version__ = "1.0"
+
+
+#
+# the original scoring engine: three sorts, then a linear search of
+# each sorted list for every round detail
+#
+
+def legacy_score_round(rd_list):
+    front_list = sorted(rd_list, key=lambda rd: rd.fstrokes)
+    front_score_list = sorted([rd.fstrokes for rd in front_list])
+    front_score_results = legacy_calculate_score(front_score_list,
+                                                 score.ROUND_SCORES)
+    back_list = sorted(rd_list, key=lambda rd: rd.bstrokes)
+    back_score_list = sorted([rd.bstrokes for rd in back_list])
+    back_score_results = legacy_calculate_score(back_score_list,
+                                                score.ROUND_SCORES)
+    ttl_list = sorted(rd_list, key=lambda rd: rd.OverallStrokes())
+    ttl_score_list = sorted([rd.OverallStrokes() for rd in ttl_list])
+    ttl_score_results = legacy_calculate_score(ttl_score_list,
+                                               score.OVERALL_SCORES)
+    for rd in rd_list:
+        idx = 0
+        for frd in front_list:
+            if rd == frd:
+                break
+            idx += 1
+        rd.SetFrontCalcScore(front_score_results[idx])
+        idx = 0
+        for brd in back_list:
+            if rd == brd:
+                break
+            idx += 1
+        rd.SetBackCalcScore(back_score_results[idx])
+        idx = 0
+        for trd in ttl_list:
+            if rd == trd:
+                break
+            idx += 1
+        rd.SetOverallCalcScore(ttl_score_results[idx])
+    return rd_list
+
+
+def legacy_calculate_score(score_list, score_values):
+    scores_seen = {}
+    for s in score_list:
+        if not s in scores_seen.keys():
+            scores_seen[s] = 0
+        scores_seen[s] += 1
+    results = []
+    idx = 0
+    for score_val in sorted(scores_seen.keys()):
+        num_at_place = scores_seen[score_val]
+        if num_at_place == 1:
+            if idx < len(score_values):
+                val = MyFraction(score_values[idx])
+            else:
+                val = MyFraction()
+        else:
+            val = MyFraction()
+            for plc_idx in range(num_at_place):
+                new_idx = idx + plc_idx
+                if new_idx < len(score_values):
+                    val += score_values[new_idx]
+        score_each = MyFraction(val, num_at_place)
+        for plc_idx in range(num_at_place):
+            results.append(score_each)
+        idx += num_at_place
+    return results
+
+
+def random_round(rnum, nplayers):
+    '''Return a random, unscored round, with a lot of ties'''
+    spread = random.choice((2, 5, 10))
+    return [rdb.RoundDetail(rnum, pnum,
+                            random.randint(-spread, spread),
+                            random.randint(-spread, spread)) \
+            for pnum in random.sample(range(1, 200), nplayers)]
+
+
+def scores_of(rd_list):
+    return sorted((rd.player_num,
+                   rd.calc_fscore_numerator, rd.calc_fscore_denominator,
+                   rd.calc_bscore_numerator, rd.calc_bscore_denominator,
+                   rd.calc_oscore_numerator, rd.calc_oscore_denominator) \
+                  for rd in rd_list)
+
+
+def parse_options():
+    parser = OptionParser(version='%prog ' + __version__,
+                          usage='usage: %prog [options]',
+                          description='Disc Golf Scoring Check, ' + \
+                              'version ' + __version__)
+    parser.add_option('-d', '--debug', action='store_true',
+                      help='enter debug mode [%default]')
+    parser.add_option('-n', '--rounds', type='int', default=2000,
+                      help='how many random rounds to check [%default]')
+    parser.add_option('-s', '--seed', type='int', default=1,
+                      help='random number seed [%default]')
+    (o, a) = parser.parse_args()
+    opts.debug = o.debug
+    return o
+
+
+def main():
+    o = parse_options()
+    random.seed(o.seed)
+    bad = 0
+    legacy_secs = new_secs = 0.0
+    for rnum in range(1, o.rounds + 1):
+        rd_list = random_round(rnum, random.choice((1, 2, 5, 12, 30, 100)))
+        legacy_list = copy.deepcopy(rd_list)
+        start = time.time()
+        legacy_score_round(legacy_list)
+        legacy_secs += time.time() - start
+        start = time.time()
+        score.score_round(rd_list)
+        new_secs += time.time() - start
+        if scores_of(rd_list) != scores_of(legacy_list):
+            bad += 1
+            print "Round %d (%d players) scored differently" % \
+                  (rnum, len(rd_list))
+            dprint("legacy:", scores_of(legacy_list))
+            dprint("new:   ", scores_of(rd_list))
+    print "%d rounds checked, %d different " % (o.rounds, bad) + \
+          "(legacy %.2f s, new %.2f s)" % (legacy_secs, new_secs)
+    return bad == 0
+
+
+if __name__ == '__main__':
+    if not main():
+        sys.exit(1)
+    sys.exit(0)
@@ -0,0 +1,289 @@
+#!/usr/bin/python
+'''
+Generate a synthetic (but realistic) Disc Golf database, for testing
+how the program behaves with a lot more data than we really have
+
+Run from the top directory, e.g.:
+
+    PYTHONPATH=. python devel/gen_synthetic_db.py -o /tmp/big.db -y 20
+
+Each player has a skill (their average strokes over par for 9 holes)
+and an attendance rate, and plays each round with that chance. Each
+round is scored with score.score_round(), just as the GUI does it, and
+a money round is played after some rounds, by some of that round's
+players, with the pot going to whoever aces first (or to Mz Kitty).
+
+The same options (and seed) always generate the same database. The
+rows are written with executemany(), a batch of weeks at a time, in
+one transaction, and then the new DB is brought up to the current
+schema version (which fills in the round fingerprints).
+'''
+
+import os
+import sys
+import time
+import random
+import datetime
+from optparse import OptionParser
+import sqlite3
+
+from opts import opts
+from utils import dprint
+import dbschema
+import score
+import rdb
+import init_disc_golf_db
+
+
+__author__ = "Lee Duncan"
+__version__ = "1.0"
+
+
+FIRST_NAMES = ['Gary', 'Pat', 'Charlie', 'Dick', 'Gabe', 'Rick', 'John',
+               'Sean', 'Jonathon', 'Josh', 'Lee', 'Bill', 'Ann', 'Sue',
+               'Kim', 'Jo', 'Sam', 'Max', 'Alex', 'Chris']
+LAST_NAMES = ['Rogers', 'Olmstead', 'Smith', 'Jones', 'Brown', 'Miller',
+              'Davis', 'Garcia', 'Wilson', 'Moore', 'Taylor', 'Clark']
+
+# how spread out a player's strokes (over par, for 9 holes) are
+STROKES_SPREAD = 2.5
+
+# how often eagles and ace-eagles happen, compared with aces
+EAGLES_PER_ACE = 3
+ACE_EAGLES_PER_ACE = 0.1
+
+# the most money rounds after one round, and how often Mz Kitty wins one
+MAX_MONEY_ROUNDS = 3
+MZ_KITTY_RATE = 0.3
+
+# everyone antes this much (in cents) for each money round they play
+MONEY_ROUND_ANTE = 100
+
+# how many weeks of rounds to write with each executemany()
+WEEKS_PER_BATCH = 52
+
+
+class Player:
+    '''A synthetic player: how good they are, and how often they play'''
+    def __init__(self, num, name, full_name, skill, attendance):
+        self.num = num
+        self.name = name
+        self.full_name = full_name
+        self.skill = skill
+        self.attendance = attendance
+
+
+def make_players(count):
+    '''Return a list of "count" synthetic players'''
+    res = []
+    for pnum in range(1, count + 1):
+        first = random.choice(FIRST_NAMES)
+        last = random.choice(LAST_NAMES)
+        # names must be unique, and short, for the GUI
+        name = "%s %d" % (first[:8], pnum)
+        res.append(Player(pnum, name, "%s %s" % (first, last),
+                          random.gauss(2.0, 2.0),
+                          random.uniform(0.1, 0.9)))
+    return res
+
+
+def round_dates(start_date, years, rounds_per_week):
+    '''Return the date of each round, in order'''
+    res = []
+    for week in range(years * 52):
+        week_start = start_date + datetime.timedelta(weeks=week)
+        for day in sorted(random.sample(range(7), rounds_per_week)):
+            res.append(week_start + datetime.timedelta(days=day))
+    return res
+
+
+def play_round(rnum, players, ace_rate):
+    '''
+    Return the scored rdb.RoundDetail list for one round, played by
+    (at least two of) the players
+    '''
+    playing = [p for p in players if random.random() < p.attendance]
+    if len(playing) < 2:
+        playing = random.sample(players, 2)
+    rd_list = []
+    for p in playing:
+        # (not yet scored)
+        rd_list.append(rdb.RoundDetail.FromValues(
+            rnum, p.num,
+            int(round(random.gauss(p.skill, STROKES_SPREAD))),
+            int(round(random.gauss(p.skill, STROKES_SPREAD))),
+            int(random.random() < ace_rate),
+            int(random.random() < ace_rate * EAGLES_PER_ACE),
+            int(random.random() < ace_rate * ACE_EAGLES_PER_ACE),
+            0, 1, 0, 1, 0, 1))
+    return score.score_round(rd_list)
+
+
+def play_money_round(rnum, player_nums):
+    '''
+    Return the "money_rounds" row and "money_round_details" rows for a
+    money round played by these players after round "rnum"
+    '''
+    mrounds = [0] * MAX_MONEY_ROUNDS
+    winnings = dict((pnum, [0] * MAX_MONEY_ROUNDS) for pnum in player_nums)
+    pot = MONEY_ROUND_ANTE * len(player_nums)
+    for idx in range(random.randint(1, MAX_MONEY_ROUNDS)):
+        if random.random() < MZ_KITTY_RATE:
+            mrounds[idx] = rdb.MZ_KITTY_TRY
+        else:
+            # which try someone aced on, and who it was
+            mrounds[idx] = random.randint(1, rdb.MZ_KITTY_TRY - 1)
+            winnings[random.choice(player_nums)][idx] = pot
+    return ((rnum,) + tuple(mrounds),
+            [(rnum, pnum) + tuple(winnings[pnum]) for pnum in player_nums])
+
+
+def rd_row(rd):
+    '''Return the "round_details" row for a RoundDetail'''
+    return (rd.round_num, rd.player_num, rd.fstrokes, rd.bstrokes,
+            rd.acnt, rd.ecnt, rd.aecnt,
+            rd.calc_fscore_numerator, rd.calc_fscore_denominator,
+            rd.calc_bscore_numerator, rd.calc_bscore_denominator,
+            rd.calc_oscore_numerator, rd.calc_oscore_denominator)
+
+
+class Counts:
+    '''How many of each kind of row were written'''
+    def __init__(self):
+        self.rounds = 0
+        self.round_details = 0
+        self.money_rounds = 0
+        self.money_round_details = 0
+
+
+def write_rows(c, counts, rnd_rows, rd_rows, mrnd_rows, mrd_rows):
+    c.executemany("INSERT INTO rounds VALUES(?,?,?)", rnd_rows)
+    c.executemany("INSERT INTO round_details " + \
+                  "VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?)", rd_rows)
+    c.executemany("INSERT INTO money_rounds VALUES(?,?,?,?)", mrnd_rows)
+    c.executemany("INSERT INTO money_round_details VALUES(?,?,?,?,?)",
+                  mrd_rows)
+    counts.rounds += len(rnd_rows)
+    counts.round_details += len(rd_rows)
+    counts.money_rounds += len(mrnd_rows)
+    counts.money_round_details += len(mrd_rows)
+    dprint("Wrote %d rounds so far" % counts.rounds)
+
+
+def generate_db(db_path, seed=1, players=140, courses=6, rounds_per_week=2,
+                years=5, money_rate=0.7, money_players=0.8, ace_rate=0.01,
+                start_date=datetime.datetime(2010, 1, 4)):
+    '''
+    Create a new synthetic database in db_path (which must not exist),
+    returning the Counts of rows written
+    '''
+    if os.path.exists(db_path):
+        raise Exception("DB File already exists: %s" % db_path)
+    random.seed(seed)
+    conn = sqlite3.connect(db_path)
+    # this is a scratch DB: if we crash, it can just be made again
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA journal_mode = MEMORY')
+    c = conn.cursor()
+    init_disc_golf_db.initialize_players(c, create_empty=True)
+    init_disc_golf_db.initialize_courses(c, create_empty=True)
+    init_disc_golf_db.initialize_rounds(c, create_empty=True)
+    player_list = make_players(players)
+    c.executemany("INSERT INTO players VALUES(?,?,?)",
+                  [(p.num, p.name, p.full_name) for p in player_list])
+    c.executemany("INSERT INTO courses VALUES(?,?)",
+                  [(cnum, "Course %d" % cnum) \
+                   for cnum in range(1, courses + 1)])
+    counts = Counts()
+    (rnd_rows, rd_rows, mrnd_rows, mrd_rows) = ([], [], [], [])
+    rounds_per_batch = WEEKS_PER_BATCH * rounds_per_week
+    for (idx, rdate) in enumerate(round_dates(start_date, years,
+                                              rounds_per_week)):
+        rnum = idx + 1
+        rnd_rows.append((rnum, random.randint(1, courses),
+                         rdb.rdate_to_db_str(rdate)))
+        rd_list = play_round(rnum, player_list, ace_rate)
+        rd_rows.extend(rd_row(rd) for rd in rd_list)
+        if random.random() < money_rate:
+            player_nums = [rd.player_num for rd in rd_list \
+                           if random.random() < money_players]
+            if len(player_nums) >= 2:
+                (mrnd_row, details) = play_money_round(rnum, player_nums)
+                mrnd_rows.append(mrnd_row)
+                mrd_rows.extend(details)
+        if rnum % rounds_per_batch == 0:
+            write_rows(c, counts, rnd_rows, rd_rows, mrnd_rows, mrd_rows)
+            (rnd_rows, rd_rows, mrnd_rows, mrd_rows) = ([], [], [], [])
+    write_rows(c, counts, rnd_rows, rd_rows, mrnd_rows, mrd_rows)
+    conn.commit()
+    # bring the new DB up to the current schema version
+    dbschema.upgrade_db(conn)
+    conn.close()
+    return counts
+
+
+def parse_options():
+    parser = OptionParser(version='%prog ' + __version__,
+                          usage='usage: %prog [options]',
+                          description='Disc Golf Synthetic Database, ' + \
+                              'version ' + __version__)
+    parser.add_option('-d', '--debug', action='store_true',
+                      help='enter debug mode [%default]')
+    parser.add_option('-o', '--output', default=rdb.DB_PATH,
+                      help='the DB file to create [%default]')
+    parser.add_option('-f', '--force', action='store_true',
+                      help='remove the DB file first, if it exists ' + \
+                          '[%default]')
+    parser.add_option('-s', '--seed', type='int', default=1,
+                      help='random number seed [%default]')
+    parser.add_option('-p', '--players', type='int', default=140,
+                      help='number of players [%default]')
+    parser.add_option('-c', '--courses', type='int', default=6,
+                      help='number of courses [%default]')
+    parser.add_option('-w', '--rounds-per-week', type='int', default=2,
+                      help='rounds played each week [%default]')
+    parser.add_option('-y', '--years', type='int', default=5,
+                      help='years of history [%default]')
+    parser.add_option('-m', '--money-rate', type='float', default=0.7,
+                      help='fraction of rounds followed by a money ' + \
+                          'round [%default]')
+    parser.add_option('-M', '--money-players', type='float', default=0.8,
+                      help='fraction of players who play the money ' + \
+                          'round [%default]')
+    parser.add_option('-a', '--ace-rate', type='float', default=0.01,
+                      help='chance of a player getting an ace in a ' + \
+                          'round [%default]')
+    (o, a) = parser.parse_args()
+    opts.debug = o.debug
+    if a:
+        parser.error("too many arguments")
+    if o.players < 2:
+        parser.error("need at least two players")
+    if o.courses < 1 or o.years < 1:
+        parser.error("need at least one course, and one year")
+    if not 1 <= o.rounds_per_week <= 7:
+        parser.error("rounds per week must be from 1 to 7")
+    return o
+
+
+def main():
+    o = parse_options()
+    if o.force and os.path.exists(o.output):
+        dprint("Removing existing DB file:", o.output)
+        os.remove(o.output)
+    start = time.time()
+    counts = generate_db(o.output, o.seed, o.players, o.courses,
+                         o.rounds_per_week, o.years, o.money_rate,
+                         o.money_players, o.ace_rate)
+    secs = time.time() - start
+    print "%s: %d players, %d rounds (%d round details), " % \
+          (o.output, o.players, counts.rounds, counts.round_details) + \
+          "%d money rounds (%d money round details)" % \
+          (counts.money_rounds, counts.money_round_details)
+    print "Generated in %.2f s: %.0f round details/s" % \
+          (secs, counts.round_details / secs if secs else 0.0)
+
+
+if __name__ == '__main__':
+    main()
+    sys.exit(0)
@@ -3,7 +3,17 @@
 '''
 initialize the disc golf db using sqlite3
 
-if the db exists, raise an error
+if the db exists, raise an error, unless appending to it
+
+The preload CSV files are streamed into the DB: each is parsed by a
+generator, a row at a time, and written with executemany() a chunk
+of rows at a time, all in one transaction. A new DB is loaded with
+syncing and the rollback journal turned down (if we crash, just run
+us again), and its secondary indexes are only created afterwards
+(by the schema upgrades). When appending to an existing DB, its
+journal is kept, so a failed load leaves it as it was, but its
+secondary indexes are still dropped during the load, and re-created
+once the data is in.
 
 TODO:
 * Add "force" option to remove existing DB?
@@ -11,25 +21,32 @@ TODO:
 Versions:
 1.1: all the beginning stuff
 1.2: * Breaking money rounds out as two new tables
+     * New DBs are upgraded to the current schema version
+1.3: * Streaming bulk loads, and appending to an existing DB
 '''
 
 import os
 import sys
+import time
 from optparse import OptionParser
 import sqlite3
 import csv
+from itertools import islice
+from operator import itemgetter
 
 from opts import opts
 from utils import dprint
-from itertools import ifilter
+import dbschema
+import fingerprint
 
 
 _DB_DIR = 'db'
 _DB_FILE = 'disc_golf.db'
+_PRELOAD_DIR = 'preload'
 
 
 __author__ = "Lee Duncan"
-__version__ = "1.2-wip"
+__version__ = "1.3"
 
 
 #
@@ -68,18 +85,18 @@ money_round_details_preload_list = [
     (2, 11,   0, 0, 0),                 # Lee
     ]
 
-def ensure_no_db(force_db_rm_first=False):
+def ensure_no_db(db_file, force_db_rm_first=False):
     '''
     Make sure there is no DB file
 
     Raise an exception on error, else just return
     '''
-    if not os.path.isdir(_DB_DIR):
+    db_dir = os.path.dirname(db_file)
+    if db_dir and not os.path.isdir(db_dir):
         dprint("Yikes: The DB directory doesn't even exist, so creating it")
-        os.mkdir(_DB_DIR)
+        os.mkdir(db_dir)
         # there can be no DB if we had to make the directory
         return
-    db_file = "%s/%s" % (_DB_DIR, _DB_FILE)
     if not os.path.isfile(db_file):
         # no file means no db, so we are done
         return
@@ -98,15 +115,151 @@ def db_cmd_exec(c, cmd):
     dprint("sqlite3 cmd: '%s'" % cmd)
     c.execute(cmd)
 
-def db_cmd_execd(c, cmd, data):
-    dprint("sqlite3 cmd: '%s' with data:" % cmd, data)
-    c.execute(cmd, data)
 
-def comment_filter(row):
-    '''return True if not a comment, for filtering out CSV comments'''
-    return row[0] != '#'
+#
+# how each preload CSV file is loaded: the table, its CSV file, and,
+# for each column, its name in the CSV header, its name in the table,
+# and how to convert it (None means leave it a string)
+#
+# The int columns are not converted by us, though: they are passed
+# to the DB as strings, which it converts itself (since the columns
+# have INTEGER affinity), and then it checks they all were integers.
+#
+
+PRELOAD_TABLES = [
+    ('players', 'players.csv',
+     [('num', 'num', int),
+      ('name', 'name', None),
+      ('full_name', 'full_name', None)]),
+    ('courses', 'courses.csv',
+     [('num', 'num', int),
+      ('course_name', 'name', None)]),
+    ('rounds', 'rounds.csv',
+     [('num', 'num', int),
+      ('course_num', 'course_num', int),
+      ('rdate', 'rdate', None)]),
+    ('money_rounds', 'money_rounds.csv',
+     [('round_num', 'round_num', int),
+      ('mround1', 'mround1', int),
+      ('mround2', 'mround2', int),
+      ('mround3', 'mround3', int)]),
+    ('round_details', 'round_details.csv',
+     [(name, name, int) for name in
+      ('round_num', 'player_num', 'fstrokes', 'bstrokes',
+       'acnt', 'ecnt', 'aecnt',
+       'calc_fscore_numerator', 'calc_fscore_denominator',
+       'calc_bscore_numerator', 'calc_bscore_denominator',
+       'calc_oscore_numerator', 'calc_oscore_denominator')]),
+    ('money_round_details', 'money_round_details.csv',
+     [(name, name, int) for name in
+      ('round_num', 'player_num', 'money_rnd1_winnings',
+       'money_rnd2_winnings', 'money_rnd3_winnings')]),
+    ]
+
+# when appending, players and courses already in the DB are kept, but
+# rows for rounds already in the DB are an error
+APPEND_IGNORE_TABLES = ['players', 'courses']
+
+# how many rows to write with each executemany()
+LOAD_CHUNK_ROWS = 5000
+
+# how much page cache (in KiB) to use during a load
+LOAD_CACHE_KB = 64 * 1024
+
+
+def uncommented(lines):
+    '''Yield the lines of a CSV file that are not comments (or blank)'''
+    for line in lines:
+        if line[0] != '#' and line.strip():
+            yield line
+
+
+def csv_rows(path, columns, converters=None):
+    '''
+    Yield each data row of a preload CSV file, as a tuple of the
+    listed columns, converted (except for int columns: see above).
+    "converters" can override the converters listed in "columns", by
+    column name.
+    '''
+    with open(path, 'rb') as fin:
+        reader = csv.reader(uncommented(fin), skipinitialspace=True,
+                            quoting=csv.QUOTE_NONE)
+        header = [name.strip() for name in next(reader)]
+        fields = []
+        for (csv_name, db_name, conv) in columns:
+            if csv_name not in header:
+                raise Exception("%s: no '%s' column" % (path, csv_name))
+            if converters and db_name in converters:
+                conv = converters[db_name]
+            if conv is int:
+                conv = None
+            fields.append((header.index(csv_name), conv))
+        try:
+            if [f for f in fields if f[1] is not None]:
+                for row in reader:
+                    yield tuple(row[idx] if conv is None else conv(row[idx]) \
+                                for (idx, conv) in fields)
+            else:
+                # no Python code per field, for the big tables
+                pick = itemgetter(*[idx for (idx, conv) in fields])
+                for row in reader:
+                    yield pick(row)
+        except (ValueError, IndexError) as e:
+            raise Exception("%s: bad data in row %d: %s" % \
+                            (path, reader.line_num, e))
+
+
+def chunks(rows, size):
+    '''Yield lists of up to "size" rows at a time'''
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def check_integers(c, table, columns):
+    '''
+    Make sure the DB converted each int column of each row we loaded
+    to an integer (checking the whole table is just one quick scan)
+    '''
+    int_cols = [col[1] for col in columns if col[2] is int]
+    row = c.execute("SELECT %s FROM %s WHERE %s LIMIT 1" % \
+                    (', '.join(col[1] for col in columns), table,
+                     ' OR '.join("typeof(%s) != 'integer'" % col \
+                                 for col in int_cols))).fetchone()
+    if row is not None:
+        raise Exception("Table '%s': not an integer in row: %s" % \
+                        (table, ', '.join(map(str, row))))
+
+
+def load_table(c, table, rows, columns, verb='INSERT'):
+    '''Write the rows to the table, a chunk at a time'''
+    cmd = "%s INTO %s (%s) VALUES (%s)" % \
+          (verb, table, ', '.join(col[1] for col in columns),
+           ','.join('?' * len(columns)))
+    dprint("sqlite3 cmd: '%s', %d rows at a time" % (cmd, LOAD_CHUNK_ROWS))
+    cnt = 0
+    for chunk in chunks(rows, LOAD_CHUNK_ROWS):
+        c.executemany(cmd, chunk)
+        cnt += len(chunk)
+        dprint("Loaded %d rows into '%s' so far" % (cnt, table))
+    check_integers(c, table, columns)
+    return cnt
+
+
+def load_preload_table(c, table, preload_dir=_PRELOAD_DIR):
+    '''Load one table from its preload CSV file'''
+    for (name, csv_file, columns) in PRELOAD_TABLES:
+        if name == table:
+            return load_table(c, table,
+                              csv_rows(os.path.join(preload_dir, csv_file),
+                                       columns),
+                              columns)
+    raise Exception("Internal Error: no preload CSV file for '%s'" % table)
 
-def initialize_players(c, create_empty=False):
+
+def initialize_players(c, create_empty=False, preload_dir=_PRELOAD_DIR):
     if True:
         db_cmd_exec(c, '''CREATE TABLE players (
     			num INTEGER PRIMARY KEY,
@@ -119,32 +272,19 @@ def initialize_players(c, create_empty=False):
                         full_name CHAR(40))''')
     if create_empty:
         return
-    with open('preload/players.csv', 'rb') as fin:
-        dr = csv.DictReader(ifilter(comment_filter, fin),
-                            skipinitialspace=True,
-                            quoting=csv.QUOTE_NONE)
-        for r in dr:
-            t = (int(r['num']), r['name'], r['full_name'])
-            db_cmd_execd(c, "INSERT INTO players VALUES(?,?,?)", t)
+    load_preload_table(c, 'players', preload_dir)
 
 
-def initialize_courses(c, create_empty=False):
+def initialize_courses(c, create_empty=False, preload_dir=_PRELOAD_DIR):
     dprint("Creating DB Table: 'courses' ...")
     db_cmd_exec(c, '''CREATE TABLE courses (
     				num INTEGER PRIMARY KEY,
     				name CHAR(20))''')
     if create_empty:
         return
-    with open('preload/courses.csv', 'rb') as fin:
-        dr = csv.DictReader(ifilter(comment_filter, fin),
-                            skipinitialspace=True,
-                            quoting=csv.QUOTE_NONE)
-        for r in dr:
-            #dprint("Dict Result Row:", r)
-            t = (int(r['num']), r['course_name'])
-            db_cmd_execd(c, "INSERT INTO courses VALUES(?,?)", t)
+    load_preload_table(c, 'courses', preload_dir)
 
-def initialize_rounds(c, create_empty=False):
+def initialize_rounds(c, create_empty=False, preload_dir=_PRELOAD_DIR):
     db_cmd_exec(c, '''CREATE TABLE rounds (
     				  num INTEGER PRIMARY KEY,
     				  course_num INTEGER,
@@ -180,68 +320,99 @@ def initialize_rounds(c, create_empty=False):
     if create_empty:
         return
     ####
-    with open('preload/rounds.csv', 'rb') as fin:
-        dr = csv.DictReader(ifilter(comment_filter, fin),
-                            skipinitialspace=True,
-                            quoting=csv.QUOTE_NONE)
-        for r in dr:
-            t = (int(r['num']), int(r['course_num']), r['rdate'])
-            dprint("setting up 'rounds' tupple:", t)
-            db_cmd_execd(c, "INSERT INTO rounds VALUES(?,?,?)", t)
-    ####
-    with open('preload/money_rounds.csv', 'rb') as fin:
-        dr = csv.DictReader(ifilter(comment_filter, fin),
-                            skipinitialspace=True,
-                            quoting=csv.QUOTE_NONE)
-        for r in dr:
-            t = (int(r['round_num']),
-                 int(r['mround1']), int(r['mround2']), int(r['mround3']))
-            db_cmd_execd(c, "INSERT INTO money_rounds VALUES(?,?,?,?)", t)
-    ####
-    with open('preload/round_details.csv', 'rb') as fin:
-        dr = csv.DictReader(ifilter(comment_filter, fin),
-                            skipinitialspace=True,
-                            quoting=csv.QUOTE_NONE)
-        for r in dr:
-            t = (int(r['round_num']), int(r['player_num']),
-                 int(r['fstrokes']), int(r['bstrokes']),
-                 int(r['acnt']), int(r['ecnt']), int(r['aecnt']),
-                 int(r['calc_fscore_numerator']),
-                 int(r['calc_fscore_denominator']),
-                 int(r['calc_bscore_numerator']),
-                 int(r['calc_bscore_denominator']),
-                 int(r['calc_oscore_numerator']),
-                 int(r['calc_oscore_denominator']))
-            db_cmd_execd(c, "INSERT INTO round_details " + \
-                         "VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?)", t)
-    ####
-    with open('preload/money_round_details.csv', 'rb') as fin:
-        dr = csv.DictReader(ifilter(comment_filter, fin),
-                            skipinitialspace=True,
-                            quoting=csv.QUOTE_NONE)
-        for r in dr:
-            t = (int(r['round_num']), int(r['player_num']),
-                 int(r['money_rnd1_winnings']),
-                 int(r['money_rnd2_winnings']),
-                 int(r['money_rnd3_winnings']))
-            db_cmd_execd(c, "INSERT INTO money_round_details " + \
-                         "VALUES(?,?,?,?,?)", t)
-
-
-def initialize_db(skip_preload_flag):
-    dprint("Creating DB: %s/%s ..." % (_DB_DIR, _DB_FILE))
-    conn = sqlite3.connect("%s/%s" % (_DB_DIR, _DB_FILE))
+    for table in ('rounds', 'money_rounds', 'round_details',
+                  'money_round_details'):
+        load_preload_table(c, table, preload_dir)
+
+
+def begin_load(conn, new_db):
+    '''
+    Tune the DB connection for a bulk load, and start its transaction.
+
+    We take over transaction handling, since sqlite3 would otherwise
+    commit for us before each CREATE or DROP.
+    '''
+    conn.isolation_level = None
+    conn.execute('PRAGMA cache_size = -%d' % LOAD_CACHE_KB)
+    if new_db:
+        # a new DB can just be made again if we crash
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute('PRAGMA journal_mode = MEMORY')
+    conn.execute('BEGIN')
+
+
+def initialize_db(db_file, skip_preload_flag, preload_dir=_PRELOAD_DIR):
+    dprint("Creating DB: %s ..." % db_file)
+    conn = sqlite3.connect(db_file)
+    begin_load(conn, True)
     c = conn.cursor()
-    initialize_players(c, skip_preload_flag)
-    initialize_courses(c, skip_preload_flag)
-    initialize_rounds(c, skip_preload_flag)
+    initialize_players(c, skip_preload_flag, preload_dir)
+    initialize_courses(c, skip_preload_flag, preload_dir)
+    initialize_rounds(c, skip_preload_flag, preload_dir)
     dprint("Commiting new database ...")
-    conn.commit()
+    conn.execute('COMMIT')
+    # bring the new DB up to the current schema version, which also
+    # creates its secondary indexes, now that the data is in
+    dbschema.upgrade_db(conn)
+    conn.close()
+
+
+def secondary_indexes(conn):
+    '''Return the (name, SQL) of each index we created on our tables'''
+    tables = [t[0] for t in PRELOAD_TABLES]
+    return [(row[0], row[1]) for row in conn.execute(
+        "SELECT name, sql FROM sqlite_master " + \
+        "WHERE type = 'index' AND sql IS NOT NULL " + \
+        "AND tbl_name IN (%s)" % ','.join('?' * len(tables)), tables)]
+
+
+def append_to_db(db_file, preload_dir=_PRELOAD_DIR):
+    '''
+    Load the preload CSV files found in preload_dir into an existing
+    DB, in one transaction. Return the number of rows loaded.
+    '''
+    if not os.path.isfile(db_file):
+        raise Exception("DB File does not exist: %s" % db_file)
+    dprint("Appending to DB: %s ..." % db_file)
+    conn = sqlite3.connect(db_file)
+    # the rows we load must match its schema
+    dbschema.upgrade_db(conn)
+    fingerprint.register_functions(conn)
+    begin_load(conn, False)
+    try:
+        c = conn.cursor()
+        indexes = secondary_indexes(conn)
+        for (name, sql) in indexes:
+            db_cmd_exec(c, 'DROP INDEX %s' % name)
+        cnt = 0
+        for (table, csv_file, columns) in PRELOAD_TABLES:
+            path = os.path.join(preload_dir, csv_file)
+            if not os.path.isfile(path):
+                dprint("No %s, so skipping table '%s'" % (path, table))
+                continue
+            # its round dates are in the current (ISO-8601) format
+            rows = csv_rows(path, columns,
+                            {'rdate': dbschema.date_str_to_iso})
+            verb = 'INSERT OR IGNORE' if table in APPEND_IGNORE_TABLES \
+                   else 'INSERT'
+            cnt += load_table(c, table, rows, columns, verb)
+        for (name, sql) in indexes:
+            db_cmd_exec(c, sql)
+        # and the new rounds need fingerprints
+        db_cmd_exec(c, fingerprint.SQL_UPDATE_FINGERPRINTS + \
+                    ' WHERE inputs_fp IS NULL')
+        conn.execute('COMMIT')
+    except:
+        conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+    return cnt
 
 
 def parse_options():
     parser = OptionParser(version='%prog ' + __version__,
-                          usage='usage: %prog [options]',
+                          usage='usage: %prog [options] [DB-FILE]',
                           description='Disc Golf Database, version ' + \
                               __version__)
     parser.add_option('-d', '--debug', action='store_true',
@@ -252,15 +423,33 @@ def parse_options():
     parser.add_option('-f', '--force-db-rm-first', action='store_true',
                       dest='force_db_rm_first',
                       help='force DB removal, if needed, to start [%default]')
+    parser.add_option('-a', '--append', action='store_true',
+                      help='load the data into an existing DB [%default]')
+    parser.add_option('-p', '--preload-dir', default=_PRELOAD_DIR,
+                      help='directory of CSV files to load [%default]')
     (o, a) = parser.parse_args()
     opts.debug = o.debug
     opts.no_preload = o.no_preload
     opts.force_db_rm_first = o.force_db_rm_first
+    opts.append = o.append
+    opts.preload_dir = o.preload_dir
+    if o.append and (o.no_preload or o.force_db_rm_first):
+        parser.error("cannot append with no preload, or removing the DB")
+    if len(a) > 1:
+        parser.error("too many arguments")
+    opts.db_file = a[0] if a else "%s/%s" % (_DB_DIR, _DB_FILE)
 
 def main():
     parse_options()
-    ensure_no_db(opts.force_db_rm_first)
-    initialize_db(opts.no_preload)
+    start = time.time()
+    if opts.append:
+        cnt = append_to_db(opts.db_file, opts.preload_dir)
+        print "%s: appended %d rows in %.2f s" % \
+              (opts.db_file, cnt, time.time() - start)
+        return
+    ensure_no_db(opts.db_file, opts.force_db_rm_first)
+    initialize_db(opts.db_file, opts.no_preload, opts.preload_dir)
+    dprint("Created %s in %.2f s" % (opts.db_file, time.time() - start))
 
 if __name__ == '__main__':
     main()
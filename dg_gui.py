@@ -9,19 +9,55 @@ us to keep track of courses and holes on that course
 
 
 import sys
+import time
+
+# when we started, for timing our startup
+START_TIME = time.time()
+
 from optparse import OptionParser
 import wx
+from wx.lib.pubsub import pub
 
 import rdb
-from utils import dprint
+from utils import dprint, set_log_levels_from_str, install_crash_dump
 from opts import opts
-import rounds
 
 
 
 __author__ = "Lee Duncan"
 __version__ = "1.18"
 
+# how long to wait for more DB changes before refreshing (milliseconds)
+UPDATE_DELAY_MS = 100
+# how long to wait after a refresh to save our snapshot of the DB
+SNAPSHOT_DELAY_MS = 2000
+
+
+class StartupTimer:
+    '''
+    Note how long each phase of our startup takes, so that (if asked)
+    we can print a breakdown once all the rounds are loaded
+    '''
+    def __init__(self, start_time):
+        self.last_time = self.start_time = start_time
+        self.phases = []                # (phase name, seconds)
+
+    def Mark(self, phase):
+        '''The named phase has just finished'''
+        now = time.time()
+        self.phases.append((phase, now - self.last_time))
+        self.last_time = now
+
+    def Print(self, f=sys.stderr):
+        print >>f, "Startup times:"
+        for (phase, secs) in self.phases:
+            print >>f, "  %-32s %7.3f s" % (phase, secs)
+        print >>f, "  %-32s %7.3f s" % ("total",
+                                        self.last_time - self.start_time)
+
+
+Timer = StartupTimer(START_TIME)
+
 
 ################################################################
 
@@ -32,17 +68,64 @@ def parse_options():
                               __version__)
     parser.add_option('-d', '--debug', action='store_true',
                       help='enter debug mode [%default]')
+    parser.add_option('-L', '--log', metavar='MODULE=LEVEL,...',
+                      help='set log levels by module, e.g. rdb=debug')
+    parser.add_option('--profile-startup', action='store_true',
+                      help='print how long each phase of startup ' + \
+                          'takes [%default]')
     (o, a) = parser.parse_args()
     opts.debug = o.debug
+    if o.log:
+        set_log_levels_from_str(o.log)
+    return o
+
+
+def load_rounds(profile):
+    '''
+    Read in all the rounds, a chunk at a time, from the event loop,
+    so that the GUI is up (and usable) while they stream in
+    '''
+    loader = rdb.round_loader()
+    def load_next_chunk(first=False):
+        try:
+            loader.next()
+        except StopIteration:
+            Timer.Mark("load remaining rounds")
+            if profile:
+                Timer.Print()
+            return
+        if first:
+            Timer.Mark("load first rounds")
+        wx.CallAfter(load_next_chunk)
+    wx.CallAfter(load_next_chunk, True)
 
 
 ################################################################
 
 def main():
-    parse_options()
-    rdb.init_db()
+    o = parse_options()
+    # if we crash, show what we were up to
+    install_crash_dump()
+    Timer.Mark("start up python, import wx")
+    # just the courses and players for now: the rounds come later
+    rdb.init_db(load_rounds=False)
+    Timer.Mark("open database")
     app = wx.App()
+    # batch up DB changes, then tell all frames about the new data
+    rdb.ChangeHub.SetScheduler(
+        lambda flush: wx.CallLater(UPDATE_DELAY_MS, flush))
+    rdb.ChangeHub.SetNotifier(
+        lambda version, round_nums: pub.sendMessage("DATA VERSION READY",
+                                                    version=version,
+                                                    round_nums=round_nums))
+    rdb.ChangeHub.SetSaveScheduler(
+        lambda save: wx.CallLater(SNAPSHOT_DELAY_MS, save))
+    Timer.Mark("create app")
+    import rounds
+    Timer.Mark("import main frame")
     rounds.CurrentRoundsFrame(None, title='DGDB: The Disc Golf Database')
+    Timer.Mark("show main window")
+    load_rounds(o.profile_startup)
     app.MainLoop()
 
 
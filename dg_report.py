@@ -0,0 +1,92 @@
+#!/usr/bin/python
+'''
+Disc Golf score results report, without the GUI
+
+Writes the same report as the GUI's "Score Results" frame to stdout,
+as a text table, CSV, or JSON, for a date range given either as
+start and stop dates or as one of the precanned range names (e.g.
+"YTD" or "last-month"). For example, for nightly standings from cron:
+
+    dg_report.py -r ytd -f json > standings.json
+
+This never imports wx, and it lets the DB add up the results (see
+rdb.report_results()), so it does not load every round first.
+'''
+
+__version__ = "1.0"
+__author__ = "Lee Duncan"
+
+
+import sys
+from optparse import OptionParser
+
+import rdb
+import results
+import dateranges
+from utils import set_log_levels_from_str
+from opts import opts
+
+
+FORMATS = ['table', 'csv', 'json']
+
+
+def parse_options():
+    range_names = ', '.join(dateranges.DATE_RANGES[1:])
+    parser = OptionParser(version='%prog ' + __version__,
+                          usage='usage: %prog [options] [DB-FILE]',
+                          description='Disc Golf Score Report, ' + \
+                              'version ' + __version__)
+    parser.add_option('-d', '--debug', action='store_true',
+                      help='enter debug mode [%default]')
+    parser.add_option('-L', '--log', metavar='MODULE=LEVEL,...',
+                      help='set per-module log levels, e.g. ' + \
+                          '"rdb=debug"')
+    parser.add_option('-r', '--range', metavar='NAME',
+                      help='precanned date range (one of: %s)' % \
+                          range_names)
+    parser.add_option('-s', '--start', metavar='DATE',
+                      help='report starting date')
+    parser.add_option('-e', '--end', metavar='DATE',
+                      help='report ending date')
+    parser.add_option('-f', '--format', type='choice', choices=FORMATS,
+                      default='table',
+                      help='output format (one of: %s) [%%default]' % \
+                          ', '.join(FORMATS))
+    parser.add_option('-n', '--by-name', action='store_true',
+                      help='list players by name, instead of by ' + \
+                          'points [%default]')
+    (o, a) = parser.parse_args()
+    opts.debug = o.debug
+    if o.log:
+        set_log_levels_from_str(o.log)
+    if len(a) > 1:
+        parser.error("too many arguments")
+    if a:
+        rdb.DB_PATH = a[0]
+    try:
+        (o.start_rdate, o.stop_rdate) = \
+            dateranges.parse_range(o.range, o.start, o.end)
+    except ValueError, e:
+        parser.error(str(e))
+    return o
+
+
+def main():
+    o = parse_options()
+    rdb.init_db(load_rounds=False)
+    summary = rdb.report_results(o.start_rdate, o.stop_rdate)
+    items = results.sorted_items(results.report_items(summary),
+                                 by_points=not o.by_name)
+    if o.format == 'csv':
+        results.write_csv(sys.stdout, items)
+    elif o.format == 'json':
+        results.write_json(sys.stdout, o.start_rdate, o.stop_rdate,
+                           summary, items)
+    else:
+        results.write_table(sys.stdout, o.start_rdate, o.stop_rdate,
+                            summary, items)
+
+
+if __name__ == '__main__':
+    main()
+    sys.exit(0)
@@ -0,0 +1,228 @@
+#!/usr/bin/python
+'''
+Export Disc Golf tables and reports, as CSV or JSON
+
+The round tables (rounds, round_details, money_rounds, and
+money_round_details) are exported in full, e.g. for the league
+spreadsheet, and the score results report for a date range, one row
+per player (see results.py).
+
+Table rows are read from a DB cursor FETCH_ROWS at a time, and
+written out as they are read, through generators, so exporting the
+whole history never has all of it in memory. Each table is in its
+primary key order, which the DB can read straight from its index.
+
+This can be run by hand (or from cron), and the report frame uses it
+for its "Export" button.
+'''
+
+__version__ = "1.0"
+__author__ = "Lee Duncan"
+
+
+import sys
+import csv
+import json
+from optparse import OptionParser
+
+import rdb
+import results
+import dateranges
+from utils import get_logger, set_log_levels_from_str
+from opts import opts
+
+
+log = get_logger('export')
+
+
+#
+# each table we export: its name, its columns, and its primary key
+#
+
+EXPORT_TABLES = [
+    ('rounds', ['num', 'course_num', 'rdate'], 'num'),
+    ('round_details',
+     ['round_num', 'player_num', 'fstrokes', 'bstrokes',
+      'acnt', 'ecnt', 'aecnt',
+      'calc_fscore_numerator', 'calc_fscore_denominator',
+      'calc_bscore_numerator', 'calc_bscore_denominator',
+      'calc_oscore_numerator', 'calc_oscore_denominator'],
+     'round_num, player_num'),
+    ('money_rounds', ['round_num', 'mround1', 'mround2', 'mround3'],
+     'round_num'),
+    ('money_round_details',
+     ['round_num', 'player_num', 'money_rnd1_winnings',
+      'money_rnd2_winnings', 'money_rnd3_winnings'],
+     'round_num, player_num'),
+    ]
+
+TABLE_NAMES = [t[0] for t in EXPORT_TABLES]
+
+# what can be exported: the tables, or the report
+EXPORT_NAMES = TABLE_NAMES + ['report']
+
+FORMATS = ['csv', 'json']
+
+# how many rows to fetch from the DB at a time
+FETCH_ROWS = 1000
+
+
+def fetch_rows(cursor, chunk_rows=FETCH_ROWS):
+    '''Yield each row of an executed cursor, fetching a chunk at a time'''
+    while True:
+        rows = cursor.fetchmany(chunk_rows)
+        if not rows:
+            return
+        for row in rows:
+            yield row
+
+
+def table_rows(table):
+    '''
+    Return the column names of a table, and a generator of its rows
+    (as tuples), in primary key order
+    '''
+    for (name, columns, key) in EXPORT_TABLES:
+        if name == table:
+            break
+    else:
+        raise Exception("Internal Error: cannot export table '%s'" % table)
+    # our own cursor, so other DB commands do not disturb it, and
+    # plain tuples, which are cheaper than rows by name
+    c = rdb.DBConn.cursor()
+    c.row_factory = None
+    cmd = "SELECT %s FROM %s ORDER BY %s" % (', '.join(columns), table, key)
+    log.Debug("sqlite3 cmd: %s", cmd)
+    c.execute(cmd)
+    return (columns, fetch_rows(c))
+
+
+def csv_write(f, headings, rows):
+    '''Write a heading row, then each row, as CSV'''
+    w = csv.writer(f)
+    w.writerow(headings)
+    w.writerows(rows)
+
+
+def json_chunks(headings, rows):
+    '''
+    Yield the text of a JSON list of rows, each an object keyed by
+    the headings, a row at a time
+    '''
+    # (sorting the keys would turn off the C encoder, for every row)
+    encode = json.JSONEncoder(separators=(', ', ': ')).encode
+    sep = '[\n  '
+    for row in rows:
+        yield sep
+        yield encode(dict(zip(headings, row)))
+        sep = ',\n  '
+    yield '[]\n' if sep.startswith('[') else '\n]\n'
+
+
+def json_write(f, headings, rows):
+    for chunk in json_chunks(headings, rows):
+        f.write(chunk)
+
+
+def export_table(f, table, fmt='csv'):
+    '''Write all of a table to file f, as CSV or JSON, returning nothing'''
+    (columns, rows) = table_rows(table)
+    if fmt == 'json':
+        json_write(f, columns, rows)
+    else:
+        csv_write(f, columns, rows)
+
+
+def export_report(f, start_rdate, stop_rdate, summary, items, fmt='csv'):
+    '''Write the report items for a date range to file f, as CSV or JSON'''
+    if fmt == 'json':
+        results.write_json(f, start_rdate, stop_rdate, summary, items)
+    else:
+        results.write_csv(f, items)
+
+
+def format_from_path(path):
+    '''Return the export format that a file name suggests'''
+    if path.lower().endswith('.json'):
+        return 'json'
+    return 'csv'
+
+
+################################################################
+
+def parse_options():
+    parser = OptionParser(version='%prog ' + __version__,
+                          usage='usage: %prog [options] WHAT [DB-FILE]\n' + \
+                              '  where WHAT is one of: ' + \
+                              ', '.join(EXPORT_NAMES),
+                          description='Disc Golf Export, ' + \
+                              'version ' + __version__)
+    parser.add_option('-d', '--debug', action='store_true',
+                      help='enter debug mode [%default]')
+    parser.add_option('-L', '--log', metavar='MODULE=LEVEL,...',
+                      help='set per-module log levels, e.g. ' + \
+                          '"export=debug"')
+    parser.add_option('-f', '--format', type='choice', choices=FORMATS,
+                      help='output format (one of: %s), else from ' % \
+                          ', '.join(FORMATS) + \
+                          'the output file name, else csv')
+    parser.add_option('-o', '--output', metavar='FILE',
+                      help='write to FILE, instead of stdout')
+    parser.add_option('-r', '--range', metavar='NAME',
+                      help='report: precanned date range (one of: %s)' % \
+                          ', '.join(dateranges.DATE_RANGES[1:]))
+    parser.add_option('-s', '--start', metavar='DATE',
+                      help='report: starting date')
+    parser.add_option('-e', '--end', metavar='DATE',
+                      help='report: ending date')
+    parser.add_option('-n', '--by-name', action='store_true',
+                      help='report: list players by name, instead of ' + \
+                          'by points [%default]')
+    (o, a) = parser.parse_args()
+    opts.debug = o.debug
+    if o.log:
+        set_log_levels_from_str(o.log)
+    if not a:
+        parser.error("need something to export")
+    if len(a) > 2:
+        parser.error("too many arguments")
+    o.what = a[0]
+    if o.what not in EXPORT_NAMES:
+        parser.error("cannot export '%s' (use one of: %s)" % \
+                     (o.what, ', '.join(EXPORT_NAMES)))
+    if len(a) > 1:
+        rdb.DB_PATH = a[1]
+    if o.what == 'report':
+        try:
+            (o.start_rdate, o.stop_rdate) = \
+                dateranges.parse_range(o.range, o.start, o.end)
+        except ValueError, e:
+            parser.error(str(e))
+    elif o.range or o.start or o.end or o.by_name:
+        parser.error("date ranges, and -n, are only for the report")
+    if o.format is None:
+        o.format = format_from_path(o.output) if o.output else 'csv'
+    return o
+
+
+def main():
+    o = parse_options()
+    rdb.init_db(load_rounds=False)
+    f = open(o.output, 'wb') if o.output else sys.stdout
+    try:
+        if o.what == 'report':
+            summary = rdb.report_results(o.start_rdate, o.stop_rdate)
+            items = results.sorted_items(results.report_items(summary),
+                                         by_points=not o.by_name)
+            export_report(f, o.start_rdate, o.stop_rdate, summary, items,
+                          o.format)
+        else:
+            export_table(f, o.what, o.format)
+    finally:
+        if f is not sys.stdout:
+            f.close()
+
+
+if __name__ == '__main__':
+    main()
+    sys.exit(0)
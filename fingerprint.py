@@ -0,0 +1,126 @@
+#!/usr/bin/python
+'''
+Fingerprints of the round details of a round
+
+There are three fingerprints kept for each round (in the "rounds"
+table):
+
+  inputs_fp         -- of what was entered: strokes and counts
+  scores_fp         -- of the calculated scores stored
+  scored_inputs_fp  -- of the inputs the stored scores were calculated
+                       from (NULL if they do not match any)
+
+so a round's scores are stale ("Calculate needed") when its
+scored_inputs_fp is not its inputs_fp, which can be found without
+looking at (or re-scoring) any round details.
+
+The fingerprints are worked out by the DB itself, as it writes a
+round, using the aggregate functions registered here.
+'''
+
+__version__ = "1.0"
+__author__ = "Lee Duncan"
+
+
+import hashlib
+
+import score
+
+
+def values_fp(values_list):
+    '''Return the fingerprint of a list of value tuples, in any order'''
+    return hashlib.sha1(repr(sorted(values_list))).hexdigest()[:16]
+
+
+def scores_match(inputs_list, scores_list):
+    '''
+    Are these the scores (player_num, calc_fscore_numerator, ...) that
+    scoring these inputs (player_num, fstrokes, bstrokes, ...) gives?
+    '''
+    inputs_list = sorted(inputs_list)
+    front = score.place_scores([i[1] for i in inputs_list],
+                               score.ROUND_SCORES)
+    back = score.place_scores([i[2] for i in inputs_list],
+                              score.ROUND_SCORES)
+    ttl = score.place_scores([None if i[1] is None or i[2] is None \
+                              else i[1] + i[2] for i in inputs_list],
+                             score.OVERALL_SCORES)
+    calculated = [(i[0],
+                   front[idx].numerator, front[idx].denominator,
+                   back[idx].numerator, back[idx].denominator,
+                   ttl[idx].numerator, ttl[idx].denominator) \
+                  for (idx, i) in enumerate(inputs_list)]
+    return calculated == sorted(scores_list)
+
+
+#
+# the DB aggregate functions, each given one round's details
+#
+
+class InputsFp:
+    '''inputs_fp(player_num, fstrokes, bstrokes, acnt, ecnt, aecnt)'''
+    def __init__(self):
+        self.inputs_list = []
+
+    def step(self, *values):
+        self.inputs_list.append(values)
+
+    def finalize(self):
+        return values_fp(self.inputs_list)
+
+
+class ScoresFp:
+    '''scores_fp(player_num, calc_fscore_numerator, ...)'''
+    def __init__(self):
+        self.scores_list = []
+
+    def step(self, *values):
+        self.scores_list.append(values)
+
+    def finalize(self):
+        return values_fp(self.scores_list)
+
+
+class ScoredInputsFp:
+    '''
+    scored_inputs_fp(player_num, fstrokes, bstrokes, acnt, ecnt, aecnt,
+                     calc_fscore_numerator, ...)
+    '''
+    def __init__(self):
+        self.inputs_list = []
+        self.scores_list = []
+
+    def step(self, *values):
+        self.inputs_list.append(values[:6])
+        self.scores_list.append(values[:1] + values[6:])
+
+    def finalize(self):
+        if not scores_match(self.inputs_list, self.scores_list):
+            return None
+        return values_fp(self.inputs_list)
+
+
+INPUT_COLUMNS = 'player_num, fstrokes, bstrokes, acnt, ecnt, aecnt'
+
+SCORE_COLUMNS = 'calc_fscore_numerator, calc_fscore_denominator, ' + \
+                'calc_bscore_numerator, calc_bscore_denominator, ' + \
+                'calc_oscore_numerator, calc_oscore_denominator'
+
+# fill in the fingerprints of the rounds picked by a WHERE clause
+SQL_UPDATE_FINGERPRINTS = '''
+    UPDATE rounds SET
+        inputs_fp = (SELECT inputs_fp(%(inputs)s)
+                     FROM round_details WHERE round_num = rounds.num),
+        scores_fp = (SELECT scores_fp(player_num, %(scores)s)
+                     FROM round_details WHERE round_num = rounds.num),
+        scored_inputs_fp = (SELECT scored_inputs_fp(%(inputs)s, %(scores)s)
+                            FROM round_details
+                            WHERE round_num = rounds.num)''' % \
+    {'inputs': INPUT_COLUMNS, 'scores': SCORE_COLUMNS}
+
+
+def register_functions(conn):
+    '''Teach a DB connection how to work out our fingerprints'''
+    conn.create_aggregate('inputs_fp', 6, InputsFp)
+    conn.create_aggregate('scores_fp', 7, ScoresFp)
+    conn.create_aggregate('scored_inputs_fp', 12, ScoredInputsFp)
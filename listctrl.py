@@ -14,6 +14,7 @@ import wx.lib.mixins.listctrl as wxlc
 import wx.lib.newevent as wxne
 import re
 import operator
+from itertools import izip
 
 
 __version__ = "1.0"
@@ -24,14 +25,53 @@ ListEditedEvt, EVT_LIST_EDITED_EVT = wxne.NewCommandEvent()
 
 def d2s(f, d):
     '''
-    Convert data "d" to a string using format "f", but return the
-    string "None" if d has value None
+    Convert data "d" to a string using format "f" (or, if "f" is a
+    function, by calling it), but return the string "None" if d has
+    value None
     '''
     if d is None:
         return 'None'
+    if callable(f):
+        return f(d)
     return f % d
 
 
+def diff_items(old_data, new_data):
+    '''
+    Compare two item_data dictionaries (key -> column values), and
+    return the rows of new_data that are new or changed (as a
+    dictionary), and a list of the keys no longer there, for
+    UpdateItems()
+    '''
+    rows = dict((key, data) for (key, data) in new_data.iteritems() \
+                if old_data.get(key) != data)
+    removed = [key for key in old_data if key not in new_data]
+    return (rows, removed)
+
+
+def changed_range(old_keys, new_keys):
+    '''
+    Return the first and last index at which two lists of row keys
+    differ (from the first difference to the end, if their lengths
+    differ), or (0, -1) if they are the same
+    '''
+    cnt = min(len(old_keys), len(new_keys))
+    first = 0
+    while first < cnt and old_keys[first] == new_keys[first]:
+        first += 1
+    if len(old_keys) != len(new_keys):
+        return (first, max(len(old_keys), len(new_keys)) - 1)
+    last = cnt - 1
+    while last >= first and old_keys[last] == new_keys[last]:
+        last -= 1
+    return (first, last)
+
+
+# how many rows can be moved in a virtual list (by UpdateItems) by
+# putting each in place, instead of sorting the whole list again
+PLACE_ROWS_MAX = 100
+
+
 class AutoWidthListEditCtrl(wx.ListCtrl, wxlc.ListCtrlAutoWidthMixin,
                             wxlc.TextEditMixin, wxlc.ColumnSorterMixin):
     '''
@@ -151,25 +191,48 @@ class AutoWidthListEditCtrl(wx.ListCtrl, wxlc.ListCtrlAutoWidthMixin,
         return val
 
 
-class AutoWidthListCtrl(wx.ListCtrl, wxlc.ListCtrlAutoWidthMixin,
-                        wxlc.ColumnSorterMixin):
+class AutoWidthVirtualListCtrl(wx.ListCtrl, wxlc.ListCtrlAutoWidthMixin):
     '''
-    A List mixin where:
-    * the last item in the list takes up all the remaining room, and
+    A virtual (owner-data) List, where:
+    * the last item in the list takes up all the remaining room,
+    * cells are only formatted when they are shown, and
     * You can sort the columns
+
+    It is set up with SetupListHdr() and SetupListItems(), but the
+    rows are never copied into the control: it just has a count of
+    them, and asks (through OnGetItemText()) for the text of the cells
+    it shows, so setting up a list of any length takes the same
+    (short) time.
+
+    The rows are kept in itemDataMap (a dictionary of key -> tuple of
+    column values, as for ColumnSorterMixin), and row_keys holds the
+    key of each row, in the order shown. Sorting by a column sorts the
+    keys by that column's values, each looked up once, instead of
+    ColumnSorterMixin's two lookups per comparison. Ties are in key
+    order, as is the list until a column is sorted.
+
+    After a change, UpdateItems() changes just the rows given, and only
+    re-sorts, and refreshes more than those rows, if rows were added
+    or removed, or moved because their sort column changed.
     '''
     def __init__(self, parent):
         wx.ListCtrl.__init__(self, parent, -1,
-                             style=wx.LC_REPORT|wx.LC_SINGLE_SEL,
+                             style=wx.LC_REPORT|wx.LC_VIRTUAL|\
+                                 wx.LC_SINGLE_SEL,
                              size=wx.Size(10, 10))
         wxlc.ListCtrlAutoWidthMixin.__init__(self)
-
-    def GetListCtrl(self):
-        return self
+        self.num_columns = 0
+        self.itemColumnFmt = []
+        self.itemDataMap = {}
+        self.row_keys = []
+        # the index of each key in row_keys, when needed
+        self.row_index = None
+        self.sort_col = None
+        self.sort_ascending = True
+        self.Bind(wx.EVT_LIST_COL_CLICK, self.OnColClick)
 
     def SetupListHdr(self, itemHdr, itemFmt, itemColumnFmt):
         self.num_columns = len(itemHdr)
-        wxlc.ColumnSorterMixin.__init__(self, self.num_columns)
         col_width = 100
         for col_idx in range(self.num_columns):
             item = itemHdr[col_idx]
@@ -177,25 +240,170 @@ class AutoWidthListCtrl(wx.ListCtrl, wxlc.ListCtrlAutoWidthMixin,
             dprint("Setting column %d hdr to '%s'" % (col_idx, item))
             self.InsertColumn(col_idx, item, width=col_width, format=lformat)
             col_width = 75
-        self.SetColumnCount(self.num_columns)
         self.itemColumnFmt = itemColumnFmt
 
     def SetupListItems(self, item_data):
-        self.DeleteAllItems()
+        '''Show the rows of item_data, in our current sort order'''
+        sel_key = self.GetSelectedKey()
         self.itemDataMap = item_data
-        data_idx = 0
-        for key, data in self.itemDataMap.iteritems():
-            cfmt = self.itemColumnFmt[0]
-            dprint("With List: Filling in col=0 row=%d, key=%d, fmt=%s:" % \
-                   (data_idx, key, cfmt), data[0])
-            self.InsertStringItem(data_idx, d2s(cfmt, data[0]))
-            for col_idx in range(1, self.num_columns):
-                cfmt = self.itemColumnFmt[col_idx]
-                dprint("With List: Filling in col=%d row=%d, key=%d, fmt=%s:" % \
-                   (col_idx, data_idx, key, cfmt), data[col_idx])
-                self.SetStringItem(data_idx, col_idx, d2s(cfmt, data[col_idx]))
-            self.SetItemData(data_idx, key)
-            data_idx += 1
+        self.SetRowKeys(self.SortedKeys())
+        dprint("Virtual List: %d rows" % len(self.row_keys))
+        self.SetItemCount(len(self.row_keys))
+        self.SelectKey(sel_key)
+        self.Refresh()
+
+    def SortedKeys(self):
+        '''Return the keys of our rows, in our sort order'''
+        keys = sorted(self.itemDataMap)
+        if self.sort_col is None:
+            return keys
+        col = self.sort_col
+        sort_values = dict((key, data[col]) \
+                           for (key, data) in self.itemDataMap.iteritems())
+        # (a stable sort, even reversed, so ties stay in key order)
+        return sorted(keys, key=sort_values.__getitem__,
+                      reverse=not self.sort_ascending)
+
+    def PlacedKeys(self, taken_keys, placed_keys):
+        '''
+        Return our row keys, in our sort order, with the rows of
+        "taken_keys" taken out, and those of "placed_keys" put back
+        where they now sort, each found with a binary search
+        '''
+        row_keys = list(self.row_keys)
+        for idx in sorted([self.RowIndex(key) for key in taken_keys],
+                          reverse=True):
+            del row_keys[idx]
+        data_map = self.itemDataMap
+        col = self.sort_col
+        for key in placed_keys:
+            value = key if col is None else data_map[key][col]
+            (lo, hi) = (0, len(row_keys))
+            while lo < hi:
+                mid = (lo + hi) // 2
+                mid_key = row_keys[mid]
+                mid_value = mid_key if col is None else data_map[mid_key][col]
+                # (ties are in key order, either way)
+                if mid_value == value:
+                    before = mid_key < key
+                elif self.sort_ascending or col is None:
+                    before = mid_value < value
+                else:
+                    before = mid_value > value
+                if before:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            row_keys.insert(lo, key)
+        return row_keys
+
+    def SetRowKeys(self, row_keys):
+        self.row_keys = row_keys
+        self.row_index = None
+
+    def RowIndex(self, key):
+        '''Return the index of the row with this key'''
+        if self.row_index is None:
+            self.row_index = dict(izip(self.row_keys,
+                                       xrange(len(self.row_keys))))
+        return self.row_index[key]
+
+    def UpdateItems(self, rows, removed=()):
+        '''
+        Change or add the "rows" given (a dictionary of key -> column
+        values), and remove the rows with keys in "removed", keeping
+        our sort order and the selected row
+        '''
+        data_map = self.itemDataMap
+        removed = [key for key in removed if key in data_map]
+        if not rows and not removed:
+            return
+        col = self.sort_col
+        moved = [key for (key, data) in rows.iteritems() \
+                 if key not in data_map or \
+                 (col is not None and data_map[key][col] != data[col])]
+        old_keys = [key for key in moved if key in data_map] + removed
+        for key in removed:
+            del data_map[key]
+        data_map.update(rows)
+        if not moved and not removed:
+            # just repaint the changed rows, where they are
+            dprint("Virtual List: refreshing %d rows" % len(rows))
+            for key in rows:
+                self.RefreshItem(self.RowIndex(key))
+            return
+        sel_key = self.GetSelectedKey()
+        sel_idx = self.GetFirstSelected()
+        if len(moved) + len(removed) <= PLACE_ROWS_MAX:
+            row_keys = self.PlacedKeys(old_keys, moved)
+        else:
+            row_keys = self.SortedKeys()
+        old_keys = self.row_keys
+        self.SetRowKeys(row_keys)
+        if len(self.row_keys) != len(old_keys):
+            self.SetItemCount(len(self.row_keys))
+        if sel_key is None or sel_key not in data_map or \
+           self.RowIndex(sel_key) != sel_idx:
+            self.SelectKey(sel_key)
+        (first, last) = changed_range(old_keys, self.row_keys)
+        # (rows removed from the end are gone: there is nothing to show)
+        last = min(last, len(self.row_keys) - 1)
+        dprint("Virtual List: %d rows, refreshing %d to %d" % \
+               (len(self.row_keys), first, last))
+        if first <= last:
+            self.RefreshItems(first, last)
+        # and rows that changed, but did not move
+        for key in rows:
+            idx = self.RowIndex(key)
+            if idx < first or idx > last:
+                self.RefreshItem(idx)
+
+    def SortByColumn(self, col, ascending=True):
+        dprint("Virtual List: sorting by column %d (ascending=%s)" % \
+               (col, ascending))
+        sel_key = self.GetSelectedKey()
+        self.sort_col = col
+        self.sort_ascending = ascending
+        self.SetRowKeys(self.SortedKeys())
+        self.SelectKey(sel_key)
+        self.Refresh()
+
+    def OnColClick(self, e):
+        '''Sort by a column, or reverse the sort if it is already sorted'''
+        col = e.GetColumn()
+        if col < 0:
+            return
+        if col == self.sort_col:
+            self.SortByColumn(col, not self.sort_ascending)
+        else:
+            self.SortByColumn(col)
+
+    def OnGetItemText(self, item, col):
+        data = self.itemDataMap[self.row_keys[item]]
+        return d2s(self.itemColumnFmt[col], data[col])
+
+    def GetItemData(self, idx):
+        '''Return the key of the row shown at index idx'''
+        return self.row_keys[idx]
+
+    def GetSelectedKey(self):
+        '''Return the key of the selected row, or None'''
+        idx = self.GetFirstSelected()
+        if idx < 0 or idx >= len(self.row_keys):
+            return None
+        return self.row_keys[idx]
+
+    def SelectKey(self, key):
+        '''Select the row with this key (if any), and only that row'''
+        idx = self.GetFirstSelected()
+        while idx >= 0:
+            self.Select(idx, False)
+            idx = self.GetNextSelected(idx)
+        if key is None or key not in self.itemDataMap:
+            return
+        idx = self.RowIndex(key)
+        self.Select(idx)
+        self.EnsureVisible(idx)
 
 
 class AutoWidthCheckListCtrl(wx.ListCtrl, wxlc.ListCtrlAutoWidthMixin,
@@ -15,7 +15,15 @@ __version__ = '1.0'
 MONEY_STR_WIDTH=5
 
 
-class Money:
+class Money(object):
+    '''
+    An amount of money, kept as a single count of cents.
+
+    The dollars and cents parts are worked out from that count when
+    asked for, both having the sign of the whole amount.
+    '''
+    __slots__ = ('total_cents',)
+
     def __init__(self, dollars=0, cents=0):
         d = int(dollars)
         c = int(cents)
@@ -23,27 +31,34 @@ class Money:
             #dprint("c:", c)
             #dprint("d:", d)
             raise Exception("Signs of Dollars and Cents must match")
-        while c >= 100:
-            #dprint("moving plus cents to plus dollars")
-            d += 1
-            c -= 100
-        while c <= -100:
-            #dprint("moving minus cents to plus dollars")
-            d -= 1
-            c += 100
-        self.dollars = d
-        self.cents = c
+        self.total_cents = (100 * d) + c
+
+    @classmethod
+    def FromCents(cls, cents):
+        '''Create Money from a count of cents, with no checking'''
+        m = cls.__new__(cls)
+        m.total_cents = cents
+        return m
+
+    def GetDollars(self):
+        if self.total_cents < 0:
+            return -(-self.total_cents / 100)
+        return self.total_cents / 100
+
+    def GetCents(self):
+        return self.total_cents - (100 * self.GetDollars())
+
+    dollars = property(GetDollars)
+    cents = property(GetCents)
 
     def __add__(self, other):
-        return Money(self.dollars + other.dollars,
-                     self.cents + other.cents)
+        return Money.FromCents(self.total_cents + other.total_cents)
 
     def __mul__(self, multiplier):
         if not isinstance(multiplier, int):
             raise Exception(
                 "unsupported operator types for '*': Money and (not int)")
-        return Money(multiplier * self.dollars,
-                     multiplier * self.cents)
+        return Money.FromCents(multiplier * self.total_cents)
 
     def __div__(self, divisor):
         if not isinstance(divisor, int):
@@ -53,11 +68,10 @@ class Money:
         return Money(cents=res_cents)
 
     def __sub__(self, other):
-        return Money(self.dollars - other.dollars,
-                     self.cents - other.cents)
+        return Money.FromCents(self.total_cents - other.total_cents)
 
     def __neg__(self):
-        return Money(-self.dollars, -self.cents)
+        return Money.FromCents(-self.total_cents)
 
     def __repr__(self):
         return "Money(%d,%d)" % (self.dollars, self.cents)
@@ -69,11 +83,18 @@ class Money:
         return self.AsCents() - other.AsCents()
 
     def AsCents(self):
-        return (100 * self.dollars) + self.cents
+        return self.total_cents
 
     def IsZero(self):
-        return self.dollars == 0 and self.cents == 0
+        return self.total_cents == 0
+
 
+def money_sum(cents_values):
+    '''
+    Return the Money total of many amounts given in cents (e.g. a column
+    of winnings from the DB), adding them as plain integers
+    '''
+    return Money.FromCents(sum(cents_values))
 
 
 def money_from_string(money_str):
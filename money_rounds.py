@@ -361,9 +361,8 @@ class MoneyRoundDetailsFrame(wx.Frame):
             dprint("Adding a new money round: %d" % \
                    self.this_mround.round_num)
             rdb.add_money_round(self.this_mround, self.mround_details)
-        rdb.commit_db()
-        dprint("Updating parent GUI ...")
-        pub.sendMessage("MONEY ROUND UPDATE", round_no=self.this_round)
+        # rdb commits the money round and tells rdb.ChangeHub, which
+        # updates all the frames
         self.is_edited = False
         self.Close()
 
@@ -500,9 +499,9 @@ class MoneyRoundDetailsFrame(wx.Frame):
             dprint("Message result:", res)
             if res == wx.NO:
                 return
-            # since our calculate has modifed the rdb data, we
-            # need to reload it :(
-            rdb.init_rounds()
+            # since our edits have modifed the rdb data, we
+            # need to reload this round
+            rdb.ChangeHub.NoteChange([self.this_round.num])
         self.Destroy()
 
     def OnListEdited(self, evt):
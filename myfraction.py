@@ -11,6 +11,10 @@ import os
 
 class MyFraction(fractions.Fraction):
     """Like a Fraction, but can print out more rationally (LOL)"""
+    # like a Fraction, no attributes can be added to (or changed in)
+    # one, so one can be shared by everything with the same value
+    __slots__ = ()
+
     def __init__(self, numerator=0, denominator=1):
         super(MyFraction, self).__init__(numerator, denominator)
 
@@ -46,3 +50,43 @@ class MyFraction(fractions.Fraction):
         return MyFraction(-self.numerator, self.denominator)
 
 
+def lcm(a, b):
+    """Return the least common multiple of two positive integers"""
+    return a * b / fractions.gcd(a, b)
+
+
+class ScoreTally(object):
+    """
+    A running total of fractional scores, kept as an integer count of
+    1/denominator units, so that adding a score is integer arithmetic.
+
+    The denominator only changes (to a multiple of itself) when a
+    score is added that it cannot represent, so starting with one
+    that covers the usual tie sizes means it (almost) never changes.
+    The total is only turned into a MyFraction when asked for.
+    """
+    __slots__ = ('numerator', 'denominator')
+
+    def __init__(self, numerator=0, denominator=1):
+        self.numerator = numerator
+        self.denominator = denominator
+
+    def Add(self, numerator, denominator=1):
+        """Add numerator/denominator to our total"""
+        if self.denominator % denominator:
+            new_denominator = lcm(self.denominator, denominator)
+            self.numerator *= new_denominator / self.denominator
+            self.denominator = new_denominator
+        self.numerator += numerator * (self.denominator / denominator)
+
+    def AddTally(self, other):
+        self.Add(other.numerator, other.denominator)
+
+    def AsFraction(self):
+        return MyFraction(self.numerator, self.denominator)
+
+    def __repr__(self):
+        return 'ScoreTally(%d, %d)' % (self.numerator, self.denominator)
+
+    def __str__(self):
+        return str(self.AsFraction())
@@ -15,32 +15,86 @@ __author__ = "Lee Duncan"
 
 
 import sqlite3
+import datetime
+import itertools
+import gc
+from contextlib import contextmanager
 from dateutil.parser import parse as parse_date_str
-from myfraction import MyFraction
-from money import Money
-
-from utils import dprint
+from myfraction import MyFraction, ScoreTally
+from score import SCORE_DENOMINATOR
+from money import Money, money_sum
+import dbschema
+import fingerprint
+import snapshot
+
+from utils import get_logger
 from opts import opts
 
 
-class Course:
+log = get_logger('rdb')
+
+
+#
+# round dates are stored as ISO-8601 ("%Y-%m-%d") strings, which we can
+# decode much faster than dateutil can parse a string of unknown format,
+# and there are few distinct dates, so each one is only decoded once
+# (datetimes cannot be changed, so rounds on the same day can share one)
+#
+
+RdateCache = {}
+
+def rdate_from_db_str(rdate_str):
+    '''
+    Return the datetime for a round date string, as stored in the DB.
+
+    Anything not in ISO-8601 format (e.g. from an older DB) is handed
+    to dateutil to figure out.
+    '''
+    rdate = RdateCache.get(rdate_str)
+    if rdate is None:
+        if len(rdate_str) == 10 and rdate_str[4] == '-' and \
+           rdate_str[7] == '-':
+            try:
+                rdate = datetime.datetime(int(rdate_str[0:4]),
+                                          int(rdate_str[5:7]),
+                                          int(rdate_str[8:10]))
+            except ValueError:
+                rdate = parse_date_str(rdate_str)
+        else:
+            rdate = parse_date_str(rdate_str)
+        RdateCache[rdate_str] = rdate
+    return rdate
+
+
+#
+# our record classes use __slots__, and keep scores and money as plain
+# integers, since there is one of these for every row in our database,
+# and a per-instance __dict__ (and a MyFraction or Money object for each
+# value) adds up to a lot of memory and load time over years of rounds
+#
+
+class Course(object):
     '''
     A single Disc Golf Course
     '''
+    __slots__ = ('num', 'name')
+
     def __init__(self, cnum, cname):
         self.num = cnum
         self.name = cname
 
     def __repr__(self):
-        return "Course(%d, %s)" % (self.cnum, self.name)
+        return "Course(%d, %s)" % (self.num, self.name)
 
     def __str__(self):
         return "Course[%d]: %s" % (self.num, self.name)
 
-class Player:
+class Player(object):
     '''
     A Disc Golf Player
     '''
+    __slots__ = ('num', 'name', 'full_name')
+
     def __init__(self, pnum, sname, lname):
         self.num = pnum
         self.name = sname
@@ -55,19 +109,31 @@ class Player:
                (self.num, self.full_name, self.name)
 
 
-class Round:
+class Round(object):
     '''
     One round, not counting the individual scores
     '''
+    __slots__ = ('num', 'course_num', 'rdate',
+                 'inputs_fp', 'scores_fp', 'scored_inputs_fp')
+
     def __init__(self, rnum, cnum=None, rdate_str=None):
         self.num = int(rnum)
         self.course_num = None if cnum is None else int(cnum)
         # rdate is type: datetime.datetime()
-        dprint("Setting rdate from:", rdate_str)
-        self.rdate = None if rdate_str is None else parse_date_str(rdate_str)
+        self.rdate = None if rdate_str is None else \
+                     rdate_from_db_str(rdate_str)
+        # fingerprints of our round details, as stored in the DB
+        # (see fingerprint.py), or None if not yet stored
+        self.inputs_fp = None
+        self.scores_fp = None
+        self.scored_inputs_fp = None
+
+    def ScoresStale(self):
+        '''Are our stored scores not calculated from our stored inputs?'''
+        return self.scored_inputs_fp != self.inputs_fp
 
     def SetDate(self, rdate_str):
-        self.rdate = parse_date_str(rdate_str)
+        self.rdate = rdate_from_db_str(rdate_str)
 
     def __repr__(self):
         return "Round(%d, %s, %s)" % \
@@ -78,10 +144,12 @@ class Round:
                (self.num, self.course_num, self.rdate)
 
 
-class MoneyRound:
+class MoneyRound(object):
     '''
     For each time a person plays for money after a normal round
     '''
+    __slots__ = ('round_num', 'mrounds')
+
     def __init__(self, rnum, mround1=0, mround2=0, mround3=0):
         self.round_num = int(rnum)
         # what try it took for an ace (0 -> none, 7 -> mzKitty)
@@ -92,7 +160,7 @@ class MoneyRound:
                 raise Exception("Internal Error: Money Round out of range")
 
     def __repr__(self):
-        return "MoneyRound(%d, %s)" % (self.round_num, self.mround)
+        return "MoneyRound(%d, %s)" % (self.round_num, self.mrounds)
 
     def __str__(self):
         return "MoneyRound[%d]: Try# = %d/%d/%d" % \
@@ -102,10 +170,34 @@ class MoneyRound:
                 self.mrounds[2])
 
 
-class RoundDetail:
+def score_property(num_attr, den_attr):
+    '''
+    Return a property that looks like a MyFraction score, but which
+    is stored as an integer numerator and denominator
+    '''
+    def getter(self):
+        return MyFraction(getattr(self, num_attr), getattr(self, den_attr))
+    def setter(self, score):
+        setattr(self, num_attr, score.numerator)
+        setattr(self, den_attr, score.denominator)
+    return property(getter, setter)
+
+
+class RoundDetail(object):
     '''
     One entry for one person for one round (which is one course on one day)
+
+    The calculated scores are stored as integer numerators and
+    denominators, but calc_fscore, calc_bscore, and calc_oscore
+    still look like MyFraction objects.
     '''
+    __slots__ = ('round_num', 'player_num',
+                 'fstrokes', 'bstrokes',
+                 'acnt', 'ecnt', 'aecnt',
+                 'calc_fscore_numerator', 'calc_fscore_denominator',
+                 'calc_bscore_numerator', 'calc_bscore_denominator',
+                 'calc_oscore_numerator', 'calc_oscore_denominator')
+
     def __init__(self, rnum, pnum, fstrokes=None, bstrokes=None,
                  acnt=0, ecnt=0, aecnt=0,
                  calc_fscore=None, calc_bscore=None, calc_oscore=None):
@@ -124,45 +216,76 @@ class RoundDetail:
         self.calc_bscore = MyFraction(0) if calc_bscore is None else calc_bscore
         self.calc_oscore = MyFraction(0) if calc_oscore is None else calc_oscore
 
+    @classmethod
+    def FromValues(cls, rnum, pnum, fstrokes, bstrokes, acnt, ecnt, aecnt,
+                   fscore_num, fscore_den, bscore_num, bscore_den,
+                   oscore_num, oscore_den):
+        '''
+        Create a RoundDetail straight from its integer values (as stored
+        in the DB), without creating any MyFraction objects
+        '''
+        rd = cls.__new__(cls)
+        rd.round_num = rnum
+        rd.player_num = pnum
+        rd.fstrokes = fstrokes
+        rd.bstrokes = bstrokes
+        rd.acnt = acnt
+        rd.ecnt = ecnt
+        rd.aecnt = aecnt
+        rd.calc_fscore_numerator = fscore_num
+        rd.calc_fscore_denominator = fscore_den
+        rd.calc_bscore_numerator = bscore_num
+        rd.calc_bscore_denominator = bscore_den
+        rd.calc_oscore_numerator = oscore_num
+        rd.calc_oscore_denominator = oscore_den
+        return rd
+
+    calc_fscore = score_property('calc_fscore_numerator',
+                                 'calc_fscore_denominator')
+    calc_bscore = score_property('calc_bscore_numerator',
+                                 'calc_bscore_denominator')
+    calc_oscore = score_property('calc_oscore_numerator',
+                                 'calc_oscore_denominator')
+
     def __cmp__(self, other):
         if self.round_num != other.round_num:
-            dprint("compare round detail: round_num NOT EQUAL")
+            log.Debug("compare round detail: round_num NOT EQUAL")
             return self.round_num - other.round_num
         if self.player_num != other.player_num:
-            dprint("compare round detail: player_num NOT EQUAL")
+            log.Debug("compare round detail: player_num NOT EQUAL")
             return self.player_num - other.player_num
         for fname in ['fstrokes', 'bstrokes']:
             s = getattr(self, fname)
             o = getattr(other, fname)
             if s != o:
                 if s is None:
-                    dprint("compare round detail: self.%s is None" % fname)
+                    log.Debug("compare round detail: self.%s is None", fname)
                     return o
                 if o is None:
-                    dprint("compare round detail: other.%s is None" % fname )
+                    log.Debug("compare round detail: other.%s is None", fname)
                     return s
-                dprint("compare round detail: %s NOT EQUAL" % fname)
+                log.Debug("compare round detail: %s NOT EQUAL", fname)
                 return s - o
         for fname in ['acnt', 'ecnt', 'aecnt']:
             s = getattr(self, fname)
             o = getattr(other, fname)
             if s != o:
-                dprint("compare round detail: %s NOT EQUAL" % fname)
+                log.Debug("compare round detail: %s NOT EQUAL", fname)
                 return s - o
         for fname in ['calc_fscore', 'calc_bscore', 'calc_oscore']:
             s = getattr(self, fname)
             o = getattr(other, fname)
             if s > o:
-                dprint("compare round detail: %s (s>o) NOT EQUAL" % fname)
-                dprint("self.%s:" % fname, s)
-                dprint("other.%s:" % fname, o)
+                log.Debug("compare round detail: %s (s>o) NOT EQUAL", fname)
+                log.Debug("self.%s: %s", fname, s)
+                log.Debug("other.%s: %s", fname, o)
                 return 1
             if s < o:
-                dprint("compare round detail: %s (s<o) NOT EQUAL" % fname)
-                dprint("self.%s:" % fname, s)
-                dprint("other.%s:" % fname, o)
+                log.Debug("compare round detail: %s (s<o) NOT EQUAL", fname)
+                log.Debug("self.%s: %s", fname, s)
+                log.Debug("other.%s: %s", fname, o)
                 return -1
-        dprint("compare round detail: *** EQUAL ***")
+        log.Debug("compare round detail: *** EQUAL ***")
         return 0
 
     def SetScore(self, fstrokes, bstrokes):
@@ -183,8 +306,8 @@ class RoundDetail:
     def CalcScore(self):
         '''The Total score: front+back+overall'''
         res = self.calc_fscore + self.calc_bscore + self.calc_oscore
-        dprint("returning %s + %s + %s = %s" % \
-               (self.calc_fscore, self.calc_bscore, self.calc_oscore, res))
+        log.Debug("returning %s + %s + %s = %s",
+                  self.calc_fscore, self.calc_bscore, self.calc_oscore, res)
         return res
 
     def CalcFrontScore(self):
@@ -198,19 +321,20 @@ class RoundDetail:
 
     def SetFrontCalcScore(self, score):
         self.calc_fscore = score
-        dprint("Set front score to %s" % score)
+        log.Debug("Set front score to %s", score)
 
     def SetBackCalcScore(self, score):
         self.calc_bscore = score
-        dprint("Set back score to %s" % score)
+        log.Debug("Set back score to %s", score)
 
     def SetOverallCalcScore(self, score):
         self.calc_oscore = score
-        dprint("Set overall score to %s" % score)
+        log.Debug("Set overall score to %s", score)
 
     def __repr__(self):
-        return "RoundDetail(%d, %d, %s, %s, %d, %d, %d, %s, %s, %s)" \
-               (self.player_num, self.fstrokes, self.bstrokes,
+        return "RoundDetail(%d, %d, %s, %s, %d, %d, %d, %r, %r, %r)" % \
+               (self.round_num, self.player_num,
+                self.fstrokes, self.bstrokes,
                 self.acnt, self.ecnt, self.aecnt,
                 self.calc_fscore, self.calc_bscore, self.calc_oscore)
 
@@ -222,7 +346,7 @@ class RoundDetail:
                (self.acnt, self.ecnt, self.aecnt,
                 self.calc_fscore, self.calc_bscore, self.calc_oscore)
 
-class MoneyRoundDetail:
+class MoneyRoundDetail(object):
     '''
     Detail for one player on one day, during the money part of the
     day
@@ -231,55 +355,88 @@ class MoneyRoundDetail:
     can be a RoundDetail without a MoneyRoundDetail, if a player did
     not play in the money round on a given day, even though they
     played the regular 18-holes.
+
+    The money won is stored as integer cents, but moola_rnd still
+    looks like a list of Money objects.
     '''
+    __slots__ = ('round_num', 'player_num', 'moola_cents')
+
     def __init__(self, rnum, pnum,
                  moola_rnd1=None, moola_rnd2=None, moola_rnd3=None):
         self.round_num = int(rnum)
         self.player_num = int(pnum)
-        # money round: amount of money won
-        self.moola_rnd = [0 for i in range(3)]
-        self.moola_rnd[0] = Money(0) if moola_rnd1 is None else moola_rnd1
-        self.moola_rnd[1] = Money(0) if moola_rnd2 is None else moola_rnd2
-        self.moola_rnd[2] = Money(0) if moola_rnd3 is None else moola_rnd3
+        # money round: amount of money won, in cents
+        self.moola_cents = tuple(0 if m is None else m.AsCents() \
+                                 for m in (moola_rnd1, moola_rnd2, moola_rnd3))
+
+    @classmethod
+    def FromValues(cls, rnum, pnum, cents1, cents2, cents3):
+        '''
+        Create a MoneyRoundDetail straight from the cents won (as stored
+        in the DB), without creating any Money objects
+        '''
+        mrd = cls.__new__(cls)
+        mrd.round_num = rnum
+        mrd.player_num = pnum
+        mrd.moola_cents = (cents1, cents2, cents3)
+        return mrd
+
+    def GetMoolaRounds(self):
+        return [Money.FromCents(c) for c in self.moola_cents]
+
+    moola_rnd = property(GetMoolaRounds)
 
     def __cmp__(self, other):
         for i in range(3):
-            s = self.moola_rnd[i]
-            o = other.moola_rnd[i]
+            s = self.moola_cents[i]
+            o = other.moola_cents[i]
             if s > o:
-                dprint("compare money round detail: " + \
-                       "moola_rnd[%d] (s>o) NOT EQUAL" % i)
-                dprint("s:", s)
-                dprint("o:", o)
+                log.Debug("compare money round detail: " + \
+                          "moola_rnd[%d] (s>o) NOT EQUAL", i)
+                log.Debug("s: %s", s)
+                log.Debug("o: %s", o)
                 return 1
             if s < o:
-                dprint("compare money round detail: " + \
-                       "moola_rnd[%d] (s<o) NOT EQUAL" % i)
-                dprint("s:", s)
-                dprint("o:", o)
+                log.Debug("compare money round detail: " + \
+                          "moola_rnd[%d] (s<o) NOT EQUAL", i)
+                log.Debug("s: %s", s)
+                log.Debug("o: %s", o)
                 return -1
-        dprint("compare money round detail: *** EQUAL ***")
+        log.Debug("compare money round detail: *** EQUAL ***")
         return 0
 
     def SetMoney(self, mrnds):
         if len(mrnds) != 3:
             raise Exception("Internal Error: need money for 3 rounds")
-        self.moola_rnd = mrnds
+        self.moola_cents = tuple(m.AsCents() for m in mrnds)
 
     def GetMoney(self):
-        return sum(self.moola_rnd, Money(0))
+        return money_sum(self.moola_cents)
 
     def __repr__(self):
         return "MoneyRoundDetail(%d, %d, %s)" % \
                (self.round_num, self.player_num, self.moola_rnd)
 
     def __str__(self):
+        moola_rnd = self.moola_rnd
         return "MoneyRoundDetail[]: rnd=%d, pnum=%d, Money=%s/%s/%s)" % \
                (self.round_num, self.player_num,
-                self.moola_rnd[0], self.moola_rnd[1], self.moola_rnd[2])
+                moola_rnd[0], moola_rnd[1], moola_rnd[2])
 
 
-class SearchResult:
+def tally_property(tally_attr):
+    '''
+    Return a property that looks like a MyFraction total of points,
+    but which is stored as a ScoreTally
+    '''
+    def getter(self):
+        return getattr(self, tally_attr).AsFraction()
+    def setter(self, pts):
+        setattr(self, tally_attr, ScoreTally(pts.numerator, pts.denominator))
+    return property(getter, setter)
+
+
+class SearchResult(object):
     '''
     Used to gather data about how each player did over a period of time.
 
@@ -291,12 +448,13 @@ class SearchResult:
     also been added, to track money round results, separately.
     '''
     def __init__(self, pnum):
-        dprint("Creating empty Search Result for pnum=%d" % pnum)
+        log.Debug("Creating empty Search Result for pnum=%d", pnum)
         self.pnum = pnum
         self.rnd_cnt = 0
-        self.front_pts = MyFraction()
-        self.back_pts = MyFraction()
-        self.overall_pts = MyFraction()
+        # points are added up as integers, over a common denominator
+        self.front_tally = ScoreTally(0, SCORE_DENOMINATOR)
+        self.back_tally = ScoreTally(0, SCORE_DENOMINATOR)
+        self.overall_tally = ScoreTally(0, SCORE_DENOMINATOR)
         self.acnt = 0
         self.ecnt = 0
         self.aecnt = 0
@@ -305,58 +463,77 @@ class SearchResult:
         self.won_33s = 0         # best on both 9 and on 18 (33 pts)
         self.best_fstrokes = 999   # best score seen on front 9
         self.best_bstrokes = 999   # best score seen on back 9
-        self.money_won = Money(0)
+        self.money_cents = 0      # money won, in cents
+
+    def GetMoneyWon(self):
+        return Money.FromCents(self.money_cents)
+
+    money_won = property(GetMoneyWon)
+
+    front_pts = tally_property('front_tally')
+    back_pts = tally_property('back_tally')
+    overall_pts = tally_property('overall_tally')
 
     def TotalPoints(self):
-        return self.front_pts + self.back_pts + self.overall_pts
+        ttl = ScoreTally(0, SCORE_DENOMINATOR)
+        ttl.AddTally(self.front_tally)
+        ttl.AddTally(self.back_tally)
+        ttl.AddTally(self.overall_tally)
+        return ttl.AsFraction()
 
     def AddRoundResults(self, rd):
         '''
         The heart of summarizing results
         '''
-        dprint("*** Adding in results for pnum=%d:" % self.pnum, rd)
+        log.Debug("*** Adding in results for pnum=%d: %s", self.pnum, rd)
         if self.pnum != rd.player_num:
             raise Exception("Internal Error: Player Number Mismatch")
         self.rnd_cnt += 1
-        self.front_pts += rd.calc_fscore
-        self.back_pts += rd.calc_fscore
-        self.overall_pts += rd.calc_oscore
+        fnum = rd.calc_fscore_numerator
+        fden = rd.calc_fscore_denominator
+        bnum = rd.calc_bscore_numerator
+        bden = rd.calc_bscore_denominator
+        onum = rd.calc_oscore_numerator
+        oden = rd.calc_oscore_denominator
+        self.front_tally.Add(fnum, fden)
+        self.back_tally.Add(bnum, bden)
+        self.overall_tally.Add(onum, oden)
         self.acnt += rd.acnt
         self.ecnt += rd.ecnt
         self.aecnt += rd.aecnt
-        dprint("Scoring results for front score: %s" % rd.calc_fscore)
-        if rd.calc_fscore == MyFraction(9):
-            dprint("Won a 9 (front)!")
+        won_9f = (fnum == WON_9_POINTS * fden)
+        won_9b = (bnum == WON_9_POINTS * bden)
+        won_18 = (onum == WON_18_POINTS * oden)
+        if won_9f:
+            log.Debug("Won a 9 (front)!")
             self.won_9s += 1
-        dprint("Scoring results for front score: %s" % rd.calc_bscore)
-        if rd.calc_bscore == MyFraction(9):
-            dprint("Won a 9 (back)!")
+        if won_9b:
+            log.Debug("Won a 9 (back)!")
             self.won_9s += 1
-        dprint("Scoring results for overall score: %s" % rd.calc_oscore)
-        if rd.calc_oscore == MyFraction(15):
-            dprint("Won an 18!")
+        if won_18:
+            log.Debug("Won an 18!")
             self.won_18s += 1
-        dprint("Scoring results for Overall Points (33 max): %s" % \
-               rd.CalcScore())
-        if rd.CalcScore() == MyFraction(33):
-            dprint("Won an 33!")
+        # the only way to get 33 points is to win all three
+        if won_9f and won_9b and won_18:
+            log.Debug("Won an 33!")
             self.won_33s += 1
         if rd.fstrokes < self.best_fstrokes:
             self.best_fstrokes = rd.fstrokes
-            dprint("Set best front score to:", self.best_fstrokes)
+            log.Debug("Set best front score to: %s", self.best_fstrokes)
         if rd.bstrokes < self.best_bstrokes:
             self.best_bstrokes = rd.bstrokes
-            dprint("Set best back score to:", self.best_bstrokes)
+            log.Debug("Set best back score to: %s", self.best_bstrokes)
 
     def AddMoneyRoundResults(self, mrd):
         '''
         The second heart of summarizing results: the money
         '''
-        dprint("*** Adding in money results for pnum=%d:" % self.pnum, mrd)
+        log.Debug("*** Adding in money results for pnum=%d: %s",
+                  self.pnum, mrd)
         if self.pnum != mrd.player_num:
             raise Exception("Internal Error: Player Number Mismatch")
-        self.money_won += mrd.GetMoney()
-        dprint("Added $%s, total now $%s" % (mrd.GetMoney(), self.money_won))
+        self.money_cents += sum(mrd.moola_cents)
+        log.Debug("Added $%s, total now $%s", mrd.GetMoney(), self.money_won)
 
     def PointsPerRound(self):
         return self.TotalPoints() / self.rnd_cnt
@@ -373,6 +550,208 @@ class SearchResult:
                "%s" % self.money_won
 
 
+class DetailIndex:
+    '''
+    An indexed collection of RoundDetail (or MoneyRoundDetail) objects.
+
+    This used to be a plain list, and it can still be iterated over,
+    appended to, and measured with len() like one, but details can
+    also be looked up by round number or by player number without
+    scanning every detail in the database.
+    '''
+    def __init__(self, details=None):
+        # round_num -> {player_num: detail}
+        self.by_round = {}
+        # player_num -> {round_num: detail}
+        self.by_player = {}
+        self.count = 0
+        if details is not None:
+            for d in details:
+                self.append(d)
+
+    def append(self, d):
+        '''Add a detail, replacing any existing one for the same key'''
+        rnd_dict = self.by_round.setdefault(d.round_num, {})
+        if d.player_num not in rnd_dict:
+            self.count += 1
+        rnd_dict[d.player_num] = d
+        self.by_player.setdefault(d.player_num, {})[d.round_num] = d
+
+    def Get(self, rnum, pnum):
+        '''Return the detail for this round and player, or None'''
+        return self.by_round.get(rnum, {}).get(pnum)
+
+    def ForRound(self, rnum):
+        '''Return a list of the details for one round'''
+        return self.by_round.get(rnum, {}).values()
+
+    def ForPlayer(self, pnum):
+        '''Return a list of the details for one player'''
+        return self.by_player.get(pnum, {}).values()
+
+    def PlayerCount(self, rnum):
+        '''Return the number of players in a round'''
+        return len(self.by_round.get(rnum, {}))
+
+    def RoundsForPlayer(self, pnum):
+        '''Return a sorted list of round numbers a player played in'''
+        return sorted(self.by_player.get(pnum, {}))
+
+    def RoundNumbers(self):
+        '''Return a sorted list of all round numbers with details'''
+        return sorted(self.by_round)
+
+    def Remove(self, rnum, pnum):
+        '''Remove one detail, returning it (or None if not found)'''
+        d = self.by_round.get(rnum, {}).pop(pnum, None)
+        if d is None:
+            return None
+        if not self.by_round[rnum]:
+            del self.by_round[rnum]
+        del self.by_player[pnum][rnum]
+        if not self.by_player[pnum]:
+            del self.by_player[pnum]
+        self.count -= 1
+        return d
+
+    def RemoveRound(self, rnum):
+        '''Remove all details for a round, returning them as a list'''
+        rnd_dict = self.by_round.pop(rnum, {})
+        for pnum in rnd_dict:
+            del self.by_player[pnum][rnum]
+            if not self.by_player[pnum]:
+                del self.by_player[pnum]
+        self.count -= len(rnd_dict)
+        return rnd_dict.values()
+
+    def __iter__(self):
+        for rnum in sorted(self.by_round):
+            for d in self.by_round[rnum].itervalues():
+                yield d
+
+    def __len__(self):
+        return self.count
+
+    def __str__(self):
+        return "DetailIndex[]: %d details in %d rounds" % \
+               (self.count, len(self.by_round))
+
+
+class DataChangeHub:
+    '''
+    The one place that hears about changes to the database.
+
+    Code that writes a round notes it here, and when the database is
+    committed the changed rounds become "pending". The pending rounds
+    are then refreshed in our cache once, the data version is bumped,
+    and the notifier (if any) is told that this new version is ready,
+    along with the list of rounds that changed. Frames redraw from
+    that notification, and never reload the database themselves.
+
+    If a scheduler is set, it is handed the flush routine to call later,
+    so that a burst of commits (e.g. a round and then its money round)
+    is coalesced into a single refresh and a single notification.
+    Without a scheduler, the flush happens right away. After a flush,
+    our snapshot of the DB (see snapshot.py) is saved again, also
+    later if a save scheduler is set.
+    '''
+    def __init__(self):
+        self.version = 0
+        self.uncommitted = set()
+        self.pending = set()
+        self.flush_scheduled = False
+        self.scheduler = None
+        self.notifier = None
+        self.save_scheduled = False
+        self.save_scheduler = None
+
+    def SetScheduler(self, scheduler):
+        '''scheduler(func) should arrange for func() to be called later'''
+        self.scheduler = scheduler
+
+    def SetNotifier(self, notifier):
+        '''notifier(version, round_nums) is called after each refresh'''
+        self.notifier = notifier
+
+    def SetSaveScheduler(self, save_scheduler):
+        '''
+        save_scheduler(func) should arrange for func() to be called
+        later, to save our snapshot of the DB, which takes a while
+        '''
+        self.save_scheduler = save_scheduler
+
+    def NoteWrite(self, rnum):
+        '''A round has been written to the DB, but not yet committed'''
+        self.uncommitted.add(rnum)
+
+    def NoteCommit(self):
+        '''The DB has been committed: written rounds are now changed'''
+        round_nums = self.uncommitted
+        self.uncommitted = set()
+        self.NoteChange(round_nums)
+
+    def NoteChange(self, round_nums):
+        '''These rounds have changed, and our cache needs refreshing'''
+        self.pending.update(round_nums)
+        if not self.pending or self.flush_scheduled:
+            return
+        if self.scheduler is None:
+            self.Flush()
+            return
+        self.flush_scheduled = True
+        self.scheduler(self.Flush)
+
+    def Flush(self):
+        '''Refresh all pending rounds, then announce the new version'''
+        self.flush_scheduled = False
+        if not self.pending:
+            return
+        round_nums = sorted(self.pending)
+        self.pending = set()
+        refresh_rounds(round_nums)
+        self.Announce(round_nums)
+        # and our snapshot of the DB needs saving again
+        self.NoteSnapshotStale()
+
+    def NoteSnapshotStale(self):
+        '''Our cache has changed, so save a new snapshot of it (later)'''
+        if self.save_scheduler is None:
+            save_snapshot()
+            return
+        if self.save_scheduled:
+            return
+        self.save_scheduled = True
+        self.save_scheduler(self.SaveSnapshot)
+
+    def SaveSnapshot(self):
+        self.save_scheduled = False
+        save_snapshot()
+
+    def Announce(self, round_nums):
+        '''These (already refreshed) rounds are new: bump our version'''
+        self.version += 1
+        log.Debug("Data version %d ready, rounds changed: %s",
+                  self.version, round_nums)
+        if self.notifier is not None:
+            self.notifier(self.version, round_nums)
+
+
+class ReportSummary:
+    '''
+    The results of a report over a range of dates: a SearchResult for
+    each player who played in that range, the number of rounds played,
+    and the total won by Mz Kitty
+    '''
+    def __init__(self):
+        self.results = {}               # player_num -> SearchResult
+        self.round_count = 0
+        self.mz_kitty_amt = Money(0)
+
+    def __str__(self):
+        return "ReportSummary[]: %d players, %d rounds, mz kitty=%s" % \
+               (len(self.results), self.round_count, self.mz_kitty_amt)
+
+
 DB_DIR = 'db'
 DB_FILE = 'disc_golf.db'
 DB_PATH = "%s/%s" % (DB_DIR, DB_FILE)
@@ -382,35 +761,46 @@ CourseList = {}
 PlayerList = {}
 RoundList = {}
 MoneyRoundList = {}
-# the detail lists are not indexed by a number, so they are just arrays
-RoundDetailList = []
-MoneyRoundDetailList = []
+# the detail lists are keyed by both round and player number, so
+# they are indexed both ways
+RoundDetailList = DetailIndex()
+MoneyRoundDetailList = DetailIndex()
+# the numbers of the rounds whose scores are stale ("Calculate needed")
+StaleRounds = set()
+# have all the rounds been read into the lists above?
+RoundsComplete = False
 
 DBConn = None
 DBc = None
 
+# tracks changes, so we can refresh and tell the GUI
+ChangeHub = DataChangeHub()
+
 
 #
 # database routines
 #
 
-def db_cmd_exec(cmd):
+def db_cmd_exec(cmd, args=()):
     global DBc
 
-    dprint("sqlite3 cmd: %s" % cmd)
-    return DBc.execute(cmd)
+    if args:
+        log.Debug("sqlite3 cmd: %s with args: %s", cmd, args)
+    else:
+        log.Debug("sqlite3 cmd: %s", cmd)
+    return DBc.execute(cmd, args)
 
 
 def init_courses():
     global DBc
     global CourseList
     
-    dprint("Initializing Disc Golf Courses ...")
+    log.Debug("Initializing Disc Golf Courses ...")
     CourseList = {}
     for row in db_cmd_exec('SELECT * FROM courses'):
         course_num = row['num']
         course_name = row['name']
-        dprint("Adding course[%d]: name=%s" % (course_num, course_name))
+        log.Debug("Adding course[%d]: name=%s", course_num, course_name)
         CourseList[course_num] = Course(course_num, course_name)
 
 
@@ -418,15 +808,14 @@ def init_players():
     global DBc
     global PlayerList
 
-    dprint("Initializing Disc Golf Players ...")
+    log.Debug("Initializing Disc Golf Players ...")
     PlayerList = {}
     for row in db_cmd_exec('SELECT * FROM players'):
         player_num = row['num']
         player_name = row['name']
         player_full_name = row['full_name']
-        dprint("Adding player[%d]: name=%s full_name=%s" % (player_num,
-                                                            player_name,
-                                                            player_full_name))
+        log.Debug("Adding player[%d]: name=%s full_name=%s",
+                  player_num, player_name, player_full_name)
         PlayerList[player_num] = Player(player_num,
                                         player_name,
                                         player_full_name)
@@ -437,111 +826,375 @@ def get_max_round_no():
     # try it an alternative way
     rnd_nos = [rnd.num for rnd in RoundList.itervalues()]
     max_rnd_no = max(rnd_nos)
-    dprint("Max Round No: %d" % max_rnd_no)
+    log.Debug("Max Round No: %d", max_rnd_no)
     return max_rnd_no
 
 
-def init_rounds():
-    global DBc
+def round_from_row(row):
+    '''Create a Round from a "rounds" table row'''
+    rnd = Round(row['num'], row['course_num'], row['rdate'])
+    rnd.inputs_fp = row['inputs_fp']
+    rnd.scores_fp = row['scores_fp']
+    rnd.scored_inputs_fp = row['scored_inputs_fp']
+    return rnd
+
+
+def money_round_from_row(row):
+    '''Create a MoneyRound from a "money_rounds" table row'''
+    return MoneyRound(row['round_num'],
+                      row['mround1'], row['mround2'], row['mround3'])
+
+
+def round_detail_from_row(row):
+    '''Create a RoundDetail from a "round_details" table row'''
+    return RoundDetail.FromValues(row['round_num'], row['player_num'],
+                                  row['fstrokes'], row['bstrokes'],
+                                  row['acnt'], row['ecnt'], row['aecnt'],
+                                  row['calc_fscore_numerator'],
+                                  row['calc_fscore_denominator'],
+                                  row['calc_bscore_numerator'],
+                                  row['calc_bscore_denominator'],
+                                  row['calc_oscore_numerator'],
+                                  row['calc_oscore_denominator'])
+
+
+def money_round_detail_from_row(row):
+    '''Create a MoneyRoundDetail from a "money_round_details" table row'''
+    return MoneyRoundDetail.FromValues(row['round_num'], row['player_num'],
+                                       row['money_rnd1_winnings'],
+                                       row['money_rnd2_winnings'],
+                                       row['money_rnd3_winnings'])
+
+
+def clear_rounds():
+    '''Empty our in-memory round lists'''
     global RoundList
     global MoneyRoundList
     global RoundDetailList
     global MoneyRoundDetailList
+    global StaleRounds
+    global RoundsComplete
 
-    dprint("Initializing Disc Golf Rounds ...")
     RoundList = {}
-    for row in db_cmd_exec('SELECT * FROM rounds'):
-        round_num = row['num']
-        course_num = row['course_num']
-        rdate = row['rdate']
-        dprint("Adding round[%d]: course_num=%s, rnd_date=%s" % \
-               (round_num, course_num, rdate))
-        rnd = Round(round_num, course_num, rdate)
-        RoundList[round_num] = rnd
-        dprint("Added:", rnd)
-    dprint("Initializing Disc Golf Money Rounds ...")
     MoneyRoundList = {}
+    RoundDetailList = DetailIndex()
+    MoneyRoundDetailList = DetailIndex()
+    StaleRounds = set()
+    RoundsComplete = False
+
+
+#
+# our round lists can also be saved as (and read back in from) columns
+# of plain values (see snapshot.py): four tables (rounds, money rounds,
+# round details, money round details), each a list of columns, with
+# the rows sorted by round number, newest first
+#
+
+def rows_as_columns(rows, width):
+    '''Return a list of rows (tuples) as a list of columns'''
+    if not rows:
+        return [()] * width
+    return zip(*rows)
+
+
+# what our snapshot is made of: the committed rows of each table, in
+# the order (newest round first) that rounds_from_columns() reads them
+SNAPSHOT_TABLES = [
+    ('SELECT num, course_num, rdate, ' + \
+     'inputs_fp, scores_fp, scored_inputs_fp ' + \
+     'FROM rounds ORDER BY num DESC', 6),
+    ('SELECT round_num, mround1, mround2, mround3 ' + \
+     'FROM money_rounds ORDER BY round_num DESC', 4),
+    ('SELECT round_num, player_num, fstrokes, bstrokes, ' + \
+     'acnt, ecnt, aecnt, ' + \
+     'calc_fscore_numerator, calc_fscore_denominator, ' + \
+     'calc_bscore_numerator, calc_bscore_denominator, ' + \
+     'calc_oscore_numerator, calc_oscore_denominator ' + \
+     'FROM round_details ORDER BY round_num DESC, player_num DESC', 13),
+    ('SELECT round_num, player_num, money_rnd1_winnings, ' + \
+     'money_rnd2_winnings, money_rnd3_winnings ' + \
+     'FROM money_round_details ORDER BY round_num DESC, player_num DESC',
+     5),
+    ]
+
+
+def committed_rounds_as_columns():
+    '''
+    Read the committed rounds, money rounds, and details from the DB,
+    as four tables of columns, all in one read transaction, on a
+    connection of our own (so our own uncommitted writes are not seen).
+    Return the snapshot key of the DB they were read from, and the
+    tables, or (None, None) if the DB changed while it was being read.
+    '''
+    key = snapshot_key()
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    try:
+        conn.execute('BEGIN')
+        tables = [rows_as_columns(conn.execute(cmd).fetchall(), width) \
+                  for (cmd, width) in SNAPSHOT_TABLES]
+        # (no commit can happen while we are reading, in one
+        # transaction, but one may have just before we started)
+        if snapshot_key() != key:
+            return (None, None)
+        conn.execute('COMMIT')
+    finally:
+        conn.close()
+    return (key, tables)
+
+
+def table_rows(columns, start, stop):
+    '''Return an iterator over rows start to stop of a table'''
+    return itertools.izip(*[c[start:stop] for c in columns])
+
+
+def rows_through_round(columns, start, oldest):
+    '''
+    Return the index of the first row (from start) of a table, which
+    is newest round first, that is for a round older than "oldest"
+    '''
+    rnums = columns[0]
+    stop = start
+    while stop < len(rnums) and rnums[stop] >= oldest:
+        stop += 1
+    return stop
+
+
+def rounds_from_columns(tables, chunk_size):
+    '''
+    Add the rounds in tables (as from committed_rounds_as_columns())
+    to our round lists, chunk_size rounds at a time. This is a
+    generator, yielding the round numbers of each chunk after adding
+    it.
+    '''
+    (rnd_cols, mrnd_cols, rd_cols, mrd_cols) = tables
+    (mrnd_idx, rd_idx, mrd_idx) = (0, 0, 0)
+    for idx in range(0, len(rnd_cols[0]), chunk_size):
+        chunk = []
+        # these objects have no reference cycles, so there is no point
+        # in having the garbage collector look for any as we create them
+        gc.disable()
+        try:
+            for (rnum, cnum, rdate_str,
+                 inputs_fp, scores_fp, scored_inputs_fp) in \
+                    table_rows(rnd_cols, idx, idx+chunk_size):
+                rnd = Round(rnum, cnum, rdate_str)
+                rnd.inputs_fp = inputs_fp
+                rnd.scores_fp = scores_fp
+                rnd.scored_inputs_fp = scored_inputs_fp
+                RoundList[rnum] = rnd
+                if rnd.ScoresStale():
+                    StaleRounds.add(rnum)
+                chunk.append(rnum)
+            # the tables are all newest first, so this chunk's details
+            # are the ones from here up to the oldest round in the chunk
+            oldest = chunk[-1]
+            stop = rows_through_round(mrnd_cols, mrnd_idx, oldest)
+            for row in table_rows(mrnd_cols, mrnd_idx, stop):
+                MoneyRoundList[row[0]] = MoneyRound(*row)
+            mrnd_idx = stop
+            stop = rows_through_round(rd_cols, rd_idx, oldest)
+            for row in table_rows(rd_cols, rd_idx, stop):
+                RoundDetailList.append(RoundDetail.FromValues(*row))
+            rd_idx = stop
+            stop = rows_through_round(mrd_cols, mrd_idx, oldest)
+            for row in table_rows(mrd_cols, mrd_idx, stop):
+                MoneyRoundDetailList.append(MoneyRoundDetail.FromValues(*row))
+            mrd_idx = stop
+        finally:
+            gc.enable()
+        yield chunk
+    # and any details left over, for rounds that are not in the DB
+    for row in table_rows(mrnd_cols, mrnd_idx, None):
+        MoneyRoundList[row[0]] = MoneyRound(*row)
+    for row in table_rows(rd_cols, rd_idx, None):
+        RoundDetailList.append(RoundDetail.FromValues(*row))
+    for row in table_rows(mrd_cols, mrd_idx, None):
+        MoneyRoundDetailList.append(MoneyRoundDetail.FromValues(*row))
+
+
+def snapshot_key():
+    '''Return the snapshot key for the DB, as it is now'''
+    return snapshot.db_key(DB_PATH)
+
+
+def save_snapshot():
+    '''
+    Save the committed rounds in the DB as our snapshot of it.
+
+    This reads the DB, not our round lists: frames edit the cached
+    rounds and details in place before they are committed (or not),
+    and another program may have changed the DB since we read it.
+    '''
+    (key, tables) = committed_rounds_as_columns()
+    if key is None:
+        log.Debug("Not saving snapshot: DB changed while being read")
+        return
+    snapshot.save(DB_PATH, key, tables)
+
+
+def init_rounds():
+    global DBc
+    global RoundsComplete
+
+    tables = snapshot.load(DB_PATH, snapshot_key())
+    if tables is not None:
+        log.Debug("Initializing Disc Golf Rounds from snapshot ...")
+        clear_rounds()
+        for chunk in rounds_from_columns(tables, len(tables[0][0]) or 1):
+            pass
+        RoundsComplete = True
+        return
+    log.Debug("Initializing Disc Golf Rounds ...")
+    clear_rounds()
+    for row in db_cmd_exec('SELECT * FROM rounds'):
+        rnd = round_from_row(row)
+        RoundList[rnd.num] = rnd
+        if rnd.ScoresStale():
+            StaleRounds.add(rnd.num)
+        log.Debug("Added: %s", rnd)
+    log.Debug("Initializing Disc Golf Money Rounds ...")
     for row in db_cmd_exec('SELECT * FROM money_rounds'):
-        round_num = row['round_num']
-        mround1 = row['mround1']
-        mround2 = row['mround2']
-        mround3 = row['mround3']
-        dprint("Adding money round[%d]: mrounds = %d/%d/%d" % \
-               (round_num, mround1, mround2, mround3))
-        mrnd = MoneyRound(round_num, mround1, mround2, mround3)
-        MoneyRoundList[round_num] = mrnd
-        dprint("Added:", mrnd)
-    dprint("Initializing Disc Golf Round Details ...")
-    RoundDetailList = []
+        mrnd = money_round_from_row(row)
+        MoneyRoundList[mrnd.round_num] = mrnd
+        log.Debug("Added: %s", mrnd)
+    log.Debug("Initializing Disc Golf Round Details ...")
     for row in db_cmd_exec('SELECT * from round_details'):
-        round_num = row['round_num']
-        player_num = row['player_num']
-        fstrokes = row['fstrokes']
-        bstrokes = row['bstrokes']
-        acnt = row['acnt']
-        ecnt = row['ecnt']
-        aecnt = row['aecnt']
-        fscore_num = row['calc_fscore_numerator']
-        fscore_den = row['calc_fscore_denominator']
-        bscore_num = row['calc_bscore_numerator']
-        bscore_den = row['calc_bscore_denominator']
-        oscore_num = row['calc_oscore_numerator']
-        oscore_den = row['calc_oscore_denominator']
-        dprint("Adding round detail: " +
-               "rnd_num=%d, p_num=%d, " % (round_num, player_num) +
-               "fstrokes=%d, bstrokes=%d, " % (fstrokes, bstrokes) +
-               "a/e/ae=%d/%d/%d, score=%d/%d|%d/%d|%d/%d, " % \
-               (acnt, ecnt, aecnt,
-                fscore_num, fscore_den,
-                bscore_num, bscore_den,
-                oscore_num, oscore_den))
-        rd = RoundDetail(round_num, player_num, fstrokes, bstrokes,
-                         acnt, ecnt, aecnt,
-                         MyFraction(fscore_num, fscore_den),
-                         MyFraction(bscore_num, bscore_den),
-                         MyFraction(oscore_num, oscore_den))
+        rd = round_detail_from_row(row)
         RoundDetailList.append(rd)
-        dprint("Added:", rd)
-    dprint("Initializing Disc Golf Money Round Details ...")
-    MoneyRoundDetailList = []
+        log.Debug("Added: %s", rd)
+    log.Debug("Initializing Disc Golf Money Round Details ...")
     for row in db_cmd_exec('SELECT * from money_round_details'):
-        round_num = row['round_num']
-        player_num = row['player_num']
-        mrnd1 = row['money_rnd1_winnings']
-        mrnd2 = row['money_rnd2_winnings']
-        mrnd3 = row['money_rnd3_winnings']
-        dprint("Adding money round detail: " +
-               "rnd_num=%d, p_num=%d, " % (round_num, player_num) + \
-               "Money=%s/%s/%s" % (mrnd1, mrnd2, mrnd3))
-        mrd = MoneyRoundDetail(round_num,
-                               player_num,
-                               Money(0, mrnd1),
-                               Money(0, mrnd2),
-                               Money(0, mrnd3))
+        mrd = money_round_detail_from_row(row)
         MoneyRoundDetailList.append(mrd)
-        dprint("Added:", mrd)
+        log.Debug("Added: %s", mrd)
+    RoundsComplete = True
+    save_snapshot()
+
+
+# how many rounds to read in at a time, when loading in the background
+LOAD_CHUNK_SIZE = 1000
+
+def round_loader(chunk_size=LOAD_CHUNK_SIZE):
+    '''
+    Read in all the rounds, with their money rounds and details, a
+    chunk at a time, newest first. This is a generator, which yields
+    the round numbers of each chunk after reading it in, so the caller
+    (e.g. the GUI, between events) decides when to read the next one.
+
+    The rounds come from our snapshot of the DB, if it is up to date,
+    else from the DB (and then the snapshot is saved for next time).
+    Each chunk is announced through the ChangeHub, just as if those
+    rounds had changed, so frames fill in as the rounds arrive. Since
+    the newest rounds come first, next_round_num() is right as soon
+    as the first chunk is in.
+    '''
+    global RoundsComplete
+
+    log.Debug("Loading Disc Golf Rounds, %d at a time ...", chunk_size)
+    clear_rounds()
+    tables = snapshot.load(DB_PATH, snapshot_key())
+    if tables is not None:
+        for chunk in rounds_from_columns(tables, chunk_size):
+            ChangeHub.Announce(chunk)
+            yield chunk
+        RoundsComplete = True
+        return
+    round_nums = [row[0] for row in \
+                  db_cmd_exec('SELECT num FROM rounds ORDER BY num DESC')]
+    for idx in range(0, len(round_nums), chunk_size):
+        chunk = round_nums[idx:idx+chunk_size]
+        refresh_rounds(chunk)
+        ChangeHub.Announce(chunk)
+        yield chunk
+    RoundsComplete = True
+    save_snapshot()
+
+
+# how many round numbers to put in one "IN (...)" clause, keeping
+# us well under the sqlite limit on the number of host parameters
+REFRESH_CHUNK_SIZE = 500
+
+def refresh_rounds(round_nums):
+    '''
+    Re-read only the specified rounds from the database, along with
+    their money rounds and their details, patching our in-memory
+    lists in place. A round that is no longer in the database is
+    dropped from the lists.
 
+    This is much cheaper than init_rounds() when only a round or two
+    has changed.
+    '''
+    round_nums = sorted(set(round_nums))
+    log.Debug("Refreshing Disc Golf Rounds: %s", round_nums)
+    for rnum in round_nums:
+        RoundList.pop(rnum, None)
+        StaleRounds.discard(rnum)
+        MoneyRoundList.pop(rnum, None)
+        RoundDetailList.RemoveRound(rnum)
+        MoneyRoundDetailList.RemoveRound(rnum)
+    for idx in range(0, len(round_nums), REFRESH_CHUNK_SIZE):
+        chunk = round_nums[idx:idx+REFRESH_CHUNK_SIZE]
+        in_list = ','.join(['?'] * len(chunk))
+        for row in db_cmd_exec('SELECT * FROM rounds WHERE num IN (%s)' % \
+                               in_list, chunk):
+            rnd = round_from_row(row)
+            RoundList[rnd.num] = rnd
+            if rnd.ScoresStale():
+                StaleRounds.add(rnd.num)
+        for row in db_cmd_exec('SELECT * FROM money_rounds ' + \
+                               'WHERE round_num IN (%s)' % in_list, chunk):
+            mrnd = money_round_from_row(row)
+            MoneyRoundList[mrnd.round_num] = mrnd
+        for row in db_cmd_exec('SELECT * FROM round_details ' + \
+                               'WHERE round_num IN (%s)' % in_list, chunk):
+            RoundDetailList.append(round_detail_from_row(row))
+        for row in db_cmd_exec('SELECT * FROM money_round_details ' + \
+                               'WHERE round_num IN (%s)' % in_list, chunk):
+            MoneyRoundDetailList.append(money_round_detail_from_row(row))
+
+
+def rdate_to_db_str(rdate):
+    '''
+    Return the string we store in the DB for a round date.
 
-def init_db():
-    '''Initialize the DG Database'''
+    This is ISO-8601 ("%Y-%m-%d"), which sorts and compares correctly
+    as a string, so the DB can range-scan its index on round dates.
+    '''
+    return rdate.strftime("%Y-%m-%d")
+
+
+def init_db(load_rounds=True):
+    '''
+    Initialize the DG Database
+
+    Reading in all the rounds and round details can take a while, so
+    callers that only need the courses and players (and let the DB do
+    any other work, like report_results() does) can skip it.
+    '''
 
     global DBConn
     global DBc
 
-    dprint("Initializing the Database (%s) ..." % DB_PATH)
+    log.Debug("Initializing the Database (%s) ...", DB_PATH)
     DBConn = sqlite3.connect(DB_PATH)
     DBConn.row_factory = sqlite3.Row
     DBc = DBConn.cursor()
+    # the DB works out round fingerprints as it writes rounds
+    fingerprint.register_functions(DBConn)
+    # bring older DB files up to date, in place
+    dbschema.upgrade_db(DBConn)
     # now read our DB tables into Python objects
     init_courses()
     init_players()
-    init_rounds()
+    if load_rounds:
+        init_rounds()
 
 
 def commit_db():
     '''Commit the Database'''
-    dprint("Commiting the database ...")
+    log.Debug("Commiting the database ...")
     DBConn.commit()
+    ChangeHub.NoteCommit()
 
 
 def next_round_num():
@@ -549,138 +1202,390 @@ def next_round_num():
     return get_max_round_no() + 1
 
 
+#
+# our DB write statements: these are the same strings each time, so
+# sqlite3 can keep them compiled in its statement cache
+#
+
+SQL_INSERT_ROUND = '''INSERT INTO rounds(num, course_num, rdate)
+                      VALUES(?,?,?)'''
+SQL_UPDATE_ROUND = '''UPDATE rounds SET course_num=?,rdate=?
+                      WHERE num=?'''
+SQL_INSERT_ROUND_DETAIL = '''INSERT INTO round_details(round_num, player_num,
+                                                     fstrokes, bstrokes,
+                                                     acnt, ecnt, aecnt,
+                                                     calc_fscore_numerator,
+                                                     calc_fscore_denominator,
+                                                     calc_bscore_numerator,
+                                                     calc_bscore_denominator,
+                                                     calc_oscore_numerator,
+                                                     calc_oscore_denominator)
+                             VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?)'''
+SQL_UPDATE_ROUND_DETAIL = '''UPDATE round_details
+                             SET fstrokes=?,bstrokes=?,
+                                 acnt=?,ecnt=?,aecnt=?,
+                                 calc_fscore_numerator=?,
+                                 calc_fscore_denominator=?,
+                                 calc_bscore_numerator=?,
+                                 calc_bscore_denominator=?,
+                                 calc_oscore_numerator=?,
+                                 calc_oscore_denominator=?
+                             WHERE round_num=? AND player_num=?'''
+SQL_UPDATE_ROUND_DETAIL_SCORES = '''UPDATE round_details
+                                    SET calc_fscore_numerator=?,
+                                        calc_fscore_denominator=?,
+                                        calc_bscore_numerator=?,
+                                        calc_bscore_denominator=?,
+                                        calc_oscore_numerator=?,
+                                        calc_oscore_denominator=?
+                                    WHERE round_num=? AND player_num=?'''
+SQL_INSERT_MONEY_ROUND = '''INSERT INTO money_rounds(round_num,
+                                                   mround1, mround2, mround3)
+                            VALUES(?,?,?,?)'''
+SQL_UPDATE_MONEY_ROUND = '''UPDATE money_rounds
+                            SET mround1=?,mround2=?,mround3=?
+                            WHERE round_num=?'''
+SQL_INSERT_MONEY_ROUND_DETAIL = '''INSERT INTO money_round_details(
+                                       round_num, player_num,
+                                       money_rnd1_winnings,
+                                       money_rnd2_winnings,
+                                       money_rnd3_winnings)
+                                   VALUES(?,?,?,?,?)'''
+SQL_UPDATE_MONEY_ROUND_DETAIL = '''UPDATE money_round_details
+                                   SET money_rnd1_winnings=?,
+                                       money_rnd2_winnings=?,
+                                       money_rnd3_winnings=?
+                                   WHERE round_num=? AND player_num=?'''
+
+
+def db_cmd_executemany(cmd, rows):
+    '''Run one (parameterized) DB command for every row in "rows"'''
+    global DBc
+
+    rows = list(rows)
+    log.Debug("sqlite3 cmd (for %d rows): %s", len(rows), cmd)
+    return DBc.executemany(cmd, rows)
+
+
+# how many db_transaction()s deep we are
+TransactionDepth = 0
+
+@contextmanager
+def db_transaction():
+    '''
+    Run the enclosed DB writes as one transaction, which is committed
+    at the end, or rolled back if anything goes wrong.
+
+    Transactions nest: only the outermost one commits, so many rounds
+    can be written with a single commit by wrapping them in one more
+    db_transaction().
+    '''
+    global TransactionDepth
+
+    TransactionDepth += 1
+    try:
+        yield
+    except:
+        TransactionDepth -= 1
+        if TransactionDepth == 0:
+            log.Debug("Rolling back the database ...")
+            DBConn.rollback()
+            ChangeHub.uncommitted.clear()
+        raise
+    TransactionDepth -= 1
+    if TransactionDepth == 0:
+        commit_db()
+
+
+def update_fingerprints(rnum):
+    '''Have the DB work out the fingerprints for a round it has written'''
+    db_cmd_exec(fingerprint.SQL_UPDATE_FINGERPRINTS + ' WHERE num=?', (rnum,))
+
+
+def round_detail_values(rd):
+    '''Return the score and count values stored for a round detail'''
+    return (rd.fstrokes, rd.bstrokes,
+            rd.acnt, rd.ecnt, rd.aecnt,
+            rd.calc_fscore_numerator, rd.calc_fscore_denominator,
+            rd.calc_bscore_numerator, rd.calc_bscore_denominator,
+            rd.calc_oscore_numerator, rd.calc_oscore_denominator)
+
+
+def money_round_detail_values(mrd):
+    '''Return the money values (in cents) stored for a money round detail'''
+    return mrd.moola_cents
+
+
 def add_round(rnd, rd_list):
-    '''Add the specified round and list of round details to the DB'''
-    dprint("Adding to DB:", rnd)
-    for rd in rd_list:
-        dprint(rd)
-    db_cmd_exec('''INSERT INTO rounds(num,
-                                      course_num,
-                                      rdate)
-                   VALUES(%d,%d,"%s")''' % \
-                (rnd.num,
-                 rnd.course_num,
-                 rnd.rdate.strftime("%m/%d/%Y")))
+    '''
+    Add the specified round and list of round details to the DB,
+    as one transaction
+    '''
+    log.Debug("Adding to DB: %s, with %d details", rnd, len(rd_list))
     for rd in rd_list:
         if rnd.num != rd.round_num:
             raise Exception("Internal Error: Round Number mismatch!")
-        db_cmd_exec('''INSERT INTO round_details(round_num, player_num,
-                                                 fstrokes, bstrokes,
-                                                 acnt, ecnt, aecnt,
-                                                 calc_fscore_numerator,
-                                                 calc_fscore_denominator,
-                                                 calc_bscore_numerator,
-                                                 calc_bscore_denominator,
-                                                 calc_oscore_numerator,
-                                                 calc_oscore_denominator)
-               VALUES(%d,%d,%d,%d,%d,%d,%d,%d,%d,%d,%d,%d,%d)''' % \
-                    (rd.round_num, rd.player_num,
-                     rd.fstrokes, rd.bstrokes,
-                     rd.acnt, rd.ecnt, rd.aecnt,
-                     rd.calc_fscore.numerator, rd.calc_fscore.denominator,
-                     rd.calc_bscore.numerator, rd.calc_bscore.denominator,
-                     rd.calc_oscore.numerator, rd.calc_oscore.denominator))
+    with db_transaction():
+        db_cmd_exec(SQL_INSERT_ROUND,
+                    (rnd.num, rnd.course_num, rdate_to_db_str(rnd.rdate)))
+        db_cmd_executemany(SQL_INSERT_ROUND_DETAIL,
+                           ((rd.round_num, rd.player_num) + \
+                            round_detail_values(rd) for rd in rd_list))
+        update_fingerprints(rnd.num)
+        ChangeHub.NoteWrite(rnd.num)
 
 
 def modify_round(rnd, rd_list):
     '''
-    Modify the specified round and list of round details in the DB
+    Modify the specified round and list of round details in the DB,
+    as one transaction
     '''
-    dprint("Modifying DB:", rnd)
-    for rd in rd_list:
-        dprint(rd)
-    dprint("Tryig to udate DB for:", rnd)
-    db_cmd_exec('''UPDATE rounds
-                   SET course_num=%d,rdate="%s"
-                   WHERE num=%d''' % \
-                (rnd.course_num, rnd.rdate.strftime("%m/%d/%Y"), rnd.num))
-    for rd in rd_list:
-        dprint("Trying to update DB for:", rd)
-        db_cmd_exec('''UPDATE round_details
-                       SET fstrokes=%d,bstrokes=%d,
-                           acnt=%d,ecnt=%d,aecnt=%d,
-                           calc_fscore_numerator=%d,
-                           calc_fscore_denominator=%d,
-                           calc_bscore_numerator=%d,
-                           calc_bscore_denominator=%d,
-                           calc_oscore_numerator=%d,
-                           calc_oscore_denominator=%d
-                       WHERE round_num=%d AND player_num=%d''' % \
-                    (rd.fstrokes, rd.bstrokes,
-                     rd.acnt, rd.ecnt, rd.aecnt,
-                     rd.calc_fscore.numerator, rd.calc_fscore.denominator,
-                     rd.calc_bscore.numerator, rd.calc_bscore.denominator,
-                     rd.calc_oscore.numerator, rd.calc_oscore.denominator,
-                     rd.round_num, rd.player_num))
+    log.Debug("Modifying DB: %s, with %d details", rnd, len(rd_list))
+    with db_transaction():
+        db_cmd_exec(SQL_UPDATE_ROUND,
+                    (rnd.course_num, rdate_to_db_str(rnd.rdate), rnd.num))
+        db_cmd_executemany(SQL_UPDATE_ROUND_DETAIL,
+                           (round_detail_values(rd) + \
+                            (rd.round_num, rd.player_num) for rd in rd_list))
+        update_fingerprints(rnd.num)
+        ChangeHub.NoteWrite(rnd.num)
+
+
+def modify_round_detail_scores(rd_list):
+    '''
+    Write just the calculated scores for a list of round details (from
+    any number of rounds) to the DB, as one transaction
+    '''
+    log.Debug("Modifying DB: scores for %d round details", len(rd_list))
+    with db_transaction():
+        db_cmd_executemany(SQL_UPDATE_ROUND_DETAIL_SCORES,
+                           ((rd.calc_fscore_numerator,
+                             rd.calc_fscore_denominator,
+                             rd.calc_bscore_numerator,
+                             rd.calc_bscore_denominator,
+                             rd.calc_oscore_numerator,
+                             rd.calc_oscore_denominator,
+                             rd.round_num, rd.player_num) for rd in rd_list))
+        for rnum in set(rd.round_num for rd in rd_list):
+            update_fingerprints(rnum)
+            ChangeHub.NoteWrite(rnum)
+
 
 def add_money_round(mrnd, mrd_list):
-    '''Add the specified round and list of round details to the DB'''
-    dprint("Adding to DB:", mrnd)
-    db_cmd_exec('''INSERT INTO money_rounds(round_num, mround1,mround2,mround3)
-                   VALUES(%d,%d,%d,%d)''' % \
-                (mrnd.round_num,
-                 mrnd.mrounds[0], mrnd.mrounds[1], mrnd.mrounds[2]))
+    '''
+    Add the specified money round and list of money round details
+    to the DB, as one transaction
+    '''
+    log.Debug("Adding to DB: %s, with %d details", mrnd, len(mrd_list))
     for mrd in mrd_list:
-        dprint("Adding detail:", mrd)
         if mrnd.round_num != mrd.round_num:
             raise Exception("Internal Error: Round Number mismatch!")
-        db_cmd_exec('''INSERT INTO money_round_details(round_num,
-                                                       player_num,
-                                                       money_rnd1_winnings,
-                                                       money_rnd2_winnings,
-                                                       money_rnd3_winnings)
-                       VALUES(%d,%d,%d,%d,%d)''' % \
-                    (mrd.round_num, mrd.player_num,
-                     mrd.moola_rnd[0].AsCents(),
-                     mrd.moola_rnd[1].AsCents(),
-                     mrd.moola_rnd[2].AsCents()))
+    with db_transaction():
+        db_cmd_exec(SQL_INSERT_MONEY_ROUND,
+                    (mrnd.round_num,
+                     mrnd.mrounds[0], mrnd.mrounds[1], mrnd.mrounds[2]))
+        db_cmd_executemany(SQL_INSERT_MONEY_ROUND_DETAIL,
+                           ((mrd.round_num, mrd.player_num) + \
+                            money_round_detail_values(mrd) \
+                            for mrd in mrd_list))
+        ChangeHub.NoteWrite(mrnd.round_num)
 
 
 def modify_money_round(mrnd, mrd_list):
     '''
-    Modify the specified round and list of round details in the DB
+    Modify the specified money round and list of money round details
+    in the DB, as one transaction
     '''
-    dprint("Modifying DB:", mrnd)
-    dprint("Tryig to udate DB for:", mrnd)
-    db_cmd_exec('''UPDATE money_rounds
-                   SET mround1=%d,mround2=%d,mround3=%d
-                   WHERE round_num=%d''' % \
-                (mrnd.mrounds[0], mrnd.mrounds[1], mrnd.mrounds[2],
-                 mrnd.round_num))
-    for mrd in mrd_list:
-        dprint("Trying to update DB for:", mrd)
-        db_cmd_exec('''UPDATE money_round_details
-                       SET money_rnd1_winnings=%d,
-                           money_rnd2_winnings=%d,
-                           money_rnd3_winnings=%d
-                       WHERE round_num=%d AND player_num=%d''' % \
-                    (mrd.moola_rnd[0].AsCents(),
-                     mrd.moola_rnd[1].AsCents(),
-                     mrd.moola_rnd[2].AsCents(),
-                     mrd.round_num, mrd.player_num))
+    log.Debug("Modifying DB: %s, with %d details", mrnd, len(mrd_list))
+    with db_transaction():
+        db_cmd_exec(SQL_UPDATE_MONEY_ROUND,
+                    (mrnd.mrounds[0], mrnd.mrounds[1], mrnd.mrounds[2],
+                     mrnd.round_num))
+        db_cmd_executemany(SQL_UPDATE_MONEY_ROUND_DETAIL,
+                           (money_round_detail_values(mrd) + \
+                            (mrd.round_num, mrd.player_num) \
+                            for mrd in mrd_list))
+        ChangeHub.NoteWrite(mrnd.round_num)
+
+#
+# reporting: these let the DB do the heavy lifting, and return just
+# the per-player results
+#
+
+# the points for winning a 9, winning an 18, and winning it all
+WON_9_POINTS = 9
+WON_18_POINTS = 15
+WON_33_POINTS = 33
+
+# a money round "try" of this many means Mz Kitty won the round
+MZ_KITTY_TRY = 7
+
+# all the report queries use this to pick out rounds in range
+SQL_ROUNDS_IN_RANGE = '''SELECT num FROM rounds
+                         WHERE rdate BETWEEN :start AND :stop'''
+
+SQL_REPORT_PLAYER_TOTALS = '''
+    SELECT player_num, COUNT(*) AS rnd_cnt,
+           SUM(acnt) AS acnt, SUM(ecnt) AS ecnt, SUM(aecnt) AS aecnt,
+           SUM(calc_fscore_numerator = :won_9 * calc_fscore_denominator) +
+           SUM(calc_bscore_numerator = :won_9 * calc_bscore_denominator)
+               AS won_9s,
+           SUM(calc_oscore_numerator = :won_18 * calc_oscore_denominator)
+               AS won_18s,
+           SUM(calc_fscore_numerator = :won_9 * calc_fscore_denominator AND
+               calc_bscore_numerator = :won_9 * calc_bscore_denominator AND
+               calc_oscore_numerator = :won_18 * calc_oscore_denominator)
+               AS won_33s,
+           MIN(fstrokes) AS best_fstrokes, MIN(bstrokes) AS best_bstrokes
+    FROM round_details
+    WHERE round_num IN (%s)
+    GROUP BY player_num''' % SQL_ROUNDS_IN_RANGE
+
+# points are fractions, so sum up the numerators for each denominator,
+# then add up those (few) sums in each player's ScoreTally -- one query
+# each for the front ('f'), back ('b'), and overall ('o') points
+SQL_REPORT_PLAYER_POINTS = {which: '''
+    SELECT player_num, calc_%(which)sscore_denominator AS den,
+           SUM(calc_%(which)sscore_numerator) AS num
+    FROM round_details
+    WHERE round_num IN (%(in_range)s)
+    GROUP BY player_num, calc_%(which)sscore_denominator''' % \
+                            {'which': which, 'in_range': SQL_ROUNDS_IN_RANGE}
+                            for which in ['f', 'b', 'o']}
+
+SQL_REPORT_PLAYER_MONEY = '''
+    SELECT player_num,
+           SUM(money_rnd1_winnings + money_rnd2_winnings +
+               money_rnd3_winnings) AS cents
+    FROM money_round_details
+    WHERE round_num IN (%s)
+    GROUP BY player_num''' % SQL_ROUNDS_IN_RANGE
+
+SQL_REPORT_ROUND_COUNT = '''
+    SELECT COUNT(DISTINCT round_num) FROM round_details
+    WHERE round_num IN (%s)''' % SQL_ROUNDS_IN_RANGE
+
+# Mz Kitty gets a dollar from each money round player for each of
+# the money rounds that she won
+SQL_REPORT_MZ_KITTY = '''
+    SELECT SUM(((mround1 = :mz_kitty) + (mround2 = :mz_kitty) +
+                (mround3 = :mz_kitty)) *
+               (SELECT COUNT(*) FROM money_round_details
+                WHERE money_round_details.round_num = money_rounds.round_num))
+    FROM money_rounds
+    WHERE round_num IN (%s)''' % SQL_ROUNDS_IN_RANGE
+
+
+def rounds_in_date_range(start_rdate, stop_rdate):
+    '''
+    Return the numbers of the rounds from start_rdate to stop_rdate
+    (inclusive), in date order
+    '''
+    args = {'start': rdate_to_db_str(start_rdate),
+            'stop': rdate_to_db_str(stop_rdate)}
+    return [row[0] for row in \
+            db_cmd_exec(SQL_ROUNDS_IN_RANGE + ' ORDER BY rdate', args)]
+
+
+def first_and_last_round_dates():
+    '''
+    Return the dates of the first and last rounds in the DB, as
+    datetimes, or (None, None) if there are no rounds
+    '''
+    row = db_cmd_exec('SELECT MIN(rdate), MAX(rdate) FROM rounds').fetchone()
+    if row[0] is None:
+        return (None, None)
+    return (rdate_from_db_str(row[0]), rdate_from_db_str(row[1]))
+
+
+def rounds_at_course(course_num):
+    '''Return the numbers of the rounds played at a course, in date order'''
+    return [row[0] for row in \
+            db_cmd_exec('''SELECT num FROM rounds WHERE course_num=?
+                           ORDER BY rdate''', (course_num,))]
+
+
+def rounds_for_player(player_num):
+    '''Return the numbers of the rounds a player played, in order'''
+    return [row[0] for row in \
+            db_cmd_exec('''SELECT round_num FROM round_details
+                           WHERE player_num=? ORDER BY round_num''',
+                        (player_num,))]
+
+
+def report_results(start_rdate, stop_rdate):
+    '''
+    Summarize how each player did from start_rdate to stop_rdate
+    (inclusive), returning a ReportSummary.
+
+    This does its aggregating in the database, with GROUP BY queries,
+    so it does not need (or use) our in-memory round lists.
+    '''
+    log.Debug("Generating report for dates %s to %s", start_rdate, stop_rdate)
+    args = {'start': rdate_to_db_str(start_rdate),
+            'stop': rdate_to_db_str(stop_rdate),
+            'won_9': WON_9_POINTS,
+            'won_18': WON_18_POINTS,
+            'mz_kitty': MZ_KITTY_TRY}
+    summary = ReportSummary()
+    for row in db_cmd_exec(SQL_REPORT_PLAYER_TOTALS, args).fetchall():
+        sr = SearchResult(row['player_num'])
+        sr.rnd_cnt = row['rnd_cnt']
+        sr.acnt = row['acnt']
+        sr.ecnt = row['ecnt']
+        sr.aecnt = row['aecnt']
+        sr.won_9s = row['won_9s']
+        sr.won_18s = row['won_18s']
+        sr.won_33s = row['won_33s']
+        if row['best_fstrokes'] is not None:
+            sr.best_fstrokes = row['best_fstrokes']
+        if row['best_bstrokes'] is not None:
+            sr.best_bstrokes = row['best_bstrokes']
+        summary.results[sr.pnum] = sr
+    for (which, attr) in [('f', 'front_tally'),
+                          ('b', 'back_tally'),
+                          ('o', 'overall_tally')]:
+        for row in db_cmd_exec(SQL_REPORT_PLAYER_POINTS[which],
+                               args).fetchall():
+            sr = summary.results[row['player_num']]
+            getattr(sr, attr).Add(row['num'], row['den'])
+    for row in db_cmd_exec(SQL_REPORT_PLAYER_MONEY, args).fetchall():
+        sr = summary.results.get(row['player_num'])
+        if sr is not None:
+            sr.money_cents = row['cents']
+    summary.round_count = db_cmd_exec(SQL_REPORT_ROUND_COUNT,
+                                      args).fetchone()[0]
+    kitty_dollars = db_cmd_exec(SQL_REPORT_MZ_KITTY, args).fetchone()[0]
+    summary.mz_kitty_amt = Money(kitty_dollars or 0)
+    log.Debug("Report generated: %s", summary)
+    return summary
+
+
+def stale_rounds():
+    '''
+    Return the numbers of the rounds whose stored scores were not
+    calculated from their stored strokes, i.e. that need to be
+    (re-)calculated, in order
+    '''
+    return sorted(StaleRounds)
+
+
+def round_details_fp(rd_list):
+    '''Return the fingerprint of the inputs and scores of round details'''
+    return fingerprint.values_fp([(rd.player_num,
+                                   rd.fstrokes, rd.bstrokes,
+                                   rd.acnt, rd.ecnt, rd.aecnt,
+                                   rd.calc_fscore_numerator,
+                                   rd.calc_fscore_denominator,
+                                   rd.calc_bscore_numerator,
+                                   rd.calc_bscore_denominator,
+                                   rd.calc_oscore_numerator,
+                                   rd.calc_oscore_denominator) \
+                                  for rd in rd_list])
+
 
 def round_details_equal(rd_list1, rd_list2):
-    dprint("comparing two round detail lists with %d items;" % len(rd_list1))
-    for rd in rd_list1:
-        dprint("rd_list1[]:", rd)
-    for rd in rd_list2:
-        dprint("rd_list2[]:", rd)
-    rd_list1 = sorted(rd_list1, key=lambda rd: rd.player_num)
-    rd_list2 = sorted(rd_list2, key=lambda rd: rd.player_num)
+    '''Do two lists of round details (in any order) hold the same data?'''
     if len(rd_list1) != len(rd_list2):
         raise Exception("Internal Error: Lists have different lengths")
-    idx = 0
-    max = len(rd_list1)
-    while idx < max:
-        rd1 = rd_list1[idx]
-        rd2 = rd_list2[idx]
-        dprint("Comparing:", rd1)
-        dprint("With:     ", rd2)
-        r = (rd1 != rd2)
-        dprint("Comparison result of (rd1 != rd2):", r)
-        if rd1 != rd2:
-            dprint("Item lists unequal", rd1, ", ", rd2)
-            return False
-        idx += 1
-    dprint("Item lists equals!")
-    return True
+    return round_details_fp(rd_list1) == round_details_fp(rd_list2)
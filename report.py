@@ -13,49 +13,18 @@ import money_rounds
 import score
 from money import Money
 import rdb
+import columnar
+import results
+import export
 from utils import dprint
 from opts import opts
 import listctrl as lc
 from printer import MyPrintout
 
 
-def format_table_line(items, hdg=False):
-    '''take the 13 enties in "items" and return them formatted for out table'''
-    dprint("*** format_table_line: items passed in (hdg=%s):" % hdg)
-    dprint(items)
-    # set up an array of heading vs regular format for each column
-    line_fmt = [
-        ('{:<10s}', '{:<10s}'),
-        ('{:^7s}', '{:^7d}'),
-        ('{:>9s}', '{:>9.2f}'),
-        ('{:>9s}', '{:>9.2f}'),
-        ('{:^6s}', '{:^6d}'),
-        ('{:^7s}', '{:^7d}'),
-        ('{:^10s}', '{:^10d}'),
-        ('{:^5s}', '{:^5d}'),
-        ('{:^5s}', '{:^5d}'),
-        ('{:^5s}', '{:^5d}'),
-        ('{:^8s}', '{:^+8d}'),
-        ('{:^8s}', '{:^+8d}'),
-        ('{:>6s}', '{:>6s}')]
-    fmt_idx = 0 if hdg else 1
-    for i in range(13):
-        dprint("item[%d] (len %d):" % (i, len(str(items[i]))), items[i])
-        dprint("format for item: '%s'" % line_fmt[i][fmt_idx])
-    l = []
-    for i in range(13):
-        fmt_str = line_fmt[i][fmt_idx]
-        l.append(fmt_str.format(items[i]))
-    res = ''.join(l)
-    dprint("Returning table line: /%s/" % res)
-    return res
+# the file types our "Export" button can save, in export.FORMATS order
+EXPORT_WILDCARD = "CSV files (*.csv)|*.csv|JSON files (*.json)|*.json"
 
-def format_table_dash_line(hdg_items):
-    dprint("format_table_dash_line")
-    hdg = []
-    for h in hdg_items:
-        hdg.append('-' * len(h))
-    return format_table_line(hdg, hdg=True)
 
 class ScoreResultsFrame(wx.Frame):
     '''
@@ -70,6 +39,7 @@ class ScoreResultsFrame(wx.Frame):
         self.match_count = 0
         self.round_count = 0
         self.mz_kitty_amt = Money(0)
+        self.summary = rdb.ReportSummary()
         self.printout = MyPrintout(self)
 
     def MyStart(self, start_rdate, stop_rdate):
@@ -128,11 +98,8 @@ class ScoreResultsFrame(wx.Frame):
         ################################################################
         #vbox.AddSpacer(15)
         hbox2 = wx.BoxSizer(wx.HORIZONTAL)
-        self.results_list = lc.AutoWidthListCtrl(panel)
-        self.my_headings = [
-            'Name', 'Rounds', 'TtlPts', 'PPR',
-            'Aces', 'Eagles', 'Ace-Eagles',
-            '9-s', '18-s', '33-s', 'Best F9', 'Best B9', '$ Won']
+        self.results_list = lc.AutoWidthVirtualListCtrl(panel)
+        self.my_headings = results.REPORT_HEADINGS
         self.results_list.SetupListHdr(\
             self.my_headings,
             [wx.LIST_FORMAT_LEFT, wx.LIST_FORMAT_CENTER] + \
@@ -149,22 +116,25 @@ class ScoreResultsFrame(wx.Frame):
         done_button = wx.Button(panel, label='Done')
         # XXX maybe this should be a menu option?
         print_button = wx.Button(panel, label='Print')
+        export_button = wx.Button(panel, label='Export')
         self.Bind(wx.EVT_BUTTON, self.OnDone, source=done_button)
         self.Bind(wx.EVT_BUTTON, self.OnPrint, source=print_button)
+        self.Bind(wx.EVT_BUTTON, self.OnExport, source=export_button)
         hbox3.AddSpacer(10)
         hbox3.Add(done_button)
         hbox3.AddStretchSpacer(1)
+        hbox3.Add(export_button)
+        hbox3.AddSpacer(10)
         hbox3.Add(print_button)
         hbox3.AddSpacer(10)
         vbox.Add(hbox3, flag=wx.LEFT|wx.RIGHT|wx.EXPAND, border=10)
         ################################################################
         panel.SetSizer(vbox)
         ################################################################
-        pub.subscribe(self.OnNewRoundExists, "ROUND UPDATE")
-        pub.subscribe(self.OnNewRoundExists, "MONEY ROUND UPDATE")
+        pub.subscribe(self.OnDataVersion, "DATA VERSION READY")
 
     def MzKittyMsg(self):
-        return "Amount for Mz Kitty: $%5s" % self.mz_kitty_amt
+        return results.mz_kitty_msg(self.mz_kitty_amt)
 
     def OnPrint(self, e):
         dprint("PRINT? Are you kidding?")
@@ -172,41 +142,55 @@ class ScoreResultsFrame(wx.Frame):
         dprint("Calling print routine ...")
         self.printout.PrintText(lines, "some title not used")
 
+    def OnExport(self, e):
+        '''Save our results (in standings order) as CSV or JSON'''
+        dlg = wx.FileDialog(self, "Export Score Results",
+                            defaultFile="score-results-%s-%s.csv" % \
+                                (self.start_rdate.strftime("%Y%m%d"),
+                                 self.stop_rdate.strftime("%Y%m%d")),
+                            wildcard=EXPORT_WILDCARD,
+                            style=wx.FD_SAVE|wx.FD_OVERWRITE_PROMPT)
+        if dlg.ShowModal() != wx.ID_OK:
+            dlg.Destroy()
+            return
+        path = dlg.GetPath()
+        # the file type picked, unless the file name says otherwise
+        fmt = export.FORMATS[dlg.GetFilterIndex()]
+        if path.lower().endswith('.json') or path.lower().endswith('.csv'):
+            fmt = export.format_from_path(path)
+        dlg.Destroy()
+        dprint("Exporting results as %s to:" % fmt, path)
+        items = results.sorted_items(self.item_data, by_points=True)
+        try:
+            with open(path, 'wb') as f:
+                export.export_report(f, self.start_rdate, self.stop_rdate,
+                                     self.summary, items, fmt)
+        except IOError, err:
+            wx.MessageBox("Unable to export to %s: %s" % (path, err))
+
     def GetOurData(self):
         # generate a list of lines, to be printed
-        lines = []
-        lines.append(' ' * 20 + '*** Disc Golf Score Results -- by LeeMan ***')
-        lines.append('')
-        lines.append('Scores for Date Range: %s to %s' % \
-                     (self.start_rdate.strftime("%m/%d/%Y"),
-                      self.stop_rdate.strftime("%m/%d/%Y")))
-        lines.append('')
-        lines.append('Players found: %d              Rounds Found: %s' % \
-                     (self.match_count, self.round_count))
-        lines.append('')
-        lines.append(self.MzKittyMsg())
-        lines.append('')
-
-        lines.append(format_table_line(self.my_headings, hdg=True))
-        lines.append(format_table_dash_line(self.my_headings))
-        for data_item in self.item_data.itervalues():
-            lines.append(format_table_line(data_item))
-        return lines
-
+        return results.report_lines(self.start_rdate, self.stop_rdate,
+                                    self.summary,
+                                    self.item_data.values())
 
     def OnDone(self, e):
         dprint("All done!")
         self.Close()
 
-    def OnNewRoundExists(self, round_no):
-        '''A "NEW ROUND" or "NEW MONEY ROUND" message has been received'''
-        dprint("ScoreResultsFrame: A 'NEW ROUND' Message we received!")
-        # re-read the database rounds and round_details into our
-        # internal structures, since they have changed
-        rdb.init_rounds()
-        # re-generate our report results and data, then display them
+    def OnDataVersion(self, version, round_nums):
+        '''A "DATA VERSION READY" message has been received'''
+        dprint("ScoreResultsFrame: data version %d ready:" % version,
+               round_nums)
+        # rdb has already refreshed the changed rounds, so just
+        # re-generate our report results and data, then update the
+        # rows (i.e. players) whose results changed
+        old_item_data = self.item_data
         self.GenerateResultsList()
-        self.results_list.SetupListItems(self.item_data)
+        (rows, removed) = lc.diff_items(old_item_data, self.item_data)
+        dprint("Results changed for %d players, %d gone" % \
+               (len(rows), len(removed)))
+        self.results_list.UpdateItems(rows, removed)
         self.Show(True)
 
     def GenerateResultsList(self):
@@ -215,80 +199,17 @@ class ScoreResultsFrame(wx.Frame):
                self.start_rdate, ", to:", self.stop_rdate)
         dprint("Report Starting Date (as datetime):", self.start_rdate)
         dprint("Report Ending Date (as datetime):  ", self.stop_rdate)
-        # make a dictionary of the entries in range, where the 'key'
-        # is the player number, and the data is an instance of
-        # SearchResult for that player
-        matches_found = {k: rdb.SearchResult(v.num) \
-                         for k,v in rdb.PlayerList.iteritems()}
-        # also keep track of unique rounds seen, using a key of
-        # the round number, and data of True
-        round_numbers_seen = {}
-        for rd in rdb.RoundDetailList:
-            dprint("Results: Looking at:", rd)
-            rnd = rdb.RoundList[rd.round_num]
-            dprint("From:      ", rnd)
-            if not (self.start_rdate <= rnd.rdate <= self.stop_rdate):
-                continue
-            dprint("Found a match, round no %d" % rd.round_num)
-            matches_found[rd.player_num].AddRoundResults(rd)
-            round_numbers_seen[rd.round_num] = True
-        # now go through the money rounds, to add up money for each player,
-        # and to keep track of the number of players per round
-        players_per_round = {}
-        for mrd in rdb.MoneyRoundDetailList:
-            dprint("Results: Looking at:", mrd)
-            round_num = mrd.round_num
-            if round_num not in round_numbers_seen:
-                dprint("Skipping this entry: round# not in range:", round_num)
-                continue
-            dprint("Found a match, round no %d" % rd.round_num)
-            # increment the number of players for this round
-            player_num = mrd.player_num
-            cur_cnt = players_per_round.get(round_num, 0)
-            players_per_round[round_num] = cur_cnt + 1
-            dprint("Now players_per_round[%d] = %d" % \
-                   (round_num, cur_cnt+1))
-            # now add in the money data for this player
-            matches_found[mrd.player_num].AddMoneyRoundResults(mrd)
-        dprint("List of players per round:", players_per_round)
-        # finally, get the total for mz kitty
-        for round_num in round_numbers_seen:
-            dprint("Scanning money round for round_num=%d" % round_num)
-            mrnd = rdb.MoneyRoundList[round_num]
-            dprint("Found:", mrnd)
-            num_players = players_per_round[round_num]
-            dprint("Found %d players for this round" % num_players)
-            for try_no in mrnd.mrounds:
-                # XXX 7? really? make a constant!
-                if try_no == 7:
-                    add_amt = Money(num_players)
-                    dprint("*** Found Money for mz kitty, " + \
-                           "round=%d, try=%d, amt=%s" % \
-                           (round_num, try_no, add_amt))
-                    self.mz_kitty_amt += add_amt
+        # summarize the results for each player in range (as array
+        # operations if we have NumPy, else in the DB)
+        summary = columnar.report_results(self.start_rdate, self.stop_rdate)
+        self.summary = summary
+        self.mz_kitty_amt = summary.mz_kitty_amt
         # fill in item data for our GUI list: 1:1 from matches found
-        self.item_data = {}
-        for pnum,sr in matches_found.iteritems():
-            dprint("Found match[player_num=%d]:" % pnum, sr)
-            if sr.rnd_cnt <= 0:
-                # this player did not play any rounds
-                dprint("Skipping this player, since they did not play")
-                continue
-            pname = rdb.PlayerList[sr.pnum].name
-            self.item_data[pnum] = (pname, sr.rnd_cnt,
-                                    float(sr.TotalPoints()),
-                                    float(sr.PointsPerRound()),
-                                    sr.acnt, sr.ecnt, sr.aecnt,
-                                    sr.won_9s, sr.won_18s,
-                                    sr.won_33s,
-                                    sr.best_fstrokes, sr.best_bstrokes,
-                                    sr.money_won)
-            dprint("Created data item:", self.item_data[pnum])
+        self.item_data = results.report_items(summary)
         # keep track of number of matches and number of rounds seen
         self.match_count = len(self.item_data)
-        self.round_count = len(round_numbers_seen)
-        dprint("=> Rounds seen (cnt=%d):" % self.round_count,
-               round_numbers_seen)
+        self.round_count = summary.round_count
+        dprint("=> Rounds seen: cnt=%d" % self.round_count)
 
     def Quit(self, e):
         dprint("Quit? Really?")
@@ -0,0 +1,186 @@
+#!/usr/bin/python
+'''
+Re-score every round in the Disc Golf database, without the GUI
+
+Each round is scored from its strokes, with score.score_round(), just
+as if "Calculate" had been pressed for it. Rounds do not depend on
+each other, so they are scored in a pool of worker processes. The new
+scores are compared with the stored ones, and only the round details
+whose scores changed are written back, in one transaction.
+
+This is useful after fixing a bug in (or changing the rules of)
+scoring. Use "-n" to see how many scores would change, without
+changing anything, and "-s" to re-score just the rounds whose scores
+are known to be stale (see rdb.stale_rounds()).
+'''
+
+__version__ = "1.0"
+__author__ = "Lee Duncan"
+
+
+import sys
+import time
+from optparse import OptionParser
+import multiprocessing
+
+import rdb
+import score
+from utils import dprint
+from opts import opts
+
+
+# how many rounds to hand a worker process at a time
+ROUNDS_PER_TASK = 64
+
+
+def score_strokes(round_strokes):
+    '''
+    Score one round, given as (round number, [(player number, front
+    strokes, back strokes), ...]), and return (round number,
+    [(player number, calculated score numerators and denominators),
+    ...]).
+
+    This runs in a worker process, so it only gets and returns plain
+    values, which are cheap to send between processes.
+    '''
+    (rnum, strokes_list) = round_strokes
+    rd_list = [rdb.RoundDetail(rnum, pnum, fstrokes, bstrokes) \
+               for (pnum, fstrokes, bstrokes) in strokes_list]
+    score.score_round(rd_list)
+    return (rnum, [(rd.player_num,
+                    rd.calc_fscore_numerator, rd.calc_fscore_denominator,
+                    rd.calc_bscore_numerator, rd.calc_bscore_denominator,
+                    rd.calc_oscore_numerator, rd.calc_oscore_denominator) \
+                   for rd in rd_list])
+
+
+def rounds_to_score(round_nums):
+    '''
+    Return the strokes for each of these rounds that can be scored
+    (i.e. has all its strokes filled in), and the number that cannot
+    '''
+    res = []
+    skipped = 0
+    for rnum in round_nums:
+        strokes_list = [(rd.player_num, rd.fstrokes, rd.bstrokes) \
+                        for rd in rdb.RoundDetailList.ForRound(rnum)]
+        if [s for s in strokes_list if s[1] is None or s[2] is None]:
+            dprint("Skipping round %d: strokes not filled in" % rnum)
+            skipped += 1
+            continue
+        res.append((rnum, strokes_list))
+    return (res, skipped)
+
+
+def changed_details(scored_rounds):
+    '''
+    Compare the rounds just scored with the stored round details, and
+    return a list of the round details whose scores changed, with
+    their new scores filled in
+    '''
+    res = []
+    for (rnum, scores) in scored_rounds:
+        for (pnum, fnum, fden, bnum, bden, onum, oden) in scores:
+            rd = rdb.RoundDetailList.Get(rnum, pnum)
+            if (rd.calc_fscore_numerator, rd.calc_fscore_denominator,
+                rd.calc_bscore_numerator, rd.calc_bscore_denominator,
+                rd.calc_oscore_numerator, rd.calc_oscore_denominator) == \
+               (fnum, fden, bnum, bden, onum, oden):
+                continue
+            dprint("Score changed:", rd)
+            new_rd = rdb.RoundDetail.FromValues(rnum, pnum,
+                                                rd.fstrokes, rd.bstrokes,
+                                                rd.acnt, rd.ecnt, rd.aecnt,
+                                                fnum, fden, bnum, bden,
+                                                onum, oden)
+            dprint("           to:", new_rd)
+            res.append(new_rd)
+    return res
+
+
+def rescore_all(jobs, dry_run=False, stale_only=False):
+    '''
+    Re-score all the rounds (or just the stale ones), with "jobs"
+    worker processes, and write any changed scores to the DB, unless
+    dry_run is set. Return the number of rounds scored, the number
+    skipped, the number of round details scored, the list of changed
+    round details, and the number of jobs actually used (just one, if
+    there are too few rounds to be worth farming out).
+    '''
+    if stale_only:
+        round_nums = rdb.stale_rounds()
+    else:
+        round_nums = rdb.RoundDetailList.RoundNumbers()
+    (round_strokes, skipped) = rounds_to_score(round_nums)
+    if jobs > 1 and len(round_strokes) > ROUNDS_PER_TASK:
+        jobs_used = jobs
+        pool = multiprocessing.Pool(jobs)
+        try:
+            scored_rounds = pool.imap_unordered(score_strokes, round_strokes,
+                                                ROUNDS_PER_TASK)
+            changed = changed_details(scored_rounds)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        jobs_used = 1
+        changed = changed_details(score_strokes(rs) for rs in round_strokes)
+    if changed and not dry_run:
+        rdb.modify_round_detail_scores(changed)
+    return (len(round_strokes), skipped,
+            sum(len(rs[1]) for rs in round_strokes), changed, jobs_used)
+
+
+################################################################
+
+def parse_options():
+    parser = OptionParser(version='%prog ' + __version__,
+                          usage='usage: %prog [options] [DB-FILE]',
+                          description='Disc Golf Batch Re-scoring, ' + \
+                              'version ' + __version__)
+    parser.add_option('-d', '--debug', action='store_true',
+                      help='enter debug mode [%default]')
+    parser.add_option('-j', '--jobs', type='int',
+                      default=multiprocessing.cpu_count(),
+                      help='number of worker processes [%default]')
+    parser.add_option('-n', '--dry-run', action='store_true',
+                      help='report changes, but do not write them ' + \
+                          '[%default]')
+    parser.add_option('-s', '--stale', action='store_true',
+                      help='only re-score rounds with stale scores ' + \
+                          '[%default]')
+    (o, a) = parser.parse_args()
+    opts.debug = o.debug
+    if o.jobs < 1:
+        parser.error("need at least one job")
+    if len(a) > 1:
+        parser.error("too many arguments")
+    if a:
+        rdb.DB_PATH = a[0]
+    return o
+
+
+def main():
+    o = parse_options()
+    start = time.time()
+    rdb.init_db()
+    load_secs = time.time() - start
+    start = time.time()
+    (round_cnt, skipped, detail_cnt, changed, jobs_used) = \
+        rescore_all(o.jobs, o.dry_run, o.stale)
+    secs = time.time() - start
+    print "%s: loaded in %.2f s" % (rdb.DB_PATH, load_secs)
+    print "Scored %d rounds (%d round details) in %.2f s " % \
+          (round_cnt, detail_cnt, secs) + \
+          "with %d job(s): %.0f rounds/s" % \
+          (jobs_used, round_cnt / secs if secs else 0.0)
+    if skipped:
+        print "Skipped %d rounds with strokes not filled in" % skipped
+    print "%d round details (in %d rounds) %s" % \
+          (len(changed), len(set(rd.round_num for rd in changed)),
+           "would change" if o.dry_run else "changed")
+
+
+if __name__ == '__main__':
+    main()
+    sys.exit(0)
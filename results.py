@@ -0,0 +1,166 @@
+#!/usr/bin/python
+'''
+Score results reports, without the GUI
+
+A report summarizes how each player did over a range of dates (see
+rdb.report_results() and columnar.report_results()). This module
+turns such a summary into report items, one tuple of column values
+(in REPORT_HEADINGS order) per player, and writes them out as a text
+table, CSV, or JSON.
+
+The report frame (report.py) shows these same items, and the
+dg_report.py script writes them to stdout, e.g. from cron.
+'''
+
+__version__ = "1.0"
+__author__ = "Lee Duncan"
+
+
+import csv
+import json
+
+import rdb
+from utils import dprint, get_logger, DEBUG
+
+
+log = get_logger('results')
+
+
+REPORT_HEADINGS = [
+    'Name', 'Rounds', 'TtlPts', 'PPR',
+    'Aces', 'Eagles', 'Ace-Eagles',
+    '9-s', '18-s', '33-s', 'Best F9', 'Best B9', '$ Won']
+
+# the index of the total points in a report item
+TTL_PTS_IDX = 2
+
+
+def format_table_line(items, hdg=False):
+    '''take the 13 enties in "items" and return them formatted for out table'''
+    log.Debug("*** format_table_line: items passed in (hdg=%s): %s", hdg, items)
+    # set up an array of heading vs regular format for each column
+    line_fmt = [
+        ('{:<10s}', '{:<10s}'),
+        ('{:^7s}', '{:^7d}'),
+        ('{:>9s}', '{:>9.2f}'),
+        ('{:>9s}', '{:>9.2f}'),
+        ('{:^6s}', '{:^6d}'),
+        ('{:^7s}', '{:^7d}'),
+        ('{:^10s}', '{:^10d}'),
+        ('{:^5s}', '{:^5d}'),
+        ('{:^5s}', '{:^5d}'),
+        ('{:^5s}', '{:^5d}'),
+        ('{:^8s}', '{:^+8d}'),
+        ('{:^8s}', '{:^+8d}'),
+        ('{:>6s}', '{:>6s}')]
+    fmt_idx = 0 if hdg else 1
+    if log.IsEnabled(DEBUG):
+        for i in range(13):
+            log.Debug("item[%d] (len %d): %s",
+                      i, len(str(items[i])), items[i])
+            log.Debug("format for item: '%s'", line_fmt[i][fmt_idx])
+    l = []
+    for i in range(13):
+        fmt_str = line_fmt[i][fmt_idx]
+        l.append(fmt_str.format(items[i]))
+    res = ''.join(l)
+    log.Debug("Returning table line: /%s/", res)
+    return res
+
+def format_table_dash_line(hdg_items):
+    dprint("format_table_dash_line")
+    hdg = []
+    for h in hdg_items:
+        hdg.append('-' * len(h))
+    return format_table_line(hdg, hdg=True)
+
+
+def report_item(sr):
+    '''Return the report item (column values) for a SearchResult'''
+    return (rdb.PlayerList[sr.pnum].name, sr.rnd_cnt,
+            float(sr.TotalPoints()),
+            float(sr.PointsPerRound()),
+            sr.acnt, sr.ecnt, sr.aecnt,
+            sr.won_9s, sr.won_18s,
+            sr.won_33s,
+            sr.best_fstrokes, sr.best_bstrokes,
+            sr.money_won)
+
+
+def report_items(summary):
+    '''Return a dictionary of report items, by player number'''
+    item_data = {}
+    for pnum,sr in summary.results.iteritems():
+        log.Debug("Found match[player_num=%d]: %s", pnum, sr)
+        item_data[pnum] = report_item(sr)
+        log.Debug("Created data item: %s", item_data[pnum])
+    return item_data
+
+
+def sorted_items(item_data, by_points=False):
+    '''
+    Return report items in name order, or in standings order (most
+    points first, then by name) if by_points is set
+    '''
+    if by_points:
+        return sorted(item_data.itervalues(),
+                      key=lambda item: (-item[TTL_PTS_IDX], item[0]))
+    return sorted(item_data.itervalues())
+
+
+def mz_kitty_msg(mz_kitty_amt):
+    return "Amount for Mz Kitty: $%5s" % mz_kitty_amt
+
+
+def report_lines(start_rdate, stop_rdate, summary, items):
+    '''generate a list of lines, to be printed, for these report items'''
+    lines = []
+    lines.append(' ' * 20 + '*** Disc Golf Score Results -- by LeeMan ***')
+    lines.append('')
+    lines.append('Scores for Date Range: %s to %s' % \
+                 (start_rdate.strftime("%m/%d/%Y"),
+                  stop_rdate.strftime("%m/%d/%Y")))
+    lines.append('')
+    lines.append('Players found: %d              Rounds Found: %s' % \
+                 (len(items), summary.round_count))
+    lines.append('')
+    lines.append(mz_kitty_msg(summary.mz_kitty_amt))
+    lines.append('')
+    lines.append(format_table_line(REPORT_HEADINGS, hdg=True))
+    lines.append(format_table_dash_line(REPORT_HEADINGS))
+    for data_item in items:
+        lines.append(format_table_line(data_item))
+    return lines
+
+
+def write_table(f, start_rdate, stop_rdate, summary, items):
+    for line in report_lines(start_rdate, stop_rdate, summary, items):
+        print >>f, line
+
+
+def item_values(item):
+    '''Return the values of a report item, with money as a "d.cc" string'''
+    return list(item[:-1]) + [str(item[-1])]
+
+
+def write_csv(f, items):
+    '''write a heading row, then a row per report item'''
+    w = csv.writer(f)
+    w.writerow(REPORT_HEADINGS)
+    for item in items:
+        w.writerow(item_values(item))
+
+
+def write_json(f, start_rdate, stop_rdate, summary, items):
+    '''
+    write the report as one JSON object, with a list of players, each
+    an object keyed by the report headings (money is a "d.cc" string)
+    '''
+    report = {'start': start_rdate.strftime("%Y-%m-%d"),
+              'stop': stop_rdate.strftime("%Y-%m-%d"),
+              'round_count': summary.round_count,
+              'mz_kitty': str(summary.mz_kitty_amt),
+              'players': [dict(zip(REPORT_HEADINGS, item_values(item))) \
+                          for item in items]}
+    json.dump(report, f, indent=2, sort_keys=True, separators=(',', ': '))
+    print >>f
@@ -15,9 +15,13 @@ from utils import dprint
 from opts import opts
 import listctrl as lc
 import wxdate
-import money_rounds
 import score
-import report
+# the money round and report frames (and what they use, like NumPy)
+# are only imported when first needed, to get our first window up fast
+
+
+# shown for a round whose scores do not match its strokes
+STALE_SCORES_MSG = 'Calculate needed'
 
 
 class CurrentRoundsFrame(wx.Frame):
@@ -51,12 +55,13 @@ class CurrentRoundsFrame(wx.Frame):
         ################################################################
         vbox.AddSpacer(10)
         hbox2 = wx.BoxSizer(wx.HORIZONTAL)
-        self.round_list = lc.AutoWidthListCtrl(panel)
-        self.round_list.SetupListHdr(['Date', 'Course', 'Players'],
+        self.round_list = lc.AutoWidthVirtualListCtrl(panel)
+        self.round_list.SetupListHdr(['Date', 'Course', 'Players', 'Scores'],
                                      [wx.LIST_FORMAT_LEFT,
+                                      wx.LIST_FORMAT_LEFT,
                                       wx.LIST_FORMAT_LEFT,
                                       wx.LIST_FORMAT_LEFT],
-                                     ['%s', '%s', '%s'])
+                                     [rdb.rdate_to_db_str, '%s', '%d', '%s'])
         self.SetRoundList()
         hbox2.Add(self.round_list, 1, wx.EXPAND|wx.ALL, border=10)
         vbox.Add(hbox2, proportion=1, flag=wx.LEFT|wx.RIGHT|wx.EXPAND)
@@ -84,28 +89,38 @@ class CurrentRoundsFrame(wx.Frame):
         ################################################################
         panel.SetSizer(vbox)
         ################################################################
-        pub.subscribe(self.OnNewRoundExists, "ROUND UPDATE")
+        pub.subscribe(self.OnDataVersion, "DATA VERSION READY")
+
+    def RoundItem(self, rnd):
+        '''Return our round list item (column values) for a round'''
+        # the list formats these (dates as ISO-8601) when it shows
+        # them, and sorts by them as they are
+        return (rnd.rdate,
+                rdb.CourseList[rnd.course_num].name,
+                rdb.RoundDetailList.PlayerCount(rnd.num),
+                STALE_SCORES_MSG if rnd.ScoresStale() else '')
 
     def SetRoundList(self):
         '''Set up our rounds list items based on current round data'''
         dprint("Setting Round List for this frame")
         item_data = {}
         for c, rnd in rdb.RoundList.iteritems():
-            dprint("looking at %d:" % c, rnd)
-            course_name = rdb.CourseList[rnd.course_num].name
-            dprint("Searching for players for round number: %d" % rnd.num)
-            player_cnt = 0
-            dprint("RoundDetailList length is %d" % len(rdb.RoundDetailList))
-            for rd in rdb.RoundDetailList:
-                dprint("Looking for round %d in:" % rnd.num, rd)
-                if rd.round_num == rnd.num:
-                    player_cnt += 1
-            # items must be strings for the GUI
-            item_data[c] = (rnd.rdate.strftime("%m/%d/%Y") ,
-                            course_name,
-                            str(player_cnt))
+            item_data[c] = self.RoundItem(rnd)
         self.round_list.SetupListItems(item_data)
 
+    def UpdateRoundList(self, round_nums):
+        '''Update just these rounds in our list (added, changed, or gone)'''
+        dprint("Updating Round List for rounds:", round_nums)
+        rows = {}
+        removed = []
+        for rnum in round_nums:
+            rnd = rdb.RoundList.get(rnum)
+            if rnd is None:
+                removed.append(rnum)
+            else:
+                rows[rnum] = self.RoundItem(rnd)
+        self.round_list.UpdateItems(rows, removed)
+
     def OnRoundListSelected(self, e):
         dprint("Round List Selected")
         self.show_button.Enable()
@@ -124,19 +139,15 @@ class CurrentRoundsFrame(wx.Frame):
         idx = self.round_list.GetFirstSelected()
         key = self.round_list.GetItemData(idx)
         rnd = rdb.RoundList[key]
-        round_details = []
-        for rd in rdb.RoundDetailList:
-            dprint("looking for round %d in:" % rnd.num, rd)
-            if rnd.num == rd.round_num:
-                round_details.append(rd)
+        round_details = rdb.RoundDetailList.ForRound(rnd.num)
         srf = RoundDetailsFrame(self, title='Examine a Round')
         srf.MyCreate(rnd, round_details, for_update=True)
 
-    def OnNewRoundExists(self, round_no):
-        '''A "NEW ROUND" message has been received'''
-        dprint("Message Received: New Round:", round_no)
-        rdb.init_rounds()
-        self.SetRoundList()
+    def OnDataVersion(self, version, round_nums):
+        '''A "DATA VERSION READY" message has been received'''
+        dprint("Message Received: Data Version %d:" % version, round_nums)
+        # rdb has already refreshed these rounds, so just update their rows
+        self.UpdateRoundList(round_nums)
         self.Show(True)
 
     def Quit(self, e):
@@ -209,6 +220,7 @@ Suite 330, Boston, MA  02111-1307  USA"""
 
     def Report(self, e):
         dprint("*** Report time!")
+        import report
         report.ReportSetupFrame(self, title='Choose Report Date Range')
 
     def InitUI(self):
@@ -480,8 +492,12 @@ class RoundDetailsFrame(wx.Frame):
         if self.GetDataFromFrameIfNeeded():
             # if data is good enable allow editing now
             self.mround_button.Enable()
+        # warn if the stored scores are not from the stored strokes
+        if self.for_update and self.this_round.ScoresStale():
+            self.SetErrorStatus("%s: scores do not match strokes" % \
+                                STALE_SCORES_MSG)
         ################################################################
-        pub.subscribe(self.OnNewMoneyRoundExists, "MONEY ROUND UPDATE")
+        pub.subscribe(self.OnDataVersion, "DATA VERSION READY")
         self.SetDateFromPicker()
 
     def ExistingMoneyRound(self):
@@ -495,9 +511,8 @@ class RoundDetailsFrame(wx.Frame):
             lab = 'Create Money Round'
         self.mround_button.SetLabel(lab)
 
-    def OnNewMoneyRoundExists(self, round_no):
-        dprint("New money round! change our button state, if needed")
-        rdb.init_rounds()
+    def OnDataVersion(self, version, round_nums):
+        dprint("New data! change our money round button state, if needed")
         dprint("our round no:", self.this_round.num)
         dprint("our mround?: ", rdb.MoneyRoundList.get(self.this_round.num))
         self.SetMroundButtonState()
@@ -551,9 +566,8 @@ class RoundDetailsFrame(wx.Frame):
                     return False
             rdb.add_round(self.this_round, self.round_details)
             self.SetNormalStatus("")
-        rdb.commit_db()
-        dprint("Updating parent GUI ...")
-        pub.sendMessage("ROUND UPDATE", round_no=self.this_round)
+        # rdb commits the round and tells rdb.ChangeHub, which updates
+        # all the frames
         self.is_edited = False
         self.is_committed = True
         self.SetCommitButtonState()
@@ -682,6 +696,7 @@ class RoundDetailsFrame(wx.Frame):
     def OnMoneyRound(self, e):
         '''Money Round edit or Create'''
         dprint("Money round time!")
+        import money_rounds
         if not self.GetDataFromFrameIfNeeded():
             dprint("Round data AFU!")
             return
@@ -692,10 +707,7 @@ class RoundDetailsFrame(wx.Frame):
             dprint("There IS an existing money round, so using it")
             # this must be a money round update
             # get list of matching money round details from the DB
-            for mrd in rdb.MoneyRoundDetailList:
-                dprint("Coparing against:", mrd)
-                if mround.round_num == mrd.round_num:
-                    mround_details.append(mrd)
+            mround_details = rdb.MoneyRoundDetailList.ForRound(mround.round_num)
             mrdf = money_rounds.MoneyRoundDetailsFrame(self,
                                                        title='Money Round')
             mrdf.MyCreate(self.this_round, mround, mround_details,
@@ -722,8 +734,8 @@ class RoundDetailsFrame(wx.Frame):
             if res == wx.NO:
                 return
             # since our calculate has modifed the rdb data, we
-            # need to reload it :(
-            rdb.init_rounds()
+            # need to reload this round
+            rdb.ChangeHub.NoteChange([self.this_round.num])
         self.Destroy()
 
     def OnListEdited(self, evt):
@@ -6,67 +6,92 @@ Python module to calculate score for a round
 __version__ = "1.0"
 __author__ = "Lee Duncan"
 
-from utils import dprint
+from utils import get_logger
 from opts import opts
-from myfraction import MyFraction
+from myfraction import MyFraction, lcm
+
+
+log = get_logger('score')
 
 ROUND_SCORES = [9, 6, 3, 2, 1]
 OVERALL_SCORES = [15, 10, 5, 3, 2]
 
+# a denominator that can hold any score shared by a tie for places
+# that get points (e.g. 60 for 5 places), for adding up scores
+SCORE_DENOMINATOR = reduce(lcm, range(1, max(len(ROUND_SCORES),
+                                             len(OVERALL_SCORES)) + 1))
+
+# the score shared by each (points, number tied) seen so far: there
+# are only a few, and a MyFraction cannot be changed (it has no
+# __dict__), so one can be used for every tie like it, instead of
+# making a new one each time
+ShareCache = {}
+
 def score_round(rd_list):
     '''
     Given a list of round detail objects, RETURN an updated round
     detail object list with scores filled in for the front9 round, the
     back9 round, andthe overall
     '''
-    dprint("score_round: *** ENTERING ***")
-
-    # get sorted round lists
-    front_list = sorted(rd_list, key=lambda rd: rd.fstrokes)
-    front_score_list = sorted([rd.fstrokes for rd in front_list])
-    front_score_results = calculate_score(front_score_list, ROUND_SCORES)
-
-    # fill in front_list with front-9 totals
-    back_list = sorted(rd_list, key=lambda rd: rd.bstrokes)
-    back_score_list = sorted([rd.bstrokes for rd in back_list])
-    back_score_results = calculate_score(back_score_list, ROUND_SCORES)
-
-    # fill in back_list with back-9 totals
-    ttl_list = sorted(rd_list, key=lambda rd: rd.OverallStrokes())
-    # XXX is this step redundant to the one just above?
-    ttl_score_list = sorted([rd.OverallStrokes() for rd in ttl_list])
-    ttl_score_results = calculate_score(ttl_score_list, OVERALL_SCORES)
-
-    # fill in ttl_list with overall totals by adding all 3 lists
-    dprint("score_round: *** 3-way Merge ***")
-    for rd in rd_list:
-        dprint("Scoring for:", rd)
-        idx = 0
-        for frd in front_list:
-            dprint("Comparing against front round (idx=%d):" % idx, frd)
-            if rd == frd:
-                break
-            idx += 1
-        # assume there *will* be a match
-        rd.SetFrontCalcScore(front_score_results[idx])
-        idx = 0
-        for brd in back_list:
-            dprint("Comparing against back round (idx=%d):" % idx, brd)
-            if rd == brd:
-                break
-            idx += 1
-        rd.SetBackCalcScore(back_score_results[idx])
-        idx = 0
-        for trd in ttl_list:
-            dprint("Comparing against ttl (idx=%d):" % idx, trd)
-            if rd == trd:
-                break
-            idx += 1
-        rd.SetOverallCalcScore(ttl_score_results[idx])
+    log.Debug("score_round: *** ENTERING ***")
+
+    front_results = place_scores([rd.fstrokes for rd in rd_list],
+                                 ROUND_SCORES)
+    back_results = place_scores([rd.bstrokes for rd in rd_list],
+                                ROUND_SCORES)
+    ttl_results = place_scores([rd.OverallStrokes() for rd in rd_list],
+                               OVERALL_SCORES)
+
+    # each result is in the same place as its round detail in rd_list
+    for (idx, rd) in enumerate(rd_list):
+        rd.SetFrontCalcScore(front_results[idx])
+        rd.SetBackCalcScore(back_results[idx])
+        rd.SetOverallCalcScore(ttl_results[idx])
 
     return rd_list
 
 
+def place_scores(strokes_list, score_values):
+    '''
+    Calculate scores for a list of strokes (one per player, in any
+    order), and a list of values for each place, best first. Players
+    with the same strokes are tied, and split the points for all the
+    places they take between them. There may be more places than
+    players, or more players than places.
+
+    Return a list of fractions that represent the scores for each
+    player, in the order of the strokes_list[] supplied.
+
+    This takes one sort and one pass through the sorted players.
+    '''
+    log.Debug("place_scores: strokes list: %s", strokes_list)
+    log.Debug("            score_values: %s", score_values)
+    order = sorted(range(len(strokes_list)), key=strokes_list.__getitem__)
+    results = [None] * len(strokes_list)
+    place = 0
+    while place < len(order):
+        strokes = strokes_list[order[place]]
+        # find all players tied at this place
+        next_place = place + 1
+        while next_place < len(order) and \
+              strokes_list[order[next_place]] == strokes:
+            next_place += 1
+        # the points for all the places taken, as an integer (which
+        # is zero for places out of the points), shared by all tied
+        share = (sum(score_values[place:next_place]), next_place - place)
+        score_each = ShareCache.get(share)
+        if score_each is None:
+            score_each = ShareCache[share] = MyFraction(*share)
+        log.Debug("strokes=%s: %d at place %d, score=%s",
+                  strokes, next_place - place, place + 1, score_each)
+        for idx in order[place:next_place]:
+            results[idx] = score_each
+        place = next_place
+
+    log.Debug("returning results: %s", results)
+    return results
+
+
 def calculate_score(score_list, score_values):
     '''
     Calculate scores for a list of scores and a list of
@@ -78,48 +103,4 @@ def calculate_score(score_list, score_values):
     Return a list of fractions that repesent the scores for
     each player, in the order of the score_list[] supplied.
     '''
-    dprint("calculate_scores: score list:", score_list)
-    dprint("                score_values:", score_values)
-    scores_seen = {}
-    for s in score_list:
-        if not s in scores_seen.keys():
-            scores_seen[s] = 0
-        scores_seen[s] += 1
-    dprint("scores seen:", scores_seen)
-    # time to do actual scoring -- start at place "1", and go until
-    # we run out of places (5 of them) or score details (not enough
-    # players)
-    dprint("calculate_score: *** SCORING ***")
-    results = []
-    idx = 0
-    for score_val in sorted(scores_seen.keys()):
-        dprint("calculate_score: score_val:", score_val)
-        num_at_place = scores_seen[score_val]
-        dprint("calculate_score: num_at_place:", num_at_place)
-        dprint("Looking at score=%d,cnt=%s at place: %d" % \
-               (score_val, num_at_place, (idx + 1)))
-        if num_at_place == 1:
-            if idx < len(score_values):
-                # there are points for this finish
-                val = MyFraction(score_values[idx])
-            else:
-                # this finish is out of the points
-                val = MyFraction()
-            dprint("No tie for this position: score=%s" % val)
-        else:
-            dprint("%d-way tie" % num_at_place)
-            val = MyFraction()
-            for plc_idx in range(num_at_place):
-                new_idx = idx + plc_idx
-                dprint("idx=%d + plc_idx=%d = %d" % (idx, plc_idx, new_idx))
-                if new_idx < len(score_values):
-                    val += score_values[new_idx]
-            dprint("ttl pts=%s" % val)
-        score_each = MyFraction(val, num_at_place)
-        for plc_idx in range(num_at_place):
-            dprint("Appending result[]: %s" % score_each)
-            results.append(score_each)
-        idx += num_at_place
-
-    dprint("returning results:", results)
-    return results
+    return place_scores(sorted(score_list), score_values)
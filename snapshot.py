@@ -0,0 +1,160 @@
+#!/usr/bin/python
+'''
+An on-disk snapshot of our in-memory round lists, for a fast start
+
+Reading every round and round detail back out of SQLite, one
+sqlite3.Row at a time, is most of the time it takes to start up with
+a long history of rounds. So once the round lists are loaded, the
+rounds are also saved (as columns of plain values) in a file next to
+the DB file, and the next start just reads that back in, if the DB
+file has not changed since.
+
+Columns of integers (i.e. nearly all of them) are saved as the raw
+bytes of an array, so reading them back in is little more than a
+copy. Other columns (e.g. of strings) are saved as tuples, and the
+whole lot is written with marshal.
+
+The snapshot is keyed by the "file change counter" in the DB file's
+header, which SQLite bumps on every commit, along with the size and
+modification time of the DB file (and of its WAL file, if any), and
+the DB's schema version. Any change to the DB, by us or by anything
+else, means a different key, and so the snapshot is just ignored
+(and later rewritten). What is saved is read from the DB itself (see
+rdb.committed_rounds_as_columns()), not from the round lists, which
+frames edit in place before the edits are committed.
+'''
+
+__version__ = "1.0"
+__author__ = "Lee Duncan"
+
+
+import os
+import struct
+import marshal
+from array import array
+
+from utils import get_logger
+
+
+log = get_logger('snapshot')
+
+
+# bump this when what is saved changes
+SNAPSHOT_FORMAT = 1
+
+SNAPSHOT_SUFFIX = '.snap'
+
+# integer columns are saved as arrays of this type
+INT_ARRAY_TYPE = 'i'
+
+
+def snapshot_path(db_path):
+    return db_path + SNAPSHOT_SUFFIX
+
+
+def file_stamp(path):
+    '''Return (size, modification time) for a file, or None if no file'''
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime)
+
+
+def db_key(db_path):
+    '''
+    Return what identifies the current (committed) contents of a DB
+    file. The change counter and schema version ("user_version") are
+    read straight from the file header, since asking SQLite for the
+    schema version, with a PRAGMA, would commit any open transaction.
+    '''
+    with open(db_path, 'rb') as f:
+        header = f.read(64)
+    if len(header) < 64:
+        (change_counter, schema_version) = (0, 0)
+    else:
+        (change_counter,) = struct.unpack('>I', header[24:28])
+        (schema_version,) = struct.unpack('>I', header[60:64])
+    return (SNAPSHOT_FORMAT, schema_version, change_counter,
+            file_stamp(db_path), file_stamp(db_path + '-wal'))
+
+
+def encode_column(values):
+    '''
+    Return a column of values (a tuple) as we save it: as an array of
+    integers, with a list of the indexes of any None values, if that
+    is what it holds, else as is
+    '''
+    try:
+        return ('i', array(INT_ARRAY_TYPE, values).tostring(), [])
+    except (TypeError, OverflowError):
+        pass
+    none_idxs = [idx for (idx, v) in enumerate(values) if v is None]
+    if none_idxs:
+        try:
+            return ('i', array(INT_ARRAY_TYPE,
+                               (0 if v is None else v \
+                                for v in values)).tostring(), none_idxs)
+        except (TypeError, OverflowError):
+            pass
+    return ('o', values, [])
+
+
+def decode_column(saved):
+    '''Return a column of values, as saved by encode_column()'''
+    (kind, data, none_idxs) = saved
+    if kind == 'o':
+        return data
+    if kind != 'i':
+        raise ValueError("unknown column kind: %r" % kind)
+    a = array(INT_ARRAY_TYPE)
+    a.fromstring(data)
+    if not none_idxs:
+        return a
+    values = a.tolist()
+    for idx in none_idxs:
+        values[idx] = None
+    return values
+
+
+def load(db_path, key):
+    '''
+    Return the tables saved for this DB key (as lists of columns), or
+    None if there are none
+    '''
+    path = snapshot_path(db_path)
+    try:
+        with open(path, 'rb') as f:
+            (saved_key, saved_tables) = marshal.load(f)
+        if saved_key != key:
+            log.Debug("Snapshot %s is out of date: %s, not %s",
+                      path, saved_key, key)
+            return None
+        tables = [[decode_column(c) for c in saved_columns] \
+                  for saved_columns in saved_tables]
+    except (IOError, EOFError, ValueError, TypeError), e:
+        log.Debug("No snapshot in %s: %s", path, e)
+        return None
+    log.Debug("Read snapshot %s", path)
+    return tables
+
+
+def save(db_path, key, tables):
+    '''
+    Save tables (each a list of columns, each a tuple of values) as
+    the snapshot for this DB key. The file is written
+    under another name, then renamed, so that it is never seen only
+    partly written.
+    '''
+    path = snapshot_path(db_path)
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            marshal.dump((key, [[encode_column(c) for c in columns] \
+                                for columns in tables]), f, 2)
+        os.rename(tmp_path, path)
+    except (IOError, OSError), e:
+        log.Warning("Cannot save snapshot %s: %s", path, e)
+        return
+    log.Debug("Saved snapshot %s", path)
+
@@ -0,0 +1,93 @@
+#!/usr/bin/python
+'''
+Test that our snapshot of the round lists only ever holds what is
+committed to the DB: not edits to the cached rounds that are not yet
+committed, and not our stale lists when another program has changed
+the DB while we have it open
+
+Run from the top directory, e.g.:
+
+    python test/test_snapshot.py
+'''
+
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+TOP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [TOP_DIR, os.path.join(TOP_DIR, 'devel')]
+
+import rdb
+import snapshot
+import gen_synthetic_db
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, 'disc_golf.db')
+        gen_synthetic_db.generate_db(self.db_path, players=10, years=1)
+        self.old_db_path = rdb.DB_PATH
+        rdb.DB_PATH = self.db_path
+        # save the snapshot right away, after each commit
+        rdb.ChangeHub.SetScheduler(None)
+        rdb.ChangeHub.SetSaveScheduler(None)
+        rdb.init_db()
+
+    def tearDown(self):
+        rdb.DBConn.close()
+        rdb.DB_PATH = self.old_db_path
+        shutil.rmtree(self.tmp_dir)
+
+    def snapshot_is_current(self):
+        return snapshot.load(self.db_path, rdb.snapshot_key()) is not None
+
+    def modify_round(self, rnum, course_num):
+        rnd = rdb.RoundList[rnum]
+        rnd.course_num = course_num
+        rdb.modify_round(rnd, rdb.RoundDetailList.ForRound(rnum))
+        rdb.commit_db()
+
+    def test_our_commit(self):
+        '''Our own commits keep the snapshot up to date'''
+        self.assertTrue(self.snapshot_is_current())
+        self.modify_round(2, 3)
+        self.assertTrue(self.snapshot_is_current())
+        rdb.DBConn.close()
+        rdb.init_db()
+        self.assertEqual(rdb.RoundList[2].course_num, 3)
+
+    def test_other_commit(self):
+        '''Another program's commit, then ours, is in the snapshot'''
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("UPDATE rounds SET course_num=99 WHERE num=1")
+        conn.commit()
+        conn.close()
+        self.modify_round(2, 3)
+        self.assertTrue(self.snapshot_is_current())
+        rdb.DBConn.close()
+        rdb.init_db()
+        self.assertEqual(rdb.RoundList[1].course_num, 99)
+        self.assertEqual(rdb.RoundList[2].course_num, 3)
+
+    def test_uncommitted_edit(self):
+        '''A round edited but not committed is not in the snapshot'''
+        rd = rdb.RoundDetailList.ForRound(1)[0]
+        (pnum, fstrokes) = (rd.player_num, rd.fstrokes)
+        # as the round details frame does, before its round is committed
+        rd.SetScore(42, rd.bstrokes)
+        self.modify_round(2, 3)
+        self.assertTrue(self.snapshot_is_current())
+        rdb.DBConn.close()
+        rdb.init_db()
+        rd = [rd for rd in rdb.RoundDetailList.ForRound(1) \
+              if rd.player_num == pnum][0]
+        self.assertEqual(rd.fstrokes, fstrokes)
+        self.assertEqual(rdb.RoundList[2].course_num, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
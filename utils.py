@@ -4,13 +4,36 @@ Python ride database class
 
 TO DO:
     - throw exception of we write over a hole on a course
+
+Debug logging:
+
+Each module gets its own Logger, from get_logger(), and logs with
+e.g. log.Debug("Added: %s", rnd). The message is only formatted if
+it is going to be used, so a disabled Debug() costs one method call
+and a compare, however expensive its arguments are to print.
+
+Loggers print (to stderr) messages at or above their level, which is
+WARNING by default, or DEBUG for all modules when opts.debug is set.
+Per-module levels can be set with set_log_level(), or with the
+DG_LOG environment variable, e.g. "DG_LOG=rdb=debug,score=info".
+
+The last LOG_RING_SIZE messages at or above LOG_RING_LEVEL (whether
+printed or not) are also kept in memory, and can be written out with
+dump_log_ring(), e.g. after a crash. They are kept as formatted when
+they were logged, so they show the objects logged as they were then
+(and do not keep them alive). A message whose arguments do not fit
+its format is kept (and printed) as the format and the arguments,
+instead of raising.
 '''
 
-__version__ = "1.0"
+__version__ = "1.1"
 __author__ = "Lee Duncan"
 
 
+import os
 import sys
+import time
+from collections import deque
 from opts import opts
 
 
@@ -22,3 +45,141 @@ def dprint(*args):
             print >>sys.stderr, arg,
         print >>sys.stderr
 
+
+#
+# leveled debug logging
+#
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO',
+               WARNING: 'WARNING', ERROR: 'ERROR'}
+
+DEFAULT_LOG_LEVEL = WARNING
+
+# the in-memory ring of recent messages, for post-mortem dumps
+LOG_RING_SIZE = 1000
+LOG_RING_LEVEL = INFO
+LogRing = deque(maxlen=LOG_RING_SIZE)
+
+# all our loggers, by module name, and any levels set for them
+Loggers = {}
+ModuleLevels = {}
+
+
+class Logger(object):
+    '''
+    Debug logging for one module
+
+    "threshold" is the lowest level of message that is used at all
+    (printed, or saved in the ring), so anything below it can be
+    dropped without even looking at its arguments.
+    '''
+    __slots__ = ('name', 'level', 'threshold')
+
+    def __init__(self, name, level=DEFAULT_LOG_LEVEL):
+        self.name = name
+        self.SetLevel(level)
+
+    def SetLevel(self, level):
+        self.level = level
+        self.threshold = min(level, LOG_RING_LEVEL)
+
+    def IsEnabled(self, level):
+        '''Would a message at this level be printed?'''
+        return level >= self.level or (opts.debug and level >= DEBUG)
+
+    def Log(self, level, fmt, *args):
+        if level < self.threshold and not opts.debug:
+            return
+        enabled = self.IsEnabled(level)
+        if level < LOG_RING_LEVEL and not enabled:
+            return
+        msg = format_log_msg(fmt, args)
+        LogRing.append((time.time(), self.name, level, msg))
+        if enabled:
+            print >>sys.stderr, '%s:%s: %s' % \
+                  (LEVEL_NAMES.get(level, level), self.name, msg)
+
+    def Debug(self, fmt, *args):
+        if DEBUG < self.threshold and not opts.debug:
+            return
+        self.Log(DEBUG, fmt, *args)
+
+    def Info(self, fmt, *args):
+        self.Log(INFO, fmt, *args)
+
+    def Warning(self, fmt, *args):
+        self.Log(WARNING, fmt, *args)
+
+    def Error(self, fmt, *args):
+        self.Log(ERROR, fmt, *args)
+
+
+def format_log_msg(fmt, args):
+    '''
+    Format a log message, only now that it is needed, and never raise:
+    logging a bad message must not be what crashes us
+    '''
+    if not args:
+        return fmt
+    try:
+        return fmt % args
+    except Exception, e:
+        return '%s (cannot format %r: %s)' % (fmt, args, e)
+
+
+def get_logger(name):
+    '''Return the Logger for a module (by name), creating it if needed'''
+    log = Loggers.get(name)
+    if log is None:
+        log = Logger(name, ModuleLevels.get(name, DEFAULT_LOG_LEVEL))
+        Loggers[name] = log
+    return log
+
+
+def set_log_level(name, level):
+    '''Set the log level for a module, by name'''
+    ModuleLevels[name] = level
+    if name in Loggers:
+        Loggers[name].SetLevel(level)
+
+
+def set_log_levels_from_str(levels_str):
+    '''Set log levels from a string like "rdb=debug,score=info"'''
+    by_name = dict((n.lower(), l) for (l, n) in LEVEL_NAMES.iteritems())
+    for item in levels_str.split(','):
+        if '=' not in item:
+            continue
+        (name, level_name) = item.split('=', 1)
+        level = by_name.get(level_name.strip().lower())
+        if level is None:
+            print >>sys.stderr, "Unknown log level: %s" % level_name
+            continue
+        set_log_level(name.strip(), level)
+
+
+def dump_log_ring(f=sys.stderr):
+    '''Write out the messages in the ring, oldest first'''
+    for (when, name, level, msg) in LogRing:
+        print >>f, '%s.%03d %s:%s: %s' % \
+              (time.strftime("%H:%M:%S", time.localtime(when)),
+               int(when * 1000) % 1000,
+               LEVEL_NAMES.get(level, level), name, msg)
+
+
+def install_crash_dump():
+    '''On an uncaught exception, dump the log ring before the traceback'''
+    old_excepthook = sys.excepthook
+    def excepthook(*exc_info):
+        print >>sys.stderr, "*** Recent log messages:"
+        dump_log_ring(sys.stderr)
+        old_excepthook(*exc_info)
+    sys.excepthook = excepthook
+
+
+if os.environ.get('DG_LOG'):
+    set_log_levels_from_str(os.environ['DG_LOG'])
@@ -4,22 +4,13 @@ My own wx.DateTime class
 '''
 
 from wx import DateTime as wxdt
-from wx import DateSpan as wxds
 import datetime as dt
 
 from opts import opts
 from utils import dprint
 
-#
-# return a range for the specified range
-#
-
-DATE_RANGES = ['<Choose a Range>',
-               'YTD',
-               'MTD',
-               'Last Year',
-               'Last Month',
-               'All Time']
+import dateranges
+from dateranges import DATE_RANGES
 
 def wxdt_create(day=None, month=None, year=None):
     res = wxdt.Today()
@@ -40,46 +31,14 @@ def wxdt_to_date_str(wxdt_dt):
 def range_from_key(key):
     '''
     return a starting and ending wx.DateTime() for each known date range
-    choice
+    choice (see dateranges.range_from_key())
     '''
-    if key == DATE_RANGES[0]:
-        raise Exception("Must supply a date range")
-    if key not in DATE_RANGES:
-        raise Exception("Date Range '%s' not legal" % key)
-    if key == 'YTD':
-        dprint("Using 1/1/THISYEAR to NOW")
-        dt_end = wxdt.Today()
-        dt_start = wxdt_create(1, 0)
-    elif key == 'MTD':
-        dprint("Using 1/1/THISMONTH to NOW")
-        dt_end = wxdt.Today()
-        dt_start = wxdt_create(1)
-    elif key == 'Last Year':
-        dprint("Using 1/1/LASTYEAR to 12/31/LASTYEAR")
-        last_yr = wxdt.Today().GetYear() - 1
-        dt_start = wxdt_create(1, 0, last_yr)
-        dt_end = wxdt_create(31, 11, last_yr)
-    elif key == 'Last Month':
-        dprint("Using Beginning to end of Last month")
-        # get first day of this month
-        fom = wxdt_create(1)
-        # get last day of last month
-        dt_end = fom - wxds(days=1)
-        dprint("Set end date:", dt_end)
-        # now get first day of last month
-        dt_start = fom - wxds(days=1)
-        dt_start.SetDay(1)
-    elif key == 'All Time':
-        dt_start = wxdt()
-        dt_start.Set(1, 0, 1900)
-        dt_end = wxdt()
-        dt_end.Set(31,11,3000)
-    else:
-        raise Exception("Unknown date range: '%s'" % key)
-    ################################################################
-    dprint("Found start date of: %s" % dt_start)
-    dprint("Found end date of: %s" % dt_end)
-    return (dt_start, dt_end)
+    (dt_start, dt_end) = dateranges.range_from_key(key)
+    wx_start = wxdt()
+    wx_start.Set(dt_start.day, dt_start.month-1, dt_start.year)
+    wx_end = wxdt()
+    wx_end.Set(dt_end.day, dt_end.month-1, dt_end.year)
+    return (wx_start, wx_end)
 
 
 def wxdt_to_dt(wxdt_dt):